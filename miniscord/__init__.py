@@ -1,2 +1,27 @@
-from ._bot import Bot
-from ._discord_utils import delete_message, channel_id, sender_id
+from ._bot import Bot, CommandTimeout
+from ._discord_utils import (
+    delete_message,
+    channel_id,
+    sender_id,
+    channel_key,
+    sender_key,
+    key_to_id,
+    id_to_key,
+)
+from ._context import MessageContext
+from ._scheduler import LOW_PRIORITY, DEFAULT_PRIORITY, HIGH_PRIORITY
+from ._watchers import DROP_OLDEST, DROP_NEWEST, BLOCK
+from ._ratelimit import RateLimit, SCOPE_SENDER, SCOPE_CHANNEL, SCOPE_GUILD
+from ._state import StateStore
+from ._backends import (
+    StateBackend,
+    MemoryBackend,
+    SQLiteBackend,
+    RedisBackend,
+    BackendError,
+)
+from ._sharding import ShardLauncher, ClusterClient, shard_ranges
+from ._errors import ErrorStore, ErrorRecord, fingerprint
+from ._metrics import Metrics, Counter, Histogram
+from ._middleware import Middleware, MiddlewareChain
+from ._profiling import ProfilingMiddleware
@@ -0,0 +1,368 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import sqlite3
+import time
+
+from ._discord_utils import key_to_id
+from ._state import StateStore
+
+
+class BackendError(Exception):
+    pass
+
+
+def storage_key(key: Union[int, str]) -> str:
+    # packed keys are stored in the channel_id / sender_id format
+    return key_to_id(key) if isinstance(key, int) else str(key)
+
+
+class StateBackend(ABC):
+    @abstractmethod
+    async def get(self, key: Union[int, str]) -> Any:
+        pass
+
+    @abstractmethod
+    async def set(self, key: Union[int, str], value: Any, ttl: Optional[float] = None):
+        pass
+
+    @abstractmethod
+    async def delete(self, key: Union[int, str]) -> bool:
+        pass
+
+    async def get_many(self, keys: Iterable[Union[int, str]]) -> List[Any]:
+        return list(await asyncio.gather(*(self.get(key) for key in keys)))
+
+    async def set_many(
+        self, items: Dict[Union[int, str], Any], ttl: Optional[float] = None
+    ):
+        await asyncio.gather(
+            *(self.set(key, value, ttl) for key, value in items.items())
+        )
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        await self.flush()
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self, store: Optional[StateStore] = None):
+        self.store = StateStore(max_entries=None) if store is None else store
+
+    async def get(self, key: Union[int, str]) -> Any:
+        return self.store.get(storage_key(key))
+
+    async def set(self, key: Union[int, str], value: Any, ttl: Optional[float] = None):
+        self.store.set(storage_key(key), value, ttl)
+
+    async def delete(self, key: Union[int, str]) -> bool:
+        return self.store.delete(storage_key(key))
+
+
+class SQLiteBackend(StateBackend):
+    def __init__(
+        self,
+        path: str = "state.db",
+        flush_delay: float = 0.05,
+        max_batch: int = 500,
+    ):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.max_batch = max_batch
+        self.__executor = ThreadPoolExecutor(1)  # sqlite calls stay in one thread
+        self.__connection = None
+        self.__pending = {}  # key -> (json value, expires) or None to delete
+        self.__flush_handle = None
+        self.__flushing = None
+        self.writes = 0
+        self.batches = 0
+        self.purged = 0
+
+    async def __call(self, function, *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(
+            self.__executor, function, *args
+        )
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.__connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS state"
+                " (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS state_expires ON state (expires)"
+            )
+            connection.commit()
+            self.__connection = connection
+        return self.__connection
+
+    def __select(self, keys: List[str]) -> Dict[str, str]:
+        connection = self.__connect()
+        values = {}
+        now = time.time()
+        for i in range(0, len(keys), 500):  # sqlite limits query parameters
+            chunk = keys[i : i + 500]
+            rows = connection.execute(
+                f"SELECT key, value, expires FROM state"
+                f" WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for key, value, expires in rows:
+                if expires is None or expires > now:
+                    values[key] = value
+        return values
+
+    def __write(self, batch: Dict[str, Optional[tuple]]) -> int:
+        # expired rows are purged with each batch, returns how many
+        connection = self.__connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+                [(key, *item) for key, item in batch.items() if item is not None],
+            )
+            connection.executemany(
+                "DELETE FROM state WHERE key = ?",
+                [(key,) for key, item in batch.items() if item is None],
+            )
+            return connection.execute(
+                "DELETE FROM state WHERE expires <= ?", (time.time(),)
+            ).rowcount
+
+    def __close(self):
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+
+    def __lookup(self, key: str) -> Tuple[bool, Any]:
+        # writes not flushed yet are read back from the pending batch
+        if key not in self.__pending:
+            return False, None
+        item = self.__pending[key]
+        if item is None or (item[1] is not None and item[1] <= time.time()):
+            return True, None
+        return True, json.loads(item[0])
+
+    async def get(self, key: Union[int, str]) -> Any:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: Iterable[Union[int, str]]) -> List[Any]:
+        keys = [storage_key(key) for key in keys]
+        missing = [key for key in keys if key not in self.__pending]
+        stored = await self.__call(self.__select, missing) if missing else {}
+        values = []
+        for key in keys:
+            found, value = self.__lookup(key)
+            if not found and key in stored:
+                value = json.loads(stored[key])
+            values += [value]
+        return values
+
+    async def __queue(self, key: str, item: Optional[tuple]):
+        self.__pending[key] = item
+        if len(self.__pending) >= self.max_batch:
+            await self.flush()  # writers wait for a full batch to be written
+        elif self.__flush_handle is None:
+            self.__flush_handle = asyncio.get_event_loop().call_later(
+                self.flush_delay, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def set(self, key: Union[int, str], value: Any, ttl: Optional[float] = None):
+        expires = None if ttl is None else time.time() + ttl
+        await self.__queue(storage_key(key), (json.dumps(value), expires))
+
+    async def set_many(
+        self, items: Dict[Union[int, str], Any], ttl: Optional[float] = None
+    ):
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, key: Union[int, str]) -> bool:
+        key = storage_key(key)
+        found, value = self.__lookup(key)
+        if not found:
+            value = (await self.__call(self.__select, [key])).get(key)
+        await self.__queue(key, None)
+        return value is not None
+
+    async def flush(self):
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+        while self.__flushing is not None:  # one batch at a time
+            await self.__flushing
+        if len(self.__pending) == 0:
+            return
+        batch = self.__pending
+        self.__pending = {}
+        self.__flushing = asyncio.ensure_future(self.__call(self.__write, batch))
+        try:
+            self.purged += await self.__flushing
+            self.writes += len(batch)
+            self.batches += 1
+        finally:
+            self.__flushing = None
+
+    async def close(self):
+        await self.flush()
+        await self.__call(self.__close)
+        self.__executor.shutdown()
+
+
+class RedisBackend(StateBackend):
+    # RESP over a single connection, commands are pipelined
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        *,
+        db: int = 0,
+        password: Optional[str] = None,
+        prefix: str = "miniscord:",
+    ):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.__reader = None
+        self.__writer = None
+        self.__waiting = deque()  # futures of commands sent, in order
+        self.__listener = None
+        self.__connecting = None
+
+    @staticmethod
+    def encode(*args: Union[str, bytes, int, float]) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts += [b"$%d\r\n" % len(arg), arg, b"\r\n"]
+        return b"".join(parts)
+
+    @staticmethod
+    async def read_reply(reader: asyncio.StreamReader) -> Any:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, data = line[:1], line[1:-2]
+        if kind == b"+":
+            return data.decode()
+        if kind == b"-":
+            return BackendError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            if int(data) < 0:
+                return None
+            return (await reader.readexactly(int(data) + 2))[:-2]
+        if kind == b"*":
+            if int(data) < 0:
+                return None
+            return [await RedisBackend.read_reply(reader) for _ in range(int(data))]
+        raise BackendError(f"Unknown reply type {kind}")
+
+    async def __listen(self):
+        try:
+            while True:
+                reply = await self.read_reply(self.__reader)
+                future = self.__waiting.popleft()
+                if future.cancelled():
+                    continue
+                if isinstance(reply, BackendError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            while len(self.__waiting) > 0:
+                future = self.__waiting.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionError(repr(e)))
+            self.__reader = self.__writer = None
+
+    def __send(self, *commands: tuple) -> List[asyncio.Future]:
+        futures = []
+        for command in commands:
+            futures += [asyncio.get_event_loop().create_future()]
+            self.__waiting.append(futures[-1])
+        self.__writer.write(b"".join(self.encode(*command) for command in commands))
+        return futures
+
+    async def __connect(self):
+        self.__reader, self.__writer = await asyncio.open_connection(
+            self.host, self.port
+        )
+        self.__listener = asyncio.ensure_future(self.__listen())
+        commands = []
+        if self.password is not None:
+            commands += [("AUTH", self.password)]
+        if self.db != 0:
+            commands += [("SELECT", self.db)]
+        if commands:
+            await asyncio.gather(*self.__send(*commands))
+
+    async def execute(self, *commands: tuple) -> List[Any]:
+        # all commands are written at once, replies are awaited together
+        if self.__writer is None:
+            if self.__connecting is None:
+                self.__connecting = asyncio.ensure_future(self.__connect())
+            try:
+                await self.__connecting
+            finally:
+                self.__connecting = None
+        futures = self.__send(*commands)
+        await self.__writer.drain()
+        return list(await asyncio.gather(*futures))
+
+    def __key(self, key: Union[int, str]) -> str:
+        return self.prefix + storage_key(key)
+
+    @staticmethod
+    def __set_command(key: str, value: Any, ttl: Optional[float]) -> tuple:
+        if ttl is None:
+            return "SET", key, json.dumps(value)
+        return "SET", key, json.dumps(value), "PX", max(1, int(ttl * 1000))
+
+    async def get(self, key: Union[int, str]) -> Any:
+        (value,) = await self.execute(("GET", self.__key(key)))
+        return None if value is None else json.loads(value)
+
+    async def get_many(self, keys: Iterable[Union[int, str]]) -> List[Any]:
+        keys = [self.__key(key) for key in keys]
+        if len(keys) == 0:
+            return []
+        (values,) = await self.execute(("MGET", *keys))
+        return [None if value is None else json.loads(value) for value in values]
+
+    async def set(self, key: Union[int, str], value: Any, ttl: Optional[float] = None):
+        await self.execute(self.__set_command(self.__key(key), value, ttl))
+
+    async def set_many(
+        self, items: Dict[Union[int, str], Any], ttl: Optional[float] = None
+    ):
+        if len(items) > 0:
+            await self.execute(
+                *(
+                    self.__set_command(self.__key(key), value, ttl)
+                    for key, value in items.items()
+                )
+            )
+
+    async def delete(self, key: Union[int, str]) -> bool:
+        (count,) = await self.execute(("DEL", self.__key(key)))
+        return count > 0
+
+    async def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+            await self.__writer.wait_closed()
+        if self.__listener is not None:
+            self.__listener.cancel()
+        self.__reader = self.__writer = self.__listener = None
@@ -1,7 +1,6 @@
-from typing import Callable, Coroutine, Tuple, Any
+from typing import Callable, Coroutine, Tuple, Any, Iterable, List, Optional, Union
 import time
 import logging
-import traceback
 import discord
 import re
 import asyncio
@@ -11,11 +10,56 @@ from os import path
 from datetime import datetime
 from dotenv import load_dotenv
 
-from ._utils import sanitize_input, parse_arguments
+from ._utils import sanitize_input, Arguments, paginate, MAX_MESSAGE_LENGTH
+from ._dispatch import CommandIndex
+from ._scheduler import (
+    CommandScheduler,
+    AdmissionController,
+    DEFAULT_PRIORITY,
+    HIGH_PRIORITY,
+)
+from ._context import MessageContext, ContextFunction
+from ._discord_utils import channel_id
+from ._permissions import PermissionCache, PermissionNotifier
+from ._replies import ReplyBuffer
+from ._state import StateStore
+from ._guild_log import GuildLogWriter
+from ._guilds import GuildRegistry
+from ._presence import PresenceRotator
+from ._supervisor import Supervisor
+from ._errors import ErrorStore
+from ._metrics import BotMetrics
+from ._middleware import Middleware, MiddlewareChain
+from ._profiling import ProfilingMiddleware, MODES
+from ._outbound import (
+    OutboundScheduler,
+    PRIORITY_REPLY,
+    PRIORITY_NOTICE,
+    PRIORITY_PRESENCE,
+)
+from ._ratelimit import RateLimit, consume_all, scope_key
+from ._watchers import Watcher, WatcherPipeline, WatcherFunction, DROP_OLDEST
+
+mentions_regex = re.compile(r"<@!?[^>]+>")
 
 CommandFunction = Callable[
     [discord.Client, discord.Message, Tuple[str]], Coroutine[Any, Any, None]
 ]
+OverloadFunction = Callable[
+    [discord.Client, discord.Message, str, Tuple[str]], Coroutine[Any, Any, None]
+]
+
+ThrottleFunction = Callable[
+    [discord.Client, discord.Message, float, Tuple[str]], Coroutine[Any, Any, None]
+]
+
+OVERLOAD_REJECTED = "rejected"
+OVERLOAD_TIMEOUT = "timeout"
+
+
+class CommandTimeout(asyncio.TimeoutError):
+    # the command ran past its timeout, unlike a TimeoutError raised by the command
+    pass
 
 
 def debug(message: discord.Message, txt: str):
@@ -24,16 +68,43 @@ def debug(message: discord.Message, txt: str):
 
 class Command(object):
     def __init__(
-        self, regex: str, compute: CommandFunction, help_short: str, help_long: str
+        self,
+        regex: str,
+        compute: Union[CommandFunction, ContextFunction],
+        help_short: str,
+        help_long: str,
+        timeout: Optional[float] = None,
+        priority: int = DEFAULT_PRIORITY,
+        rate_limits: Iterable[RateLimit] = (),
+        with_context: bool = False,
     ):
         self.regex = regex
+        self.pattern = re.compile(regex)
+        self.order = 0
         self.compute = compute
         self.help_short = help_short
         self.help_long = help_long
+        self.timeout = timeout
+        self.priority = priority
+        self.rate_limits = list(rate_limits)
+        self.with_context = with_context  # compute(context) instead of args
+
+    @property
+    def name(self) -> str:
+        return self.regex[1:-1]
 
 
 class Bot(object):
-    def __init__(self, app_name: str, version: str, *, alias: str = None):
+    def __init__(
+        self,
+        app_name: str,
+        version: str,
+        *,
+        alias: str = None,
+        sharded: bool = False,
+        shard_count: Optional[int] = None,
+        shard_ids: Optional[List[int]] = None,
+    ):
         # constants
         self.token_env_var = "DISCORD_TOKEN"
         self.remove_mentions = False  # remove mentions from arguments
@@ -41,32 +112,97 @@ class Bot(object):
         self.any_mention = False  # bot mention can be anywhere
         self.log_calls = False
         self.guild_logs_file = "guilds.log"
+        self.guild_logs_flush_delay = 1  # seconds lines are buffered before writing
+        self.guild_logs_max_bytes = 1_000_000  # rotated above this size
+        self.guild_logs_backups = 3
         self.enforce_write_permission = True
+        self.permission_notice_window = 600  # seconds between two notices to a user
+        self.max_dm_channels = 1000
         self.lower_command_names = True
         self.game_change_delay = 10
-        self.error_restart_delay = 2
+        self.error_restart_delay = 2  # first restart delay, doubled on each failure
+        self.error_max_restart_delay = 300
+        self.crash_loop_threshold = 5  # failures in the window before cooling down
+        self.crash_loop_window = 60
+        self.crash_loop_cooldown = 600
+        self.shutdown_timeout = 10  # seconds pending messages are sent for on stop
+        self.error_files_dir = "."  # error_<fingerprint>.txt files, None to disable
+        self.error_max_entries = (
+            100  # distinct errors kept, least recently seen dropped
+        )
+        self.error_writes_per_minute = 6
+        self.enable_metrics = True
+        self.metrics_host = "127.0.0.1"
+        self.metrics_port = None  # serve Prometheus metrics on /metrics if set
+        self.profiles_dir = "."  # where profiling reports are written
         self.answer = True
         self.answer_mention = False
+        self.reply_delay = 0.1  # seconds replies are buffered to be merged
+        self.max_concurrent_commands = None  # run commands as scheduled tasks
+        self.max_concurrent_commands_per_guild = None
+        self.overload_threshold = None  # commands running before shedding load
+        self.overload_max_deferred = 100
+        self.throttle_message = (
+            "Please wait {retry_after:.0f}s before using this command again"
+        )
+        self.outbound_rate = 50  # requests per second for all sends
+        self.outbound_route_rate = 1  # requests per second for each channel
+        self.outbound_route_burst = 5
+        self.state_max_entries = 100000  # bot.state least recently used are evicted
+        self.state_max_bytes = None
+        self.state_ttl = None  # seconds before a bot.state entry expires
+        self.state_backend = None  # StateBackend bot.state is written behind to
+        self.state_flush_delay = 1  # seconds bot.state changes wait to be written
         # config vars
         self.app_name = app_name
         self.version = version
         # future vars
         self.__token = None
+        self.cluster = None  # set in ShardLauncher worker processes
         self.__t0 = None
-        self.__last_error = None
+        self.__errors = None
+        self.__metrics = None
+        self.__owner_ids = None
+        self.__mention_user_id = None
+        self.__mention_regex = None
+        self.__scheduler = None
+        self.__admission = None
+        self.__notifier = None
+        self.__replies = None
+        self.__outbound = None
+        self.__state = None
+        self.__guild_log = None
+        self.__guilds_replayed = False
+        self.__presence = None
+        self.__supervisor = None
+        self.__help_pages = None
+        self.__info_cache = None
         # init
-        self.__watcher = None
+        self.__watchers = WatcherPipeline()
+        self.__middlewares = MiddlewareChain()
+        self.__profiler = None
         self.__commands = []
+        self.__index = CommandIndex()
         self.__fallback = None
+        self.__fallback_with_context = False
+        self.__overload = None
+        self.__throttle = None
+        self.__throttle_notices = StateStore(max_entries=10000)  # until refilled
         self.__events = {}
-        self.games = [f"v{version}", lambda: f"{len(self.guilds)} guilds"]
+        self.games = [f"v{version}", lambda: f"{self.guild_count} guilds"]
         if self.alias is not None:
             self.games += [f"{self.alias}help"]
         intents = discord.Intents.default()
         intents.message_content = True
-        self.client = discord.Client(intents=intents)
+        if sharded or shard_count is not None or shard_ids is not None:
+            self.client = discord.AutoShardedClient(
+                intents=intents, shard_count=shard_count, shard_ids=shard_ids
+            )
+        else:
+            self.client = discord.Client(intents=intents)
         self.client.bot = self
-        self.guilds = []
+        self.__guilds = GuildRegistry(lambda: self.client.guilds)
+        self.permission_cache = PermissionCache()
         self.__register_events()
         self.__register_commands()
 
@@ -75,6 +211,13 @@ class Bot(object):
         self.client.event(self.on_message)
         self.client.event(self.on_guild_join)
         self.client.event(self.on_guild_remove)
+        self.client.event(self.on_guild_update)
+        self.client.event(self.on_guild_role_create)
+        self.client.event(self.on_guild_role_update)
+        self.client.event(self.on_guild_role_delete)
+        self.client.event(self.on_guild_channel_update)
+        self.client.event(self.on_guild_channel_delete)
+        self.client.event(self.on_member_update)
 
     def __register_commands(self):
         # register default commands
@@ -89,12 +232,14 @@ class Bot(object):
             f"* {tmp_alias}help [command]\n"
             f"\tShows help about a specific command.\n"
             f"```",
+            priority=HIGH_PRIORITY,
         )
         self.register_command(
             "(info|about)",
             self.info,
             "info: show description",
             f"```\n" f"* {tmp_alias}info:\n" f"\tShows this bot's status.\n" f"```",
+            priority=HIGH_PRIORITY,
         )
 
     def __generate_game(self) -> str:
@@ -104,46 +249,155 @@ class Bot(object):
         else:
             return game
 
+    def __render_info(self) -> str:
+        # only the guild count changes between calls
+        if self.__info_cache is None or self.__info_cache[0] != self.__t0:
+            self.__info_cache = (
+                self.__t0,
+                f"```\n"
+                f"{self.app_name} v{self.version}\n"
+                f"* Started at {self.__t0:%Y-%m-%d %H:%M}\n",
+            )
+        return self.__info_cache[1] + f"* Connected to {self.guild_count} guilds\n```"
+
     async def info(self, _client: discord.client, message: discord.Message, *args: str):
-        await message.channel.send(
+        await self.send(
+            message.channel,
+            self.__render_info(),
+            reference=message if self.answer else None,
+            mention_author=self.answer_mention,
+        )
+
+    @property
+    def metrics(self) -> BotMetrics:
+        if self.__metrics is None:
+            self.__metrics = BotMetrics()
+        return self.__metrics
+
+    def __rejected(self, reason: str):
+        if self.enable_metrics:
+            self.metrics.rejected.inc(reason)
+
+    def __render_stats(self) -> str:
+        metrics = self.metrics
+        dispatched = metrics.dispatch.count()
+        text = (
             f"```\n"
-            f"{self.app_name} v{self.version}\n"
-            f"* Started at {self.__t0:%Y-%m-%d %H:%M}\n"
-            f"* Connected to {len(self.guilds)} guilds\n"
-            f"```",
+            f"* Messages: {metrics.messages.get()}"
+            f" ({metrics.rejected.total()} not commands)\n"
+        )
+        if dispatched > 0:
+            text += (
+                f"* Dispatch: {metrics.dispatch.sum() / dispatched * 1e6:.1f}µs mean\n"
+            )
+        for (name,), calls in sorted(metrics.commands.values.items()):
+            count = metrics.latency.count(name)
+            mean = metrics.latency.sum(name) / count * 1000 if count > 0 else 0
+            text += (
+                f"* {name}: {calls} calls, {metrics.errors.get(name)} errors"
+                f", {mean:.1f}ms mean, p95 <= {metrics.latency.quantile(0.95, name)}s\n"
+            )
+        return text + "```"
+
+    async def __is_owner(self, user: discord.User) -> bool:
+        if self.__owner_ids is None:
+            info = await self.client.application_info()
+            self.__owner_ids = {info.owner.id}
+        return user.id in self.__owner_ids
+
+    async def stats(
+        self, _client: discord.client, message: discord.Message, *args: str
+    ):
+        if not await self.__is_owner(message.author):
+            return  # stay silent for other users
+        await self.send(
+            message.channel,
+            self.__render_stats(),
+            reference=message if self.answer else None,
+            mention_author=self.answer_mention,
+        )
+
+    async def profile(
+        self, _client: discord.client, message: discord.Message, *args: str
+    ):
+        if not await self.__is_owner(message.author):
+            return  # stay silent for other users
+        if len(args) >= 2 and args[1] == "stop":
+            self.profiler.stop()
+            text = "Profiling stopped"
+        elif (
+            len(args) < 2
+            or (len(args) >= 3 and not args[2].isdigit())
+            or (len(args) >= 4 and args[3] not in MODES)
+        ):
+            tmp_alias = "" if self.alias is None else self.alias
+            text = (
+                f"Usage: `{tmp_alias}profile <command> [invocations] [{'|'.join(MODES)}]`"
+                f" or `{tmp_alias}profile stop`"
+            )
+        else:
+            invocations = int(args[2]) if len(args) >= 3 else 10
+            mode = args[3] if len(args) >= 4 else MODES[0]
+            self.profiler.start(args[1], invocations, mode)
+            text = f"Profiling `{sanitize_input(args[1])}` for {invocations} invocations with {mode}"
+        await self.send(
+            message.channel,
+            text,
             reference=message if self.answer else None,
             mention_author=self.answer_mention,
         )
 
+    def __render_help(self) -> List[str]:
+        if self.__help_pages is None:
+            tmp_alias = "" if self.alias is None else self.alias
+            header = "```\nList of available commands:\n"
+            footer = f"Page 0000/0000, use {tmp_alias}help <page>\n```"
+            pages = paginate(
+                [f"* {tmp_alias}{command.help_short}\n" for command in self.__commands],
+                MAX_MESSAGE_LENGTH - len(header) - len(footer),
+            )
+            if len(pages) == 1:
+                self.__help_pages = [header + pages[0] + "```"]
+            else:
+                self.__help_pages = [
+                    header
+                    + page
+                    + f"Page {i + 1}/{len(pages)}, use {tmp_alias}help <page>\n```"
+                    for i, page in enumerate(pages)
+                ]
+        return self.__help_pages
+
     async def help(self, _client: discord.client, message: discord.Message, *args: str):
+        pages = self.__render_help()
         if len(args) <= 1:
-            tmp_alias = "" if self.alias is None else self.alias
-            await message.channel.send(
-                "```\n"
-                "List of available commands:\n"
-                + "".join(
-                    [
-                        f"* {tmp_alias}{command.help_short}\n"
-                        for command in self.__commands
-                    ]
-                )
-                + "```",
+            await self.send(
+                message.channel,
+                pages[0],
                 reference=message if self.answer else None,
                 mention_author=self.answer_mention,
             )
         else:
-            for command in self.__commands:
-                if re.match(
-                    command.regex,
-                    args[1].lower() if self.lower_command_names else args[1],
-                ):
-                    await message.channel.send(
-                        command.help_long,
-                        reference=message if self.answer else None,
-                        mention_author=self.answer_mention,
-                    )
-                    return
-            await message.channel.send(
+            command = self.__index.match(
+                args[1].lower() if self.lower_command_names else args[1]
+            )
+            if command is not None:
+                await self.send(
+                    message.channel,
+                    command.help_long,
+                    reference=message if self.answer else None,
+                    mention_author=self.answer_mention,
+                )
+                return
+            if args[1].isdigit() and 0 < int(args[1]) <= len(pages):
+                await self.send(
+                    message.channel,
+                    pages[int(args[1]) - 1],
+                    reference=message if self.answer else None,
+                    mention_author=self.answer_mention,
+                )
+                return
+            await self.send(
+                message.channel,
                 f"Command `{sanitize_input(args[1])}` not found",
                 reference=message if self.answer else None,
                 mention_author=self.answer_mention,
@@ -155,24 +409,342 @@ class Bot(object):
         return False
 
     async def on_ready(self, *args):
+        self.supervisor.success()  # connected, even if the event is handled elsewhere
         if await self.__handle_event("on_ready", args):
             return
-        self.guilds = [guild async for guild in self.client.fetch_guilds(limit=1000)]
+        self.__compile_mentions()
+        self.__guilds.invalidate()  # the gateway cache is up to date, no need to fetch
         # Change status
         logging.info(
             f"{self.client.user} (v{self.version}) has connected to {len(self.guilds)} Discord guilds"
         )
-        if self.guild_logs_file is not None and not os.path.exists(
-            self.guild_logs_file
+        if self.guild_logs_file is not None and not self.__guilds_replayed:
+            # decided once, the file is only created when the first lines are flushed
+            self.__guilds_replayed = True
+            if not os.path.exists(self.guild_logs_file):
+                for guild in self.guilds:
+                    await self.on_guild_join(guild)
+        if self.cluster is not None:
+            self.cluster.start(self)
+        self.start_presence()
+
+    @property
+    def presence(self) -> PresenceRotator:
+        if self.__presence is None:
+            self.__presence = PresenceRotator(
+                self.__generate_game, self.__change_presence, self.game_change_delay
+            )
+        return self.__presence
+
+    async def __change_presence(self, text: str):
+        await self.outbound.submit(
+            PRIORITY_PRESENCE,
+            "presence",
+            self.client.change_presence,
+            activity=discord.Game(text),
+            status=discord.Status.online,
+        )
+
+    def start_presence(self) -> bool:
+        # only one rotation task, even when on_ready fires again on reconnect
+        return self.presence.start()
+
+    def stop_presence(self):
+        if self.__presence is not None:
+            self.__presence.stop()
+
+    def __compile_mentions(self):
+        user_id = self.client.user.id
+        if user_id != self.__mention_user_id:
+            self.__mention_user_id = user_id
+            self.__mention_regex = re.compile(f"<@!?{user_id}>")
+
+    def __is_mention(self, message: discord.Message) -> bool:
+        if self.any_mention and self.client.user in message.mentions:
+            return True
+        if not message.content.startswith("<@"):
+            return False
+        self.__compile_mentions()
+        return self.__mention_regex.match(message.content) is not None
+
+    def __maybe_alias(self, message: discord.Message) -> bool:
+        if self.alias is None:
+            return False
+        content = message.content.lstrip(" ")
+        if self.remove_mentions and content.startswith("<@"):
+            return True  # only known once mentions are removed
+        return content.startswith(self.alias) or content.lstrip("\"'").startswith(
+            self.alias
+        )
+
+    @property
+    def scheduler(self) -> Optional[CommandScheduler]:
+        if self.__scheduler is None and self.max_concurrent_commands is not None:
+            self.__scheduler = CommandScheduler(
+                self.max_concurrent_commands, self.max_concurrent_commands_per_guild
+            )
+        return self.__scheduler
+
+    @property
+    def notifier(self) -> PermissionNotifier:
+        if self.__notifier is None:
+            self.__notifier = PermissionNotifier(
+                self.permission_notice_window, self.max_dm_channels, self.__send_notice
+            )
+        return self.__notifier
+
+    @property
+    def guilds(self) -> GuildRegistry:
+        return self.__guilds
+
+    @guilds.setter
+    def guilds(self, guilds: Iterable[discord.Guild]):
+        self.__guilds.seed(guilds)
+
+    @property
+    def guild_count(self) -> int:
+        # across all shard processes when launched by a ShardLauncher
+        if self.cluster is not None and self.cluster.total_guilds is not None:
+            return self.cluster.total_guilds
+        return len(self.guilds)
+
+    @property
+    def guild_log(self) -> Optional[GuildLogWriter]:
+        if self.__guild_log is not None and (
+            self.__guild_log.path != self.guild_logs_file
         ):
-            for guild in self.guilds:
-                await self.on_guild_join(guild)
-        while True:
-            await self.client.change_presence(
-                activity=discord.Game(self.__generate_game()),
-                status=discord.Status.online,
+            self.__guild_log.close()
+            self.__guild_log = None
+        if self.__guild_log is None and self.guild_logs_file is not None:
+            self.__guild_log = GuildLogWriter(
+                self.guild_logs_file,
+                flush_delay=self.guild_logs_flush_delay,
+                max_bytes=self.guild_logs_max_bytes,
+                backups=self.guild_logs_backups,
+            )
+        return self.__guild_log
+
+    @property
+    def state(self) -> StateStore:
+        if self.__state is None:
+            self.__state = StateStore(
+                self.state_max_entries,
+                self.state_max_bytes,
+                self.state_ttl,
+                backend=self.state_backend,
+                flush_delay=self.state_flush_delay,
+            )
+        return self.__state
+
+    @property
+    def outbound(self) -> OutboundScheduler:
+        if self.__outbound is None:
+            self.__outbound = OutboundScheduler(
+                self.outbound_rate, self.outbound_route_rate, self.outbound_route_burst
+            )
+        return self.__outbound
+
+    async def send(
+        self,
+        channel: discord.abc.Messageable,
+        content: Optional[str] = None,
+        *,
+        priority: int = PRIORITY_REPLY,
+        **kwargs,
+    ) -> discord.Message:
+        # queued by priority under the global and per-channel rate limits
+        return await self.outbound.submit(
+            priority, channel.id, channel.send, content, **kwargs
+        )
+
+    async def __send_notice(self, channel: discord.DMChannel, text: str):
+        return await self.send(channel, text, priority=PRIORITY_NOTICE)
+
+    @property
+    def replies(self) -> ReplyBuffer:
+        if self.__replies is None:
+            self.__replies = ReplyBuffer(self.__send_chunks, self.reply_delay)
+        return self.__replies
+
+    async def __send_chunks(
+        self, message: discord.Message, chunks: List[str]
+    ) -> List[discord.Message]:
+        sent = []
+        for i, chunk in enumerate(chunks):
+            sent += [
+                await self.send(
+                    message.channel,
+                    chunk,
+                    reference=message if self.answer and i == 0 else None,
+                    mention_author=self.answer_mention,
+                )
+            ]
+        return sent
+
+    def reply(self, message: discord.Message, content: str) -> asyncio.Future:
+        # buffered for reply_delay, merged with other replies and split to fit
+        return self.replies.reply(message, content)
+
+    @property
+    def admission(self) -> Optional[AdmissionController]:
+        if self.__admission is None and self.overload_threshold is not None:
+            self.__admission = AdmissionController(
+                self.overload_threshold, self.overload_max_deferred
+            )
+        return self.__admission
+
+    async def __call(
+        self,
+        context: MessageContext,
+        compute: Callable,
+        with_context: bool,
+        timeout: Optional[float],
+    ):
+        if with_context:
+            coroutine = compute(context)
+        else:
+            coroutine = compute(self.client, context.message, *context.args)
+        if timeout is None:
+            await coroutine
+            return
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        try:
+            await asyncio.wait_for(coroutine, timeout)
+        except asyncio.TimeoutError:
+            if loop.time() < deadline:
+                raise  # raised by the command itself
+            raise CommandTimeout() from None
+
+    async def __run(
+        self,
+        context: MessageContext,
+        compute: Callable,
+        with_context: bool,
+        timeout: Optional[float],
+        admitted: bool,
+    ):
+        name = "fallback" if context.command is None else context.command.name
+        t0 = time.perf_counter()
+        if self.enable_metrics:
+            self.metrics.commands.inc(name)
+        try:
+            if len(self.__middlewares) == 0:
+                await self.__call(context, compute, with_context, timeout)
+            else:
+                await self.__middlewares.run(
+                    context,
+                    lambda: self.__call(context, compute, with_context, timeout),
+                )
+        except CommandTimeout:
+            await self.__handle_overload(
+                context.message, OVERLOAD_TIMEOUT, context.args
+            )
+        except Exception as e:
+            if self.enable_metrics:
+                self.metrics.errors.inc(name)
+            self.errors.capture(
+                e,
+                command=None if context.command is None else context.args[0],
+                channel_id=channel_id(context.message),
+            )
+            raise
+        finally:
+            if self.enable_metrics:
+                self.metrics.latency.observe(time.perf_counter() - t0, name)
+            if admitted:
+                self.admission.release()
+
+    async def __handle_overload(
+        self, message: discord.Message, reason: str, command_args: List[str]
+    ):
+        if self.log_calls:
+            debug(message, f"{reason}: {command_args}")
+        if self.__overload is not None:
+            await self.__overload(self.client, message, reason, *command_args)
+
+    async def __handle_throttle(
+        self,
+        message: discord.Message,
+        command: Command,
+        retry_after: float,
+        command_args: List[str],
+    ):
+        if self.log_calls:
+            debug(message, f"throttled ({retry_after:.1f}s): {command_args}")
+        if self.__throttle is not None:
+            await self.__throttle(self.client, message, retry_after, *command_args)
+        elif self.throttle_message is not None:
+            # one notice per bucket until it refills, spamming does not answer each time
+            key = (
+                command.name,
+                *(scope_key(message, limit.scope) for limit in command.rate_limits),
+            )
+            if key in self.__throttle_notices:
+                return
+            self.__throttle_notices.set(key, True, ttl=retry_after)
+            await self.send(
+                message.channel,
+                self.throttle_message.format(retry_after=retry_after),
+                reference=message if self.answer else None,
+                mention_author=self.answer_mention,
+            )
+
+    async def __schedule(
+        self,
+        context: MessageContext,
+        compute: Callable,
+        with_context: bool,
+        timeout: Optional[float] = None,
+        priority: int = DEFAULT_PRIORITY,
+    ):
+        admitted = False
+        if self.admission is not None:
+            if not await self.admission.acquire(priority):
+                self.__rejected("overload")
+                await self.__handle_overload(
+                    context.message, OVERLOAD_REJECTED, context.args
+                )
+                return
+            admitted = True
+        if self.scheduler is None:
+            await self.__run(context, compute, with_context, timeout, admitted)
+        else:
+            self.scheduler.submit(
+                context.channel_key,
+                context.guild_key,
+                self.__run,
+                context,
+                compute,
+                with_context,
+                timeout,
+                admitted,
             )
-            await asyncio.sleep(self.game_change_delay)
+
+    async def __handle_fallback(self, context: MessageContext):
+        if self.__fallback is not None:
+            await self.__schedule(
+                context, self.__fallback, self.__fallback_with_context
+            )
+
+    def __parse(self, context: MessageContext) -> str:
+        # content without the mentions, args only tokenized when read
+        content = context.content
+        if self.remove_mentions:
+            content = mentions_regex.sub("", content)
+        elif context.is_mention:
+            self.__compile_mentions()
+            content = self.__mention_regex.sub("", content, count=1)
+        context.args = Arguments(content)
+        if context.args:
+            context.is_alias = self.alias is not None and context.args[0].startswith(
+                self.alias
+            )
+            if context.is_alias:  # remove alias from first arg
+                context.args[0] = context.args[0][len(self.alias) :]
+            if self.lower_command_names:
+                context.args[0] = context.args[0].lower()
+        return content
 
     async def on_message(self, message: discord.Message, *args):
         if await self.__handle_event("on_message", [message, *args]):
@@ -181,83 +753,140 @@ class Bot(object):
         if message.author == self.client.user:
             return  # Ignore self messages
 
-        if self.__watcher is not None:
-            await self.__watcher(self.client, message)
+        t0 = time.perf_counter()
+        if self.enable_metrics:
+            self.metrics.messages.inc()
 
         is_direct = message.channel.type == discord.ChannelType.private
+        is_mention = self.__is_mention(message)
+        # decided before building or parsing anything, unless watched
+        for_bot = is_direct or is_mention or self.__maybe_alias(message)
+        watched = len(self.__watchers) > 0
 
-        is_mention = (
-            self.any_mention
-            and self.client.user in message.mentions
-            or bool(re.match(f"^<@!?{self.client.user.id}>", message.content))
-        )
+        if not for_bot and not watched:
+            self.__rejected("not_for_bot")
+            return
 
-        if self.remove_mentions:
-            message.content = re.sub(r"<@!?[^>]+>", "", message.content)
-        elif is_mention:
-            message.content = re.sub(
-                f"<@!?{self.client.user.id}>", "", message.content, count=1
-            )
+        context = MessageContext(self.client, message, is_direct, is_mention)
 
-        command_args = parse_arguments(message.content)
+        content = None
+        if for_bot:
+            content = self.__parse(context)
 
-        if len(command_args) == 0:
-            if self.__fallback is not None and is_mention:
-                await self.__fallback(self.client, message, *command_args)
-            return  # Empty message
+        if watched:
+            await self.__watchers.dispatch(self.client, message, context)
+
+        if content is None:
+            self.__rejected("not_for_bot")
+            return
+
+        message.content = content
 
-        is_alias = self.alias is not None and command_args[0].startswith(self.alias)
-        if is_alias:  # remove alias from first arg
-            command_args[0] = command_args[0][len(self.alias) :]
+        if not context.args:
+            self.__rejected("empty")
+            if context.is_mention:
+                await self.__handle_fallback(context)
+            return  # Empty message
 
-        if not is_direct and not is_mention and not is_alias:
+        if not is_direct and not context.is_mention and not context.is_alias:
+            self.__rejected("not_for_bot")
             return  # Not for the bot
 
-        command_found = False
-
-        if self.lower_command_names:
-            command_args[0] = command_args[0].lower()
-
-        for command in self.__commands:
-            if re.match(
-                command.regex,
-                command_args[0],
-            ):
-                if self.log_calls:
-                    debug(message, str(command_args))
-
-                if not is_direct and self.enforce_write_permission:
-                    # Check if bot can respond on current channel or DM user
-                    permissions = message.channel.permissions_for(message.guild.me)
-                    if not permissions.send_messages:
-                        await message.author.create_dm()
-                        await message.author.dm_channel.send(
-                            f"Hi, this bot doesn't have the permission to send a message to"
-                            f" #{message.channel} in server '{message.guild}'"
-                        )
-                        return
-                command_found = True
-                await command.compute(self.client, message, *command_args)
-                break
-
-        if not command_found and self.__fallback is not None:
-            await self.__fallback(self.client, message, *command_args)
+        command = context.command = self.__index.match(context.args[0])
+
+        if command is None:
+            self.__rejected("unknown_command")
+            await self.__handle_fallback(context)
+            return
+
+        if self.log_calls:
+            debug(message, str(context.args))
+
+        if not is_direct and self.enforce_write_permission:
+            # Check if bot can respond on current channel or DM user
+            permissions = self.permission_cache.get(message)
+            if not permissions.send_messages:
+                self.notifier.notify(
+                    message.author,
+                    context.channel_key,
+                    f"Hi, this bot doesn't have the permission to send a message to"
+                    f" #{message.channel} in server '{message.guild}'",
+                )
+                self.__rejected("no_permission")
+                return
+
+        if len(command.rate_limits) > 0:
+            retry_after = consume_all(command.rate_limits, message)
+            if retry_after > 0:
+                self.__rejected("throttled")
+                await self.__handle_throttle(
+                    message, command, retry_after, context.args
+                )
+                return
+
+        if self.enable_metrics:
+            self.metrics.dispatch.observe(time.perf_counter() - t0)
+
+        await self.__schedule(
+            context,
+            command.compute,
+            command.with_context,
+            command.timeout,
+            command.priority,
+        )
 
     async def on_guild_join(self, guild: discord.guild, *args):
+        self.__guilds.add(guild)
         if await self.__handle_event("on_guild_join", [guild, *args]):
             return
 
-        if self.guild_logs_file is not None:
-            with open(self.guild_logs_file, encoding="utf-8", mode="a") as f:
-                f.write(f"{datetime.now():%Y-%m-%d %H:%M} +{guild.id}: {guild.name}\n")
+        if self.guild_log is not None:
+            self.guild_log.write(
+                f"{datetime.now():%Y-%m-%d %H:%M} +{guild.id}: {guild.name}\n"
+            )
 
     async def on_guild_remove(self, guild: discord.guild, *args):
+        self.__guilds.remove(guild)
+        self.permission_cache.invalidate_guild(guild.id)
         if await self.__handle_event("on_guild_remove", [guild, *args]):
             return
 
-        if self.guild_logs_file is not None:
-            with open(self.guild_logs_file, encoding="utf-8", mode="a") as f:
-                f.write(f"{datetime.now():%Y-%m-%d %H:%M} -{guild.id}: {guild.name}\n")
+        if self.guild_log is not None:
+            self.guild_log.write(
+                f"{datetime.now():%Y-%m-%d %H:%M} -{guild.id}: {guild.name}\n"
+            )
+
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        self.permission_cache.invalidate_guild(after.id)
+        await self.__handle_event("on_guild_update", [before, after])
+
+    async def on_guild_role_create(self, role: discord.Role):
+        self.permission_cache.invalidate_guild(role.guild.id)
+        await self.__handle_event("on_guild_role_create", [role])
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.permission_cache.invalidate_guild(after.guild.id)
+        await self.__handle_event("on_guild_role_update", [before, after])
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.permission_cache.invalidate_guild(role.guild.id)
+        await self.__handle_event("on_guild_role_delete", [role])
+
+    async def on_guild_channel_update(
+        self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ):
+        # categories and threads pass their overwrites down, drop the whole guild
+        self.permission_cache.invalidate_guild(after.guild.id)
+        await self.__handle_event("on_guild_channel_update", [before, after])
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self.permission_cache.invalidate_channel(channel.guild.id, channel.id)
+        await self.__handle_event("on_guild_channel_delete", [channel])
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if after.id == self.client.user.id:
+            self.permission_cache.invalidate_guild(after.guild.id)
+        await self.__handle_event("on_member_update", [before, after])
 
     def register_event(self, event_callback: Callable):
         event_name = event_callback.__name__
@@ -267,22 +896,135 @@ class Bot(object):
             self.client.event(event_callback)
 
     def register_command(
-        self, regex: str, compute: CommandFunction, help_short: str, help_long: str
+        self,
+        regex: str,
+        compute: Union[CommandFunction, ContextFunction],
+        help_short: str,
+        help_long: str,
+        *,
+        timeout: Optional[float] = None,
+        priority: int = DEFAULT_PRIORITY,
+        rate_limits: Iterable[RateLimit] = (),
+        with_context: bool = False,
     ):
         if not regex.startswith("^"):
             regex = "^" + regex
         if not regex.endswith("$"):
             regex = regex + "$"
-        self.__commands.insert(0, Command(regex, compute, help_short, help_long))
+        command = Command(
+            regex,
+            compute,
+            help_short,
+            help_long,
+            timeout,
+            priority,
+            rate_limits,
+            with_context,
+        )
+        self.__commands.insert(0, command)
+        self.__index.add(command)
+        self.__help_pages = None
+
+    def register_stats_command(self, owners: Optional[Iterable[int]] = None):
+        # only answers the application owner, or the given user ids
+        if owners is not None:
+            self.__owner_ids = set(owners)
+        tmp_alias = "" if self.alias is None else self.alias
+        self.register_command(
+            "stats",
+            self.stats,
+            "stats: show usage statistics (owner only)",
+            f"```\n"
+            f"* {tmp_alias}stats\n"
+            f"\tShows messages and commands statistics (owner only).\n"
+            f"```",
+            priority=HIGH_PRIORITY,
+        )
 
-    def register_fallback(self, compute: CommandFunction):
+    def register_profile_command(self, owners: Optional[Iterable[int]] = None):
+        # only answers the application owner, or the given user ids
+        if owners is not None:
+            self.__owner_ids = set(owners)
+        tmp_alias = "" if self.alias is None else self.alias
+        self.register_command(
+            "profile",
+            self.profile,
+            "profile: profile a command (owner only)",
+            f"```\n"
+            f"* {tmp_alias}profile <command> [invocations] [{'|'.join(MODES)}]\n"
+            f"\tProfiles the next invocations of a command (default: 10 with {MODES[0]}).\n"
+            f"* {tmp_alias}profile stop\n"
+            f"\tStops profiling.\n"
+            f"```",
+            priority=HIGH_PRIORITY,
+        )
+
+    def register_fallback(
+        self,
+        compute: Union[CommandFunction, ContextFunction],
+        *,
+        with_context: bool = False,
+    ):
         self.__fallback = compute
+        self.__fallback_with_context = with_context
 
-    def register_watcher(self, compute: CommandFunction):
-        self.__watcher = compute
+    def register_overload(self, compute: OverloadFunction):
+        self.__overload = compute
 
-    def start(self):
-        logging.info(f"Current PID: {os.getpid()}")
+    def register_throttle(self, compute: ThrottleFunction):
+        self.__throttle = compute
+
+    def register_watcher(
+        self,
+        compute: Union[WatcherFunction, ContextFunction],
+        *,
+        background: bool = False,
+        backpressure: str = DROP_OLDEST,
+        max_queue: int = 1000,
+        workers: int = 1,
+        guilds: Optional[Iterable[int]] = None,
+        channels: Optional[Iterable[int]] = None,
+        authors: Optional[Iterable[int]] = None,
+        content: Optional[str] = None,
+        has_attachment: Optional[bool] = None,
+        with_context: bool = False,
+    ):
+        self.__watchers.add(
+            Watcher(
+                compute,
+                background,
+                backpressure,
+                max_queue,
+                workers,
+                guilds,
+                channels,
+                authors,
+                content,
+                has_attachment,
+                with_context,
+            )
+        )
+
+    @property
+    def watchers(self) -> WatcherPipeline:
+        return self.__watchers
+
+    def register_middleware(self, middleware: Middleware):
+        self.__middlewares.add(middleware)
+
+    @property
+    def middlewares(self) -> MiddlewareChain:
+        return self.__middlewares
+
+    @property
+    def profiler(self) -> ProfilingMiddleware:
+        # only added to the middlewares once used
+        if self.__profiler is None:
+            self.__profiler = ProfilingMiddleware(self.profiles_dir)
+            self.register_middleware(self.__profiler)
+        return self.__profiler
+
+    def __load_token(self):
         env_file = path.join(os.getcwd(), ".env")
         env_file_found = load_dotenv(env_file)
         self.__token = os.getenv(self.token_env_var)
@@ -295,23 +1037,109 @@ class Bot(object):
                 raise EnvironmentError(
                     f"No environment variable '{self.token_env_var}' found"
                 )
-        self.__t0 = datetime.now()
-        # Launch client and rerun on errors
+
+    @property
+    def errors(self) -> ErrorStore:
+        if self.__errors is None:
+            self.__errors = ErrorStore(
+                self.error_files_dir,
+                self.error_max_entries,
+                self.error_writes_per_minute / 60,
+                header=lambda: f"{self.app_name} v{self.version} started at {self.__t0:%Y-%m-%d %H:%M}\r\n",
+            )
+        return self.__errors
+
+    @property
+    def supervisor(self) -> Supervisor:
+        if self.__supervisor is None:
+            self.__supervisor = Supervisor(
+                base_delay=self.error_restart_delay,
+                max_delay=self.error_max_restart_delay,
+                crash_threshold=self.crash_loop_threshold,
+                crash_window=self.crash_loop_window,
+                cooldown=self.crash_loop_cooldown,
+            )
+        return self.__supervisor
+
+    async def __join_pending(self):
+        # commands and watchers may still answer, notices and replies go through outbound
+        if self.__scheduler is not None:
+            await self.__scheduler.join()
+        await self.__watchers.join()
+        if self.__replies is not None:
+            await self.__replies.join()
+        if self.__notifier is not None:
+            await self.__notifier.join()
+        if self.__outbound is not None:
+            await self.__outbound.join()
+
+    async def __drain(self):
+        self.stop_presence()
+        try:
+            await asyncio.wait_for(self.__join_pending(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"Pending messages dropped after waiting {self.shutdown_timeout}s"
+            )
+
+    async def __connect(self):
+        # reconnects on errors, returns on a clean kill
+        logged_in = False
         while True:
             try:
-                self.client.run(self.__token)
-                break  # clean kill
+                if not logged_in:
+                    await self.client.login(self.__token)
+                    logged_in = True
+                # the gateway session is resumed by discord.py when possible
+                await self.client.connect(reconnect=True)
+                return  # clean kill
+            except (discord.LoginFailure, discord.PrivilegedIntentsRequired):
+                raise  # retrying would not help
             except Exception as e:
-                t = datetime.now()
                 logging.error(f"Exception raised : {repr(e)}")
-                if repr(e) != self.__last_error:
-                    self.__last_error = repr(e)
-                    filename = f"error_{t:%Y-%m-%d_%H-%M-%S}.txt"
-                    with open(filename, "w") as f:
-                        f.write(
-                            f"{self.app_name} v{self.version} started at {self.__t0:%Y-%m-%d %H:%M}\r\n"
-                            f"Exception raised at {t:%Y-%m-%d %H:%M}\r\n"
-                            f"\r\n"
-                            f"{traceback.format_exc()}"
-                        )
-                time.sleep(self.error_restart_delay)
+                self.errors.capture(e)
+                if self.client.is_closed():
+                    # the session is lost, login again on a cleared client
+                    self.client.clear()
+                    logged_in = False
+                delay = self.supervisor.failure()
+                logging.info(f"Restarting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def run_async(self):
+        self.__load_token()
+        self.__t0 = datetime.now()
+        try:
+            if self.enable_metrics and self.metrics_port is not None:
+                await self.metrics.serve(self.metrics_host, self.metrics_port)
+            if self.cluster is not None:
+                self.cluster.start(self)  # reports before ready, for the health timeout
+            # Launch client and reconnect on errors
+            async with self.client:
+                try:
+                    await self.__connect()
+                finally:
+                    await self.__drain()  # while the client can still send
+        finally:  # also when cancelled or when login failed
+            self.stop_presence()
+            if self.cluster is not None:
+                self.cluster.stop()
+            self.__watchers.stop()
+            if self.__notifier is not None:
+                self.__notifier.stop()
+            if self.__outbound is not None:
+                self.__outbound.stop()
+            await self.errors.close()
+            if self.__metrics is not None:
+                await self.__metrics.close()
+            if self.__guild_log is not None:
+                self.__guild_log.close()
+            if self.__state is not None:
+                await self.__state.close()
+
+    def start(self):
+        logging.info(f"Current PID: {os.getpid()}")
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            return
@@ -0,0 +1,59 @@
+from typing import Any, Callable, Coroutine, Hashable, Optional
+
+import discord
+
+from ._discord_utils import channel_key, sender_key
+from ._utils import Arguments
+
+
+class MessageContext(object):
+    # built once per message by Bot.on_message
+    __slots__ = (
+        "client",
+        "message",
+        "content",
+        "args",
+        "is_direct",
+        "is_mention",
+        "is_alias",
+        "command",
+        "__channel_key",
+        "__sender_key",
+    )
+
+    def __init__(
+        self,
+        client: discord.Client,
+        message: discord.Message,
+        is_direct: bool,
+        is_mention: bool,
+    ):
+        self.client = client
+        self.message = message
+        self.content = message.content  # before mentions and alias are removed
+        self.args: Optional[Arguments] = None  # only parsed when for the bot
+        self.is_direct = is_direct
+        self.is_mention = is_mention
+        self.is_alias = False
+        self.command = None
+        self.__channel_key = None
+        self.__sender_key = None
+
+    @property
+    def channel_key(self) -> int:
+        if self.__channel_key is None:
+            self.__channel_key = channel_key(self.message)
+        return self.__channel_key
+
+    @property
+    def sender_key(self) -> int:
+        if self.__sender_key is None:
+            self.__sender_key = sender_key(self.message)
+        return self.__sender_key
+
+    @property
+    def guild_key(self) -> Optional[Hashable]:
+        return None if self.is_direct else self.message.guild.id
+
+
+ContextFunction = Callable[[MessageContext], Coroutine[Any, Any, None]]
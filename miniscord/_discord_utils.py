@@ -1,3 +1,4 @@
+from typing import Union
 import discord
 
 
@@ -24,3 +25,32 @@ def sender_id(message: discord.Message) -> str:
         return f'{channel_id(message)}/{message.author.id}'
     else:
         return message.author.id
+
+# discord ids are 64 bits snowflakes, keys pack them in a single int
+ID_BITS = 64
+ID_MASK = (1 << ID_BITS) - 1
+
+def channel_key(message: discord.Message) -> int:
+    if message.guild is None:
+        return message.author.id
+    return message.guild.id << ID_BITS | message.channel.id
+
+def sender_key(message: discord.Message) -> int:
+    if message.guild is None:
+        return message.author.id
+    return (message.guild.id << ID_BITS | message.channel.id) << ID_BITS | message.author.id
+
+def key_to_id(key: int) -> str:
+    # same format as channel_id / sender_id
+    ids = []
+    while True:
+        ids.insert(0, str(key & ID_MASK))
+        key >>= ID_BITS
+        if key == 0:
+            return '/'.join(ids)
+
+def id_to_key(id_: Union[str, int]) -> int:
+    key = 0
+    for part in str(id_).split('/'):
+        key = key << ID_BITS | int(part)
+    return key
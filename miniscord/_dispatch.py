@@ -0,0 +1,100 @@
+from typing import TYPE_CHECKING, List, Optional
+import re
+
+if TYPE_CHECKING:
+    from ._bot import Command
+
+# characters that make an alternative more than a plain literal name
+regex_special_chars = set(".^$*+?{}[]\\|()")
+# patterns that cannot be safely merged into a combined pattern
+standalone_regex = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def literal_names(regex: str) -> Optional[List[str]]:
+    # "^(help|h)$" -> ["help", "h"], None if not a plain alternation of names
+    body = regex[1:-1]
+    if body.startswith("(") and body.endswith(")"):
+        body = body[1:-1]
+        if body.startswith("?:"):
+            body = body[2:]
+    elif "|" in body:
+        return None  # "^ping|p$" matches names starting with "ping", keep the regex
+    names = body.split("|")
+    for name in names:
+        if any(c in regex_special_chars for c in name):
+            return None
+    return names
+
+
+class CommandIndex(object):
+    def __init__(self):
+        self.__literals = {}
+        self.__regexes = []
+        self.__standalone = []
+        self.__combined = None
+        self.__groups = {}
+        self.__max_regex_order = -1
+        self.__count = 0
+        self.__dirty = False
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def add(self, command: "Command"):
+        # registration order is the priority, last registered wins
+        command.order = self.__count
+        self.__count += 1
+        names = literal_names(command.regex)
+        if names is not None:
+            for name in names:
+                self.__literals[name] = command
+        else:
+            self.__regexes.insert(0, command)
+            self.__max_regex_order = command.order
+            self.__dirty = True
+
+    def __compile(self):
+        self.__groups = {}
+        self.__standalone = []
+        parts = []
+        for command in self.__regexes:
+            if standalone_regex.search(command.regex):
+                self.__standalone += [command]
+                continue
+            group = f"_c{command.order}"
+            self.__groups[group] = command
+            parts += [f"(?P<{group}>{command.regex})"]
+        try:
+            self.__combined = re.compile("|".join(parts)) if parts else None
+        except re.error:
+            # some pattern cannot live in a combined one, match them one by one
+            self.__combined = None
+            self.__standalone = list(self.__regexes)
+        self.__dirty = False
+
+    def __match_regex(self, name: str) -> Optional["Command"]:
+        if self.__dirty:
+            self.__compile()
+        found = None
+        if self.__combined is not None:
+            m = self.__combined.match(name)
+            if m is not None:
+                found = self.__groups[m.lastgroup]
+        for command in self.__standalone:
+            if found is not None and found.order > command.order:
+                break
+            if command.pattern.match(name):
+                found = command
+                break
+        return found
+
+    def match(self, name: str) -> Optional["Command"]:
+        found = self.__literals.get(name)
+        if found is not None and found.order > self.__max_regex_order:
+            return found
+        regex_found = self.__match_regex(name)
+        if regex_found is None:
+            return found
+        if found is None or regex_found.order > found.order:
+            return regex_found
+        return found
@@ -0,0 +1,173 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import traceback
+
+from ._ratelimit import TokenBuckets
+
+
+def fingerprint(e: BaseException) -> str:
+    # type and frames without line numbers or values, stable across edits
+    parts = [f"{type(e).__module__}.{type(e).__qualname__}"]
+    for frame in traceback.extract_tb(e.__traceback__):
+        parts += [f"{os.path.basename(frame.filename)}:{frame.name}:{frame.line}"]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:12]
+
+
+class ErrorRecord(object):
+    __slots__ = (
+        "fingerprint",
+        "type",
+        "message",
+        "traceback",
+        "context",
+        "count",
+        "first_seen",
+        "last_seen",
+    )
+
+    def __init__(self, key: str, e: BaseException, context: Dict[str, Any]):
+        self.fingerprint = key
+        self.type = type(e).__qualname__
+        self.count = 0
+        self.first_seen = datetime.now()
+        self.update(e, context)
+
+    def update(self, e: BaseException, context: Dict[str, Any]):
+        self.message = str(e)
+        self.traceback = "".join(
+            traceback.format_exception(type(e), e, e.__traceback__)
+        )
+        self.context = context
+        self.count += 1
+        self.last_seen = datetime.now()
+
+    def render(self, header: str = "") -> str:
+        context = ", ".join(f"{key}={value}" for key, value in self.context.items())
+        return (
+            f"{header}"
+            f"{self.type}: {self.message}\r\n"
+            f"Seen {self.count} times, first at {self.first_seen:%Y-%m-%d %H:%M:%S}"
+            f", last at {self.last_seen:%Y-%m-%d %H:%M:%S}\r\n"
+            f"Context: {context or '-'}\r\n"
+            f"\r\n"
+            f"{self.traceback}"
+        )
+
+
+class ErrorStore(object):
+    # the least recently seen errors are dropped first
+    def __init__(
+        self,
+        directory: Optional[str] = ".",
+        max_entries: int = 100,
+        write_rate: float = 6 / 60,
+        write_burst: int = 5,
+        header: Callable[[], str] = lambda: "",
+    ):
+        self.directory = directory  # None to keep errors in memory only
+        self.max_entries = max_entries
+        self.header = header
+        self.__records = OrderedDict()
+        self.__pending = OrderedDict()  # fingerprints changed since their last write
+        self.__buckets = TokenBuckets(write_rate, write_burst)
+        self.__task = None
+        self.__writing = None  # executor future of the file being written
+        self.captured = 0
+        self.writes = 0
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def __iter__(self):
+        return iter(list(self.__records.values()))
+
+    def get(self, key: str) -> Optional[ErrorRecord]:
+        return self.__records.get(key)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"error_{key}.txt")
+
+    def capture(self, e: BaseException, **context: Any) -> ErrorRecord:
+        key = fingerprint(e)
+        record = self.__records.get(key)
+        if record is None:
+            record = self.__records[key] = ErrorRecord(key, e, context)
+            while len(self.__records) > self.max_entries:
+                self.__pending.pop(self.__records.popitem(last=False)[0], None)
+        else:
+            record.update(e, context)
+            self.__records.move_to_end(key)
+        self.captured += 1
+        if self.directory is not None:
+            self.__pending[key] = record
+            self.__schedule()
+        return record
+
+    def __schedule(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # written on the next flush
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.ensure_future(self.__work())
+
+    def __write(self, records: List[ErrorRecord]):
+        header = self.header()
+        for record in records:
+            with open(self.path(record.fingerprint), "w") as f:
+                f.write(record.render(header))
+
+    async def __work(self):
+        # repeated errors are coalesced while waiting for a token
+        while len(self.__pending) > 0:
+            retry_after = self.__buckets.retry_after(None, time.monotonic())
+            if retry_after > 0:
+                await asyncio.sleep(retry_after)
+                continue
+            self.__buckets.consume(None, time.monotonic())
+            _, record = self.__pending.popitem(last=False)
+            self.__writing = asyncio.get_running_loop().run_in_executor(
+                None, self.__write, [record]
+            )
+            try:
+                await asyncio.shield(self.__writing)
+                self.writes += 1
+            except OSError:
+                logging.exception(f"Could not save error {record.fingerprint}")
+
+    def flush(self):
+        # writes everything pending now, regardless of the rate limit
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        records = list(self.__pending.values())
+        self.__pending.clear()
+        if len(records) > 0:
+            self.__write(records)
+            self.writes += len(records)
+
+    async def close(self):
+        # waits for the file being written, then writes everything pending
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.__writing is not None and not self.__writing.done():
+            try:
+                await self.__writing
+            except OSError:
+                pass
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "errors": len(self),
+            "captured": self.captured,
+            "writes": self.writes,
+            "pending": len(self.__pending),
+        }
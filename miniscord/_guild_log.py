@@ -0,0 +1,112 @@
+from typing import List
+import atexit
+import logging
+import os
+import threading
+
+
+class GuildLogWriter(object):
+    # lines are buffered and appended to the file from a background thread
+    def __init__(
+        self,
+        path: str,
+        flush_size: int = 100,
+        flush_delay: float = 1,
+        max_bytes: int = 1_000_000,
+        backups: int = 3,
+    ):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_delay = flush_delay
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.__lines = []
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__closed = False
+        self.__flush_requested = False
+        self.__queued = 0  # lines written so far, buffered or not
+        self.__written = 0
+        self.rotations = 0
+
+    def write(self, line: str):
+        with self.__condition:
+            if self.__closed:
+                raise ValueError("Guild log writer is closed")
+            self.__lines += [line]
+            self.__queued += 1
+            if self.__thread is None:
+                self.__thread = threading.Thread(
+                    target=self.__work, name="guild-log", daemon=True
+                )
+                self.__thread.start()
+                atexit.register(self.close)
+            if len(self.__lines) >= self.flush_size:
+                self.__condition.notify_all()
+
+    def __rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def __append(self, lines: List[str]):
+        data = "".join(lines)
+        if (
+            self.max_bytes is not None
+            and os.path.exists(self.path)
+            and os.path.getsize(self.path) > 0
+            and os.path.getsize(self.path) + len(data.encode("utf-8")) > self.max_bytes
+        ):
+            self.__rotate()
+        with open(self.path, encoding="utf-8", mode="a") as f:
+            f.write(data)
+
+    def __work(self):
+        while True:
+            with self.__condition:
+                if not (
+                    len(self.__lines) >= self.flush_size
+                    or self.__flush_requested
+                    or self.__closed
+                ):
+                    self.__condition.wait(self.flush_delay)
+                lines = self.__lines
+                self.__lines = []
+                self.__flush_requested = False
+                closed = self.__closed
+            if len(lines) > 0:
+                try:
+                    self.__append(lines)
+                except OSError:
+                    logging.exception(f"Could not write to {self.path}")
+            with self.__condition:
+                self.__written += len(lines)
+                self.__condition.notify_all()
+            if closed:
+                return
+
+    def flush(self, timeout: float = 10):
+        # blocks until every line written before the call is in the file
+        with self.__condition:
+            target = self.__queued
+            self.__flush_requested = True
+            self.__condition.notify_all()
+            self.__condition.wait_for(
+                lambda: self.__written >= target or self.__thread is None, timeout
+            )
+
+    def close(self):
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify_all()
+            thread = self.__thread
+        if thread is not None:
+            thread.join()
+            atexit.unregister(self.close)
@@ -0,0 +1,43 @@
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+import discord
+
+
+class GuildRegistry(object):
+    # guilds by id, seeded from the gateway cache when first needed
+    def __init__(self, source: Callable[[], Iterable[discord.Guild]]):
+        self.source = source
+        self.__guilds = None
+
+    def __seeded(self) -> dict:
+        if self.__guilds is None:
+            self.seed(self.source())
+        return self.__guilds
+
+    def seed(self, guilds: Iterable[discord.Guild]):
+        self.__guilds = {guild.id: guild for guild in guilds}
+
+    def invalidate(self):
+        # seeded again from the source on next access
+        self.__guilds = None
+
+    def __len__(self) -> int:
+        return len(self.__seeded())
+
+    def __iter__(self) -> Iterator[discord.Guild]:
+        return iter(list(self.__seeded().values()))
+
+    def __contains__(self, guild: Union[discord.Guild, int]) -> bool:
+        return getattr(guild, "id", guild) in self.__seeded()
+
+    def get(self, guild_id: int) -> Optional[discord.Guild]:
+        return self.__seeded().get(guild_id)
+
+    def add(self, guild: discord.Guild) -> bool:
+        guilds = self.__seeded()
+        added = guild.id not in guilds
+        guilds[guild.id] = guild
+        return added
+
+    def remove(self, guild: Union[discord.Guild, int]) -> bool:
+        return self.__seeded().pop(getattr(guild, "id", guild), None) is not None
@@ -0,0 +1,216 @@
+from typing import Iterable, List, Optional, Tuple
+from bisect import bisect_left
+import asyncio
+import logging
+
+# seconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+DISPATCH_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs += [extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    # plain ints updated from the event loop, no lock needed
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> count
+
+    def inc(self, *labels: str, amount: int = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> int:
+        return self.values.get(labels, 0)
+
+    def total(self) -> int:
+        return sum(self.values.values())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines += [f"{self.name}{_labels(self.labels, labels)} {value}"]
+        return lines
+
+
+class Histogram(object):
+    # each series is the count of every bucket (+Inf last) then the sum
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+        labels: Iterable[str] = (),
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        self.series = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self.series.get(labels)
+        return 0 if series is None else sum(series[:-1])
+
+    def sum(self, *labels: str) -> float:
+        series = self.series.get(labels)
+        return 0.0 if series is None else series[-1]
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        # upper bound of the bucket holding the quantile
+        series = self.series.get(labels)
+        if series is None:
+            return None
+        target = q * sum(series[:-1])
+        seen = 0
+        for i, count in enumerate(series[:-1]):
+            seen += count
+            if seen >= target and count > 0:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines += [
+                    f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}"
+                ]
+            lines += [
+                f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-1])}",
+                f"{self.name}_count{_labels(self.labels, labels)} {cumulative}",
+            ]
+        return lines
+
+
+class Metrics(object):
+    def __init__(self, namespace: str = "miniscord"):
+        self.namespace = namespace
+        self.__metrics = {}
+        self.__server = None
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        name = f"{self.namespace}_{name}"
+        if name not in self.__metrics:
+            self.__metrics[name] = Counter(name, help, labels)
+        return self.__metrics[name]
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+        labels: Iterable[str] = (),
+    ) -> Histogram:
+        name = f"{self.namespace}_{name}"
+        if name not in self.__metrics:
+            self.__metrics[name] = Histogram(name, help, buckets, labels)
+        return self.__metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.__metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    async def __handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1] == b"/metrics":
+                status, body = "200 OK", self.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n"
+                f"\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9100) -> int:
+        # returns the port, useful with port 0
+        if self.__server is None:
+            self.__server = await asyncio.start_server(self.__handle, host, port)
+            port = self.__server.sockets[0].getsockname()[1]
+            logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return self.__server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+
+class BotMetrics(Metrics):
+    def __init__(self, namespace: str = "miniscord"):
+        super().__init__(namespace)
+        self.messages = self.counter("messages_total", "Messages received")
+        self.rejected = self.counter(
+            "messages_rejected_total", "Messages not run as a command", ["reason"]
+        )
+        self.dispatch = self.histogram(
+            "dispatch_seconds",
+            "Time from receiving a message to running its command",
+            DISPATCH_BUCKETS,
+        )
+        self.commands = self.counter("commands_total", "Commands run", ["command"])
+        self.errors = self.counter(
+            "command_errors_total", "Commands that raised an exception", ["command"]
+        )
+        self.latency = self.histogram(
+            "command_seconds", "Command run time", LATENCY_BUCKETS, ["command"]
+        )
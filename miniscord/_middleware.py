@@ -0,0 +1,91 @@
+from typing import Any, Callable, Coroutine, List, Optional
+import asyncio
+import time
+
+from ._context import MessageContext
+
+
+class Middleware(object):
+    # override the hooks needed, elapsed is the command run time in seconds
+    async def before(self, context: MessageContext) -> Optional[bool]:
+        pass  # return False to skip the command
+
+    async def after(self, context: MessageContext, elapsed: float):
+        pass
+
+    async def on_error(
+        self, context: MessageContext, error: BaseException, elapsed: float
+    ) -> Optional[bool]:
+        pass  # return True if the error was handled, cancellations are not
+
+
+class MiddlewareChain(object):
+    # before hooks run in order, after and on_error hooks in reverse order
+    def __init__(self):
+        self.__middlewares = []
+
+    def __len__(self) -> int:
+        return len(self.__middlewares)
+
+    def __iter__(self):
+        return iter(list(self.__middlewares))
+
+    def add(self, middleware: Middleware):
+        self.__middlewares += [middleware]
+
+    def remove(self, middleware: Middleware) -> bool:
+        if middleware not in self.__middlewares:
+            return False
+        self.__middlewares.remove(middleware)
+        return True
+
+    async def run(
+        self, context: MessageContext, call: Callable[[], Coroutine[Any, Any, Any]]
+    ) -> bool:
+        # returns False if a middleware skipped the command
+        entered = []
+        try:
+            for middleware in self.__middlewares:
+                if await middleware.before(context) is False:
+                    await self.__after(entered, context, 0.0)
+                    return False
+                entered += [middleware]
+        except asyncio.CancelledError as e:
+            await self.__cancelled(entered, context, e, 0.0)
+            raise
+        t0 = time.perf_counter()
+        try:
+            await call()
+        except asyncio.CancelledError as e:
+            await self.__cancelled(entered, context, e, time.perf_counter() - t0)
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - t0
+            handled = False
+            for middleware in reversed(entered):
+                handled = (
+                    bool(await middleware.on_error(context, e, elapsed)) or handled
+                )
+            if not handled:
+                raise
+            return True
+        await self.__after(entered, context, time.perf_counter() - t0)
+        return True
+
+    @staticmethod
+    async def __after(
+        entered: List[Middleware], context: MessageContext, elapsed: float
+    ):
+        for middleware in reversed(entered):
+            await middleware.after(context, elapsed)
+
+    @staticmethod
+    async def __cancelled(
+        entered: List[Middleware],
+        context: MessageContext,
+        error: asyncio.CancelledError,
+        elapsed: float,
+    ):
+        # teardown still runs, the cancellation is raised again whatever they return
+        for middleware in reversed(entered):
+            await middleware.on_error(context, error, elapsed)
@@ -0,0 +1,173 @@
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional, Tuple
+from collections import deque
+import asyncio
+import heapq
+import itertools
+import time
+
+from ._ratelimit import TokenBuckets
+
+SendFunction = Callable[..., Coroutine[Any, Any, Any]]
+
+# higher is sent first, like command priorities
+PRIORITY_PRESENCE = 0
+PRIORITY_NOTICE = 1
+PRIORITY_REPLY = 2
+PRIORITIES = (PRIORITY_REPLY, PRIORITY_NOTICE, PRIORITY_PRESENCE)
+
+GLOBAL_ROUTE = "global"
+
+
+class _Request(object):
+    __slots__ = ("route", "function", "args", "kwargs", "future")
+
+    def __init__(
+        self,
+        route: Hashable,
+        function: SendFunction,
+        args: tuple,
+        kwargs: dict,
+        future: asyncio.Future,
+    ):
+        self.route = route
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+
+class OutboundScheduler(object):
+    def __init__(self, rate: float = 50, route_rate: float = 1, route_burst: int = 5):
+        self.rate = rate
+        self.__global = TokenBuckets(rate, max(1, int(rate)))
+        self.__routes = TokenBuckets(route_rate, route_burst)
+        # per priority, one FIFO per route and the routes that may send now
+        self.__queues = {priority: {} for priority in PRIORITIES}
+        self.__ready = {priority: deque() for priority in PRIORITIES}
+        self.__waiting = []  # heap of (ready at, order, priority, route) exhausted
+        self.__order = itertools.count()
+        self.__counts = {priority: 0 for priority in PRIORITIES}
+        self.__wakeup = None
+        self.__worker = None
+        self.__tasks = set()
+        self.sent = {priority: 0 for priority in PRIORITIES}
+
+    @property
+    def queued(self) -> int:
+        return sum(self.__counts.values())
+
+    def submit(
+        self,
+        priority: int,
+        route: Optional[Hashable],
+        function: SendFunction,
+        *args,
+        **kwargs,
+    ) -> asyncio.Future:
+        if self.__worker is None:
+            self.__wakeup = asyncio.Event()
+            self.__worker = asyncio.ensure_future(self.__work())
+        future = asyncio.get_event_loop().create_future()
+        queues = self.__queues[priority]
+        queue = queues.get(route)
+        if queue is None:  # routes with requests are either ready or waiting
+            queue = queues[route] = deque()
+            self.__ready[priority].append(route)
+        queue.append(_Request(route, function, args, kwargs, future))
+        self.__counts[priority] += 1
+        self.__wakeup.set()
+        return future
+
+    def __pop_ready(
+        self, now: float
+    ) -> Tuple[Optional[_Request], Optional[int], Optional[float]]:
+        # by priority, routes take turns, exhausted ones wait aside until refilled
+        while len(self.__waiting) > 0 and self.__waiting[0][0] <= now:
+            _, _, priority, route = heapq.heappop(self.__waiting)
+            self.__ready[priority].append(route)
+        for priority in PRIORITIES:
+            ready = self.__ready[priority]
+            while len(ready) > 0:
+                route = ready.popleft()
+                retry_after = self.__routes.retry_after(route, now)
+                if retry_after > 0:
+                    heapq.heappush(
+                        self.__waiting,
+                        (now + retry_after, next(self.__order), priority, route),
+                    )
+                    continue
+                queue = self.__queues[priority][route]
+                request = queue.popleft()
+                if len(queue) > 0:
+                    ready.append(route)
+                else:
+                    del self.__queues[priority][route]
+                self.__counts[priority] -= 1
+                return request, priority, 0
+        if len(self.__waiting) == 0:
+            return None, None, None
+        return None, None, self.__waiting[0][0] - now
+
+    async def __sleep(self, delay: float):
+        self.__wakeup.clear()
+        try:
+            await asyncio.wait_for(self.__wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def __work(self):
+        # only runs while there is something to send
+        while self.queued > 0:
+            now = time.monotonic()
+            wait = self.__global.retry_after(GLOBAL_ROUTE, now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            request, priority, wait = self.__pop_ready(now)
+            if request is None:
+                await self.__sleep(wait)
+                continue
+            self.__global.consume(GLOBAL_ROUTE, now)
+            self.__routes.consume(request.route, now)
+            self.sent[priority] += 1
+            task = asyncio.ensure_future(self.__run(request))
+            self.__tasks.add(task)
+            task.add_done_callback(self.__tasks.discard)
+        self.__worker = None
+
+    @staticmethod
+    async def __run(request: _Request):
+        if request.future.cancelled():
+            return
+        try:
+            result = await request.function(*request.args, **request.kwargs)
+        except Exception as e:
+            if not request.future.cancelled():
+                request.future.set_exception(e)
+        else:
+            if not request.future.cancelled():
+                request.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": dict(self.__counts),
+            "sent": dict(self.sent),
+        }
+
+    async def join(self):
+        while self.__worker is not None or len(self.__tasks) > 0:
+            await asyncio.gather(self.__worker or asyncio.sleep(0), *self.__tasks)
+
+    def stop(self):
+        if self.__worker is not None:
+            self.__worker.cancel()
+        self.__worker = None
+        for queues in self.__queues.values():
+            for queue in queues.values():
+                for request in queue:
+                    request.future.cancel()
+            queues.clear()
+        for ready in self.__ready.values():
+            ready.clear()
+        self.__waiting = []
+        self.__counts = {priority: 0 for priority in PRIORITIES}
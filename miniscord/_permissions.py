@@ -0,0 +1,125 @@
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+import discord
+
+
+class PermissionCache(object):
+    def __init__(self):
+        self.__guilds = {}  # guild id -> channel id -> bot permissions
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(len(channels) for channels in self.__guilds.values())
+
+    def get(self, message: discord.Message) -> discord.Permissions:
+        channels = self.__guilds.get(message.guild.id)
+        if channels is None:
+            channels = self.__guilds[message.guild.id] = {}
+        permissions = channels.get(message.channel.id)
+        if permissions is None:
+            self.misses += 1
+            permissions = message.channel.permissions_for(message.guild.me)
+            channels[message.channel.id] = permissions
+        else:
+            self.hits += 1
+        return permissions
+
+    def invalidate_guild(self, guild_id: Hashable):
+        self.__guilds.pop(guild_id, None)
+
+    def invalidate_channel(self, guild_id: Hashable, channel_id: Hashable):
+        channels = self.__guilds.get(guild_id)
+        if channels is not None:
+            channels.pop(channel_id, None)
+
+    def clear(self):
+        self.__guilds = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+
+NoticeFunction = Callable[[discord.DMChannel, str], Coroutine[Any, Any, Any]]
+
+
+class PermissionNotifier(object):
+    def __init__(
+        self,
+        window: float = 600,
+        max_dm_channels: int = 1000,
+        send: Optional[NoticeFunction] = None,
+    ):
+        self.window = window
+        self.max_dm_channels = max_dm_channels
+        self.__send = send
+        self.__sent = OrderedDict()  # (user id, channel key) -> time sent
+        self.__dm_channels = OrderedDict()  # user id -> DM channel
+        self.__queue = None
+        self.__worker = None
+        self.sent = 0
+        self.deduplicated = 0
+
+    def __forget_expired(self, now: float):
+        # entries are in sending order, expired ones are at the front
+        while len(self.__sent) > 0:
+            key, sent = next(iter(self.__sent.items()))
+            if now - sent < self.window:
+                return
+            del self.__sent[key]
+
+    def notify(self, user: discord.abc.User, channel_key: Hashable, text: str) -> bool:
+        self.__forget_expired(time.monotonic())
+        key = (user.id, channel_key)
+        if key in self.__sent:
+            self.deduplicated += 1
+            return False
+        self.__sent[key] = time.monotonic()
+        if self.__queue is None:
+            self.__queue = asyncio.Queue()
+            self.__worker = asyncio.ensure_future(self.__work())
+        self.__queue.put_nowait((user, text))
+        return True
+
+    async def __dm_channel(self, user: discord.abc.User) -> discord.DMChannel:
+        channel = self.__dm_channels.get(user.id)
+        if channel is not None:
+            self.__dm_channels.move_to_end(user.id)
+            return channel
+        channel = await user.create_dm()
+        self.__dm_channels[user.id] = channel
+        if len(self.__dm_channels) > self.max_dm_channels:
+            self.__dm_channels.popitem(last=False)
+        return channel
+
+    async def __work(self):
+        # one notice at a time, they never take priority over replies
+        while True:
+            user, text = await self.__queue.get()
+            try:
+                channel = await self.__dm_channel(user)
+                if self.__send is None:
+                    await channel.send(text)
+                else:
+                    await self.__send(channel, text)
+                self.sent += 1
+            except discord.HTTPException as e:
+                logging.warning(f"Could not notify {user}: {repr(e)}")
+            except Exception:
+                logging.exception(f"Could not notify {user}")
+            finally:
+                self.__queue.task_done()
+
+    async def join(self):
+        if self.__queue is not None:
+            await self.__queue.join()
+
+    def stop(self):
+        if self.__worker is not None:
+            self.__worker.cancel()
+        self.__queue = None
+        self.__worker = None
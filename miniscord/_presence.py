@@ -0,0 +1,75 @@
+from typing import Any, Callable, Coroutine
+import asyncio
+import logging
+import time
+
+from ._ratelimit import TokenBuckets
+
+# discord allows 5 presence updates per minute
+PRESENCE_RATE = 5 / 60
+PRESENCE_BURST = 5
+
+
+class PresenceRotator(object):
+    def __init__(
+        self,
+        generate: Callable[[], str],
+        update: Callable[[str], Coroutine[Any, Any, Any]],
+        delay: float = 10,
+        rate: float = PRESENCE_RATE,
+        burst: int = PRESENCE_BURST,
+    ):
+        self.generate = generate
+        self.update = update
+        self.delay = delay
+        self.__buckets = TokenBuckets(rate, burst)
+        self.__task = None
+        self.__wakeup = None
+        self.__last = None  # last text sent
+        self.updates = 0
+        self.skipped = 0
+
+    @property
+    def running(self) -> bool:
+        return self.__task is not None and not self.__task.done()
+
+    def start(self) -> bool:
+        # a new session starts without presence, send it again
+        self.__last = None
+        if self.running:
+            self.__wakeup.set()
+            return False
+        self.__wakeup = asyncio.Event()
+        self.__task = asyncio.ensure_future(self.__work())
+        return True
+
+    def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+        self.__task = None
+
+    async def tick(self) -> bool:
+        text = self.generate()
+        if text == self.__last:
+            self.skipped += 1
+            return False
+        retry_after = self.__buckets.retry_after(None, time.monotonic())
+        if retry_after > 0:
+            await asyncio.sleep(retry_after)
+        self.__buckets.consume(None, time.monotonic())
+        await self.update(text)
+        self.__last = text
+        self.updates += 1
+        return True
+
+    async def __work(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logging.exception("Could not change presence")
+            self.__wakeup.clear()
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), self.delay)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,137 @@
+from typing import Optional
+from datetime import datetime
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import tracemalloc
+
+from ._context import MessageContext
+from ._middleware import Middleware
+
+MODE_CPU = "cprofile"
+MODE_MEMORY = "tracemalloc"
+MODES = (MODE_CPU, MODE_MEMORY)
+
+
+class ProfilingMiddleware(Middleware):
+    # samples one invocation at a time, other tasks running meanwhile are
+    # included in the cprofile results
+    def __init__(self, directory: str = ".", top: int = 30):
+        self.directory = directory
+        self.top = top  # lines in the reports
+        self.command = None
+        self.mode = None
+        self.invocations = 0
+        self.sampled = 0
+        self.reports = []  # paths of the reports written
+        self.__profile = None
+        self.__memory = None  # traceback -> [size diff, count diff]
+        self.__snapshot = None
+        self.__started_tracing = False
+        self.__current = None  # context being sampled
+
+    @property
+    def running(self) -> bool:
+        return self.command is not None
+
+    def start(self, command: str, invocations: int = 10, mode: str = MODE_CPU):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', use one of {MODES}")
+        self.stop()
+        self.command = command
+        self.mode = mode
+        self.invocations = invocations
+        self.sampled = 0
+        if mode == MODE_CPU:
+            self.__profile = cProfile.Profile()
+        else:
+            self.__memory = {}
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.__started_tracing = True
+
+    def stop(self):
+        if self.__current is not None and self.__profile is not None:
+            self.__profile.disable()
+        if self.__started_tracing:
+            tracemalloc.stop()
+        self.command = self.mode = self.__current = None
+        self.__profile = self.__memory = self.__snapshot = None
+        self.__started_tracing = False
+
+    def __matches(self, context: MessageContext) -> bool:
+        return context.command is not None and self.command in (
+            context.command.name,
+            context.args[0],
+        )
+
+    async def before(self, context: MessageContext) -> Optional[bool]:
+        if self.running and self.__current is None and self.__matches(context):
+            self.__current = context
+            if self.__profile is not None:
+                self.__profile.enable()
+            else:
+                self.__snapshot = tracemalloc.take_snapshot()
+        return True
+
+    async def after(self, context: MessageContext, elapsed: float):
+        if context is not self.__current:
+            return
+        self.__current = None
+        if self.__profile is not None:
+            self.__profile.disable()
+        else:
+            stats = tracemalloc.take_snapshot().compare_to(self.__snapshot, "lineno")
+            self.__snapshot = None
+            for stat in stats:
+                total = self.__memory.setdefault(str(stat.traceback), [0, 0])
+                total[0] += stat.size_diff
+                total[1] += stat.count_diff
+        self.sampled += 1
+        if self.sampled >= self.invocations:
+            await self.__dump()
+
+    async def on_error(
+        self, context: MessageContext, error: BaseException, elapsed: float
+    ) -> Optional[bool]:
+        await self.after(context, elapsed)
+        return False
+
+    def report(self) -> str:
+        header = (
+            f"{self.mode} of '{self.command}' over {self.sampled} invocations"
+            f" at {datetime.now():%Y-%m-%d %H:%M:%S}\n\n"
+        )
+        if self.__profile is not None:
+            output = io.StringIO()
+            stats = pstats.Stats(self.__profile, stream=output)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            return header + output.getvalue()
+        lines = sorted(self.__memory.items(), key=lambda item: -abs(item[1][0]))
+        return header + "".join(
+            f"{where}: {size / 1024:+.1f} KiB, {count:+d} blocks\n"
+            for where, (size, count) in lines[: self.top]
+        )
+
+    def __write(self, path: str, text: str):
+        with open(path, "w") as f:
+            f.write(text)
+
+    async def __dump(self):
+        name = "".join(c if c.isalnum() else "_" for c in self.command)
+        path = os.path.join(
+            self.directory, f"profile_{name}_{datetime.now():%Y-%m-%d_%H-%M-%S}.txt"
+        )
+        text = self.report()
+        self.stop()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.__write, path, text
+            )
+            self.reports += [path]
+            logging.info(f"Profiling report written to {path}")
+        except OSError:
+            logging.exception(f"Could not write profiling report to {path}")
@@ -0,0 +1,191 @@
+from typing import Hashable, Optional
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+import discord
+
+from ._backends import StateBackend, storage_key
+from ._discord_utils import channel_key, sender_key
+
+SCOPE_SENDER = "sender"
+SCOPE_CHANNEL = "channel"
+SCOPE_GUILD = "guild"
+
+
+def scope_key(message: discord.Message, scope: str) -> Hashable:
+    if scope == SCOPE_SENDER:
+        return sender_key(message)
+    if scope == SCOPE_CHANNEL:
+        return channel_key(message)
+    if message.guild is None:
+        return message.author.id
+    return message.guild.id
+
+
+class TokenBuckets(object):
+    # one token bucket per key, state is a (tokens, last update) tuple
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        max_evictions: int = 2,
+        backend: Optional[StateBackend] = None,
+        prefix: str = "",
+        sync_delay: float = 1,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_evictions = max_evictions
+        # tokens taken are merged into the backend buckets every sync_delay
+        self.backend = backend
+        self.prefix = prefix
+        self.sync_delay = sync_delay
+        self.__full_after = burst / rate
+        self.__buckets = OrderedDict()
+        self.__taken = {}  # key -> tokens taken since the last sync
+        self.__task = None
+        self.syncs = 0
+
+    def __len__(self) -> int:
+        return len(self.__buckets)
+
+    def __tokens(self, key: Hashable, now: float) -> float:
+        state = self.__buckets.get(key)
+        if state is None:
+            return self.burst
+        return min(self.burst, state[0] + (now - state[1]) * self.rate)
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        tokens = self.__tokens(key, now)
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) / self.rate
+
+    def consume(self, key: Hashable, now: Optional[float] = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        tokens = self.__tokens(key, now)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+        self.__buckets[key] = (tokens - 1, now)
+        self.__buckets.move_to_end(key)
+        self.__evict(now)
+        if self.backend is not None:
+            self.__taken[key] = self.__taken.get(key, 0) + 1
+            self.__schedule()
+        return 0.0
+
+    def __evict(self, now: float):
+        # least recently used buckets come first, forget them once refilled
+        for _ in range(self.max_evictions):
+            if len(self.__buckets) == 0:
+                return
+            key = next(iter(self.__buckets))
+            if now - self.__buckets[key][1] < self.__full_after:
+                return
+            del self.__buckets[key]
+
+    def __schedule(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # merged on the next sync
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.ensure_future(self.__work())
+
+    async def __work(self):
+        while len(self.__taken) > 0:
+            await asyncio.sleep(self.sync_delay)
+            try:
+                await self.sync()
+            except Exception:
+                logging.exception("Could not sync rate limits with the backend")
+
+    async def sync(self):
+        # shared buckets are (tokens, wall clock time), calls made by other
+        # processes between two syncs are only seen afterwards
+        taken = self.__taken
+        self.__taken = {}
+        if len(taken) == 0:
+            return
+        keys = list(taken)
+        storage_keys = [f"{self.prefix}{storage_key(key)}" for key in keys]
+        try:
+            states = await self.backend.get_many(storage_keys)
+        except BaseException:
+            for key, count in taken.items():
+                self.__taken[key] = self.__taken.get(key, 0) + count
+            raise
+        now = time.monotonic()
+        wall = time.time()
+        shared = {}
+        for key, storage, state in zip(keys, storage_keys, states):
+            if state is None:  # first one to use it, start from the local bucket
+                tokens = self.__tokens(key, now) + self.__taken.get(key, 0)
+            else:
+                refill = (wall - state[1]) * self.rate
+                tokens = min(self.burst, state[0] + refill) - taken[key]
+            tokens = max(0.0, tokens)
+            shared[storage] = [tokens, wall]
+            # taken while waiting for the backend, merged on the next sync
+            local = tokens - self.__taken.get(key, 0)
+            self.__buckets[key] = (max(0.0, local), now)
+            self.__buckets.move_to_end(key)
+        await self.backend.set_many(shared, self.__full_after)
+        self.syncs += 1
+
+
+class RateLimit(object):
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        scope: str = SCOPE_SENDER,
+        backend: Optional[StateBackend] = None,
+        name: Optional[str] = None,
+        sync_delay: float = 1,
+    ):
+        if scope not in (SCOPE_SENDER, SCOPE_CHANNEL, SCOPE_GUILD):
+            raise ValueError(f"Unknown rate limit scope '{scope}'")
+        if backend is not None and name is None:
+            raise ValueError("Rate limits synced with a backend need a name")
+        self.rate = rate
+        self.burst = burst
+        self.scope = scope
+        self.name = name  # identifies the shared buckets in the backend
+        self.buckets = TokenBuckets(
+            rate,
+            burst,
+            backend=backend,
+            prefix=f"ratelimit:{name}:{scope}:",
+            sync_delay=sync_delay,
+        )
+
+    @classmethod
+    def cooldown(
+        cls,
+        seconds: float,
+        scope: str = SCOPE_SENDER,
+        backend: Optional[StateBackend] = None,
+        name: Optional[str] = None,
+    ) -> "RateLimit":
+        return cls(1 / seconds, 1, scope, backend, name)
+
+
+def consume_all(rate_limits: list, message: discord.Message) -> float:
+    # only take tokens when every bucket allows the call
+    now = time.monotonic()
+    keys = [scope_key(message, rate_limit.scope) for rate_limit in rate_limits]
+    retry_after = max(
+        rate_limit.buckets.retry_after(key, now)
+        for rate_limit, key in zip(rate_limits, keys)
+    )
+    if retry_after > 0:
+        return retry_after
+    for rate_limit, key in zip(rate_limits, keys):
+        rate_limit.buckets.consume(key, now)
+    return 0.0
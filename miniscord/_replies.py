@@ -0,0 +1,71 @@
+from typing import Any, Callable, Coroutine, List
+import asyncio
+
+import discord
+
+from ._utils import split_message, MAX_MESSAGE_LENGTH
+
+SendFunction = Callable[
+    [discord.Message, List[str]], Coroutine[Any, Any, List[discord.Message]]
+]
+
+
+class _PendingReply(object):
+    __slots__ = ("message", "parts", "future", "handle")
+
+    def __init__(self, message: discord.Message, future: asyncio.Future):
+        self.message = message
+        self.parts = []
+        self.future = future
+        self.handle = None
+
+
+class ReplyBuffer(object):
+    def __init__(
+        self, send: SendFunction, delay: float = 0.1, limit: int = MAX_MESSAGE_LENGTH
+    ):
+        self.send = send
+        self.delay = delay
+        self.limit = limit
+        self.__pending = {}  # channel id -> _PendingReply
+        self.__tasks = set()
+
+    def reply(self, message: discord.Message, content: str) -> asyncio.Future:
+        key = message.channel.id
+        pending = self.__pending.get(key)
+        if pending is not None and pending.message is not message:
+            # answering another message, send what was buffered for the previous one
+            self.flush(key)
+            pending = None
+        if pending is None:
+            loop = asyncio.get_event_loop()
+            pending = self.__pending[key] = _PendingReply(message, loop.create_future())
+            pending.handle = loop.call_later(self.delay, self.flush, key)
+        pending.parts += [content]
+        # cancelling one caller must not cancel the merged reply for the others
+        return asyncio.shield(pending.future)
+
+    def flush(self, key: Any):
+        pending = self.__pending.pop(key, None)
+        if pending is None:
+            return
+        pending.handle.cancel()
+        task = asyncio.ensure_future(self.__send(pending))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def __send(self, pending: _PendingReply):
+        try:
+            chunks = split_message("\n".join(pending.parts), self.limit)
+            result = await self.send(pending.message, chunks)
+            if not pending.future.done():
+                pending.future.set_result(result)
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+
+    async def join(self):
+        for key in list(self.__pending):
+            self.flush(key)
+        while len(self.__tasks) > 0:
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
@@ -0,0 +1,180 @@
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional
+from collections import deque
+import asyncio
+import logging
+
+JobFunction = Callable[..., Coroutine[Any, Any, None]]
+
+
+class _Guild(object):
+    __slots__ = ("semaphore", "channels", "in_flight")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.channels = 0
+        self.in_flight = 0
+
+
+class CommandScheduler(object):
+    def __init__(self, max_concurrent: int, max_per_guild: Optional[int] = None):
+        self.max_concurrent = max_concurrent
+        self.max_per_guild = max_per_guild
+        self.__semaphore = None
+        self.__queues = {}  # channel key -> deque of pending jobs
+        self.__running = {}  # channel key -> jobs started (0 or 1)
+        self.__guilds = {}  # guild key -> _Guild
+        self.__workers = set()
+        self.queued = 0
+        self.in_flight = 0
+
+    def submit(
+        self,
+        channel_key: Hashable,
+        guild_key: Optional[Hashable],
+        function: JobFunction,
+        *args,
+    ):
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.queued += 1
+        queue = self.__queues.get(channel_key)
+        if queue is not None:
+            queue.append((function, args))
+            return
+        # first job for this channel, start its worker
+        self.__queues[channel_key] = deque([(function, args)])
+        self.__running[channel_key] = 0
+        worker = asyncio.ensure_future(self.__run_channel(channel_key, guild_key))
+        self.__workers.add(worker)
+        worker.add_done_callback(self.__workers.discard)
+
+    def __enter_guild(self, guild_key: Optional[Hashable]) -> Optional[_Guild]:
+        if guild_key is None or self.max_per_guild is None:
+            return None
+        guild = self.__guilds.get(guild_key)
+        if guild is None:
+            guild = self.__guilds[guild_key] = _Guild(self.max_per_guild)
+        guild.channels += 1
+        return guild
+
+    def __exit_guild(self, guild_key: Optional[Hashable], guild: Optional[_Guild]):
+        if guild is None:
+            return
+        guild.channels -= 1
+        if guild.channels == 0:
+            del self.__guilds[guild_key]
+
+    async def __run_job(self, channel_key: Hashable, guild: Optional[_Guild]):
+        queue = self.__queues[channel_key]
+        async with self.__semaphore:
+            function, args = queue.popleft()
+            self.queued -= 1
+            self.in_flight += 1
+            self.__running[channel_key] += 1
+            if guild is not None:
+                guild.in_flight += 1
+            try:
+                await function(*args)
+            except Exception:
+                logging.exception(
+                    f"Exception raised in scheduled job for {channel_key}"
+                )
+            finally:
+                self.in_flight -= 1
+                self.__running[channel_key] -= 1
+                if guild is not None:
+                    guild.in_flight -= 1
+
+    async def __run_channel(self, channel_key: Hashable, guild_key: Optional[Hashable]):
+        guild = self.__enter_guild(guild_key)
+        queue = self.__queues[channel_key]
+        try:
+            # jobs of a channel run one after the other, in order
+            while len(queue) > 0:
+                if guild is None:
+                    await self.__run_job(channel_key, guild)
+                else:
+                    async with guild.semaphore:
+                        await self.__run_job(channel_key, guild)
+        finally:
+            self.queued -= len(queue)
+            del self.__queues[channel_key]
+            del self.__running[channel_key]
+            self.__exit_guild(guild_key, guild)
+
+    def queue_depth(self, channel_key: Hashable) -> int:
+        queue = self.__queues.get(channel_key)
+        if queue is None:
+            return 0
+        return len(queue)
+
+    def channel_in_flight(self, channel_key: Hashable) -> int:
+        return self.__running.get(channel_key, 0)
+
+    def guild_in_flight(self, guild_key: Hashable) -> int:
+        guild = self.__guilds.get(guild_key)
+        if guild is None:
+            return 0
+        return guild.in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "channels": {
+                key: (len(queue), self.__running[key])
+                for key, queue in self.__queues.items()
+            },
+            "guilds": {key: guild.in_flight for key, guild in self.__guilds.items()},
+        }
+
+    async def join(self):
+        while len(self.__workers) > 0:
+            await asyncio.gather(*self.__workers)
+
+
+LOW_PRIORITY = -1
+DEFAULT_PRIORITY = 0
+HIGH_PRIORITY = 10
+
+
+class AdmissionController(object):
+    def __init__(
+        self, threshold: int, max_deferred: int = 0, high_priority: int = HIGH_PRIORITY
+    ):
+        self.threshold = threshold
+        self.max_deferred = max_deferred
+        self.high_priority = high_priority
+        self.in_flight = 0
+        self.deferred = 0
+        self.rejected = 0
+        self.__waiters = deque()
+
+    async def acquire(self, priority: int = DEFAULT_PRIORITY) -> bool:
+        if self.in_flight < self.threshold or priority >= self.high_priority:
+            self.in_flight += 1
+            return True
+        if priority <= LOW_PRIORITY or self.deferred >= self.max_deferred:
+            self.rejected += 1
+            return False
+        # wait for the load to go back under the threshold
+        waiter = asyncio.get_event_loop().create_future()
+        self.__waiters.append(waiter)
+        self.deferred += 1
+        try:
+            await waiter  # slot is handed over by release
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self.deferred -= 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        while len(self.__waiters) > 0 and self.in_flight < self.threshold:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
@@ -0,0 +1,266 @@
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    # contiguous shard ids, as even as possible
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges += [list(range(start, end))]
+        start = end
+    return ranges
+
+
+class ClusterClient(object):
+    # worker side: reports to the launcher, receives the cluster totals
+    def __init__(
+        self,
+        connection: multiprocessing.connection.Connection,
+        shard_ids: List[int],
+        report_delay: float = 10,
+    ):
+        self.connection = connection
+        self.shard_ids = shard_ids
+        self.report_delay = report_delay
+        self.total_guilds = None
+        self.workers = None
+        self.__task = None
+
+    def report(self, guilds: int, latency: float, ready: bool):
+        self.connection.send(
+            {
+                "pid": os.getpid(),
+                "shard_ids": self.shard_ids,
+                "guilds": guilds,
+                "latency": latency,
+                "ready": ready,
+            }
+        )
+
+    def receive(self, timeout: float = 0) -> bool:
+        received = False
+        while self.connection.poll(timeout):
+            totals = self.connection.recv()
+            self.total_guilds = totals["guilds"]
+            self.workers = totals["workers"]
+            received = True
+            timeout = 0
+        return received
+
+    def start(self, bot: Any):
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.ensure_future(self.__work(bot))
+
+    def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+        self.__task = None
+
+    async def __work(self, bot: Any):
+        while True:
+            try:
+                self.report(len(bot.guilds), bot.client.latency, bot.client.is_ready())
+                self.receive()
+            except (OSError, EOFError):
+                logging.warning("Lost connection to the shard launcher")
+                return
+            await asyncio.sleep(self.report_delay)
+
+
+def _worker_main(
+    factory: Callable[[List[int], int], Any],
+    shard_ids: List[int],
+    shard_count: int,
+    connection: multiprocessing.connection.Connection,
+    report_delay: float,
+):
+    bot = factory(shard_ids, shard_count)
+    bot.cluster = ClusterClient(connection, shard_ids, report_delay)
+    bot.start()
+
+
+class _Worker(object):
+    __slots__ = (
+        "shard_ids",
+        "process",
+        "connection",
+        "report",
+        "last_report",
+        "restart_at",
+    )
+
+    def __init__(self, shard_ids: List[int]):
+        self.shard_ids = shard_ids
+        self.process = None
+        self.connection = None
+        self.report = None
+        self.last_report = None
+        self.restart_at = None  # monotonic time of a scheduled restart
+
+
+class ShardLauncher(object):
+    # parent side: one process per shard range, totals sent back to all
+    def __init__(
+        self,
+        factory: Callable[[List[int], int], Any],
+        shard_count: int,
+        processes: Optional[int] = None,
+        *,
+        report_delay: float = 10,
+        health_timeout: float = 60,
+        restart_delay: float = 5,
+        start_method: str = "spawn",
+    ):
+        self.factory = factory
+        self.shard_count = shard_count
+        self.processes = processes or os.cpu_count() or 1
+        self.report_delay = report_delay
+        self.health_timeout = health_timeout
+        self.restart_delay = restart_delay
+        self.__context = multiprocessing.get_context(start_method)
+        self.workers = [
+            _Worker(ids) for ids in shard_ranges(shard_count, self.processes)
+        ]
+        self.restarts = 0
+        self.__stopping = False
+
+    def __start(self, worker: _Worker):
+        if worker.connection is not None:
+            worker.connection.close()
+        parent, child = self.__context.Pipe()
+        worker.connection = parent
+        worker.report = None
+        worker.last_report = time.monotonic()
+        worker.process = self.__context.Process(
+            target=_worker_main,
+            args=(
+                self.factory,
+                worker.shard_ids,
+                self.shard_count,
+                child,
+                self.report_delay,
+            ),
+            name=f"shards-{worker.shard_ids[0]}-{worker.shard_ids[-1]}",
+            daemon=True,
+        )
+        worker.process.start()
+        child.close()
+
+    @property
+    def total_guilds(self) -> int:
+        return sum(worker.report["guilds"] for worker in self.workers if worker.report)
+
+    def health(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "shard_ids": worker.shard_ids,
+                "pid": None if worker.process is None else worker.process.pid,
+                "alive": worker.process is not None and worker.process.is_alive(),
+                "healthy": worker.report is not None
+                and worker.report["ready"]
+                and now - worker.last_report < self.health_timeout,
+                "guilds": None if worker.report is None else worker.report["guilds"],
+                "latency": None if worker.report is None else worker.report["latency"],
+            }
+            for worker in self.workers
+        ]
+
+    def handle_report(self, worker: _Worker, report: Dict[str, Any]):
+        worker.report = report
+        worker.last_report = time.monotonic()
+        totals = {"guilds": self.total_guilds, "workers": len(self.workers)}
+        for other in self.workers:
+            if other.connection is not None:
+                try:
+                    other.connection.send(totals)
+                except (OSError, EOFError):
+                    pass
+
+    def __receive(self, timeout: float):
+        connections = {
+            worker.connection: worker
+            for worker in self.workers
+            if worker.connection is not None
+        }
+        for connection in multiprocessing.connection.wait(list(connections), timeout):
+            worker = connections[connection]
+            try:
+                self.handle_report(worker, connection.recv())
+            except (OSError, EOFError):
+                connection.close()
+                worker.connection = None
+
+    def __restart(self, worker: _Worker):
+        if worker.process.is_alive():
+            worker.process.kill()  # did not exit after being terminated
+        worker.process.join()
+        worker.restart_at = None
+        self.restarts += 1
+        self.__start(worker)
+
+    def __supervise(self) -> bool:
+        # restarts are scheduled so reports keep being read meanwhile,
+        # True while some workers are running or waiting to restart
+        now = time.monotonic()
+        running = False
+        for worker in self.workers:
+            if worker.restart_at is not None:
+                running = True
+                if now >= worker.restart_at:
+                    self.__restart(worker)
+            elif worker.process.is_alive():
+                running = True
+                if now - worker.last_report > self.health_timeout:
+                    logging.error(
+                        f"Shards {worker.shard_ids} did not report for"
+                        f" {self.health_timeout}s, restarting in {self.restart_delay}s"
+                    )
+                    worker.process.terminate()
+                    worker.restart_at = now + self.restart_delay
+            elif worker.process.exitcode != 0 and not self.__stopping:
+                logging.error(
+                    f"Shards {worker.shard_ids} exited with {worker.process.exitcode}"
+                    f", restarting in {self.restart_delay}s"
+                )
+                worker.restart_at = now + self.restart_delay
+                running = True
+        return running
+
+    def run(self):
+        logging.info(
+            f"Launching {self.shard_count} shards on {len(self.workers)} processes"
+        )
+        for worker in self.workers:
+            self.__start(worker)
+        try:
+            while self.__supervise():
+                now = time.monotonic()
+                self.__receive(
+                    min(
+                        [1]
+                        + [
+                            max(0, worker.restart_at - now)
+                            for worker in self.workers
+                            if worker.restart_at is not None
+                        ]
+                    )
+                )
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.__stopping = True
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
@@ -0,0 +1,237 @@
+from typing import Any, Callable, Dict, Hashable, Optional
+from collections import OrderedDict
+import asyncio
+import logging
+import sys
+import time
+
+
+class _Record(object):
+    __slots__ = ("value", "expires", "size")
+
+    def __init__(self, value: Any, expires: Optional[float], size: int):
+        self.value = value
+        self.expires = expires
+        self.size = size
+
+
+class StateStore(object):
+    # least recently used keys are at the front
+    def __init__(
+        self,
+        max_entries: Optional[int] = 100000,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[Any], int] = sys.getsizeof,
+        max_expirations: int = 2,
+        backend: Optional[Any] = None,
+        flush_delay: float = 1,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.max_expirations = max_expirations
+        # StateBackend changes are written behind to, entries missing are loaded from
+        self.backend = backend
+        self.flush_delay = flush_delay
+        self.__records = OrderedDict()
+        self.__dirty = OrderedDict()  # key -> record, or None to delete
+        self.__task = None
+        self.__flushing = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def __contains__(self, key: Hashable) -> bool:
+        record = self.__records.get(key)
+        return record is not None and not self.__expired(record, time.monotonic())
+
+    @staticmethod
+    def __expired(record: _Record, now: float) -> bool:
+        return record.expires is not None and record.expires <= now
+
+    def __remove(self, key: Hashable) -> _Record:
+        record = self.__records.pop(key)
+        self.bytes -= record.size
+        return record
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        record = self.__records.get(key)
+        if record is None:
+            self.misses += 1
+            return default
+        if self.__expired(record, time.monotonic()):
+            self.__remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.__records.move_to_end(key)
+        self.hits += 1
+        return record.value
+
+    def __put(self, key: Hashable, value: Any, ttl: Optional[float]) -> _Record:
+        now = time.monotonic()
+        if key in self.__records:
+            self.__remove(key)
+        ttl = self.ttl if ttl is None else ttl
+        size = self.sizeof(key) + self.sizeof(value)
+        record = _Record(value, None if ttl is None else now + ttl, size)
+        self.__records[key] = record
+        self.bytes += size
+        self.__expire(now)
+        self.__evict()
+        return record
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        record = self.__put(key, value, ttl)
+        if self.backend is not None:
+            self.__dirty[key] = record
+            self.__schedule()
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.set(key, value)
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def delete(self, key: Hashable) -> bool:
+        if self.backend is not None:
+            self.__dirty[key] = None
+            self.__schedule()
+        if key not in self.__records:
+            return False
+        self.__remove(key)
+        return True
+
+    def __delitem__(self, key: Hashable):
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def __expire(self, now: float):
+        # a few expired entries at the front go away without waiting for eviction
+        for _ in range(self.max_expirations):
+            if len(self.__records) == 0:
+                return
+            key, record = next(iter(self.__records.items()))
+            if not self.__expired(record, now):
+                return
+            self.__remove(key)
+            self.expirations += 1
+
+    def __evict(self):
+        while len(self.__records) > 1 and (
+            (self.max_entries is not None and len(self.__records) > self.max_entries)
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            self.__remove(next(iter(self.__records)))
+            self.evictions += 1
+
+    async def load(self, key: Hashable, default: Any = None) -> Any:
+        # from memory, else from the backend and kept in memory
+        value = self.get(key, self)
+        if value is not self:
+            return value
+        if self.backend is None:
+            return default
+        if key in self.__dirty:  # evicted before being written
+            record = self.__dirty[key]
+            if record is None or self.__expired(record, time.monotonic()):
+                return default
+            return record.value
+        value = await self.backend.get(self.__storage_key(key))
+        if value is None:
+            return default
+        self.loads += 1
+        self.__put(key, value, None)
+        return value
+
+    @staticmethod
+    def __storage_key(key: Hashable) -> Any:
+        return key if isinstance(key, (int, str)) else str(key)
+
+    def __schedule(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # written on the next flush
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.ensure_future(self.__work())
+
+    async def __work(self):
+        while len(self.__dirty) > 0:
+            await asyncio.sleep(self.flush_delay)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Could not write state to the backend")
+
+    async def __write(self, dirty: OrderedDict):
+        now = time.monotonic()
+        groups = {}  # ttl left -> values
+        deleted = []
+        for key, record in dirty.items():
+            if record is None or self.__expired(record, now):
+                deleted += [self.__storage_key(key)]
+                continue
+            ttl = None if record.expires is None else record.expires - now
+            groups.setdefault(ttl, {})[self.__storage_key(key)] = record.value
+        await asyncio.gather(
+            *(self.backend.set_many(values, ttl) for ttl, values in groups.items()),
+            *(self.backend.delete(key) for key in deleted),
+        )
+
+    async def flush(self):
+        if self.backend is None:
+            return
+        while self.__flushing is not None:  # keeps writes in order
+            await asyncio.wait([self.__flushing])
+        if len(self.__dirty) == 0:
+            return
+        dirty = self.__dirty
+        self.__dirty = OrderedDict()
+        self.__flushing = asyncio.ensure_future(self.__write(dirty))
+        try:
+            await self.__flushing
+        except BaseException:
+            for key, record in dirty.items():  # newer changes win
+                if key not in self.__dirty:
+                    self.__dirty[key] = record
+            raise
+        finally:
+            self.__flushing = None
+
+    async def close(self):
+        if self.backend is None:
+            return
+        if self.__task is not None:
+            self.__task.cancel()  # an interrupted write is queued again
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+        await self.flush()
+        await self.backend.close()
+
+    def clear(self):
+        self.__records = OrderedDict()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "loads": self.loads,
+            "pending": len(self.__dirty),
+        }
@@ -0,0 +1,70 @@
+from typing import Callable
+from collections import deque
+import logging
+import random
+import time
+
+
+class Supervisor(object):
+    # restart delays grow exponentially, too many crashes open the circuit
+    def __init__(
+        self,
+        base_delay: float = 2,
+        max_delay: float = 300,
+        factor: float = 2,
+        jitter: float = 0.5,
+        crash_threshold: int = 5,
+        crash_window: float = 60,
+        cooldown: float = 600,
+        rand: Callable[[], float] = random.random,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter  # fraction of the delay that is randomized
+        self.crash_threshold = crash_threshold
+        self.crash_window = crash_window
+        self.cooldown = cooldown
+        self.rand = rand
+        self.clock = clock
+        self.attempts = 0  # failures since the last success
+        self.trips = 0
+        self.__failures = deque()
+        self.__half_open = False
+
+    @property
+    def circuit_open(self) -> bool:
+        return self.__half_open
+
+    def backoff(self) -> float:
+        delay = min(
+            self.max_delay, self.base_delay * self.factor ** max(0, self.attempts - 1)
+        )
+        return delay * (1 - self.jitter * self.rand())
+
+    def __trip(self) -> float:
+        self.__failures.clear()
+        self.__half_open = True
+        self.trips += 1
+        logging.critical(
+            f"Crash loop detected, waiting {self.cooldown}s before restarting"
+        )
+        return self.cooldown
+
+    def failure(self) -> float:
+        # returns the delay before the next attempt
+        now = self.clock()
+        self.attempts += 1
+        if self.__half_open:  # the trial attempt after a cooldown failed
+            return self.__trip()
+        self.__failures.append(now)
+        while now - self.__failures[0] > self.crash_window:
+            self.__failures.popleft()
+        if len(self.__failures) >= self.crash_threshold:
+            return self.__trip()
+        return self.backoff()
+
+    def success(self):
+        self.attempts = 0
+        self.__half_open = False
@@ -1,18 +1,152 @@
-from typing import List
+from typing import Iterator, List, Optional, Union
+from collections.abc import Sequence
 import re
 
-args_regex = re.compile('"([^"]*)"|\'([^\']*)\'|([^ ]+)')
+MAX_MESSAGE_LENGTH = 2000
+
+QUOTES = "\"'"
+
+fence_regex = re.compile(r"\s*(```[^\s`]{0,32})")
 
 
 def sanitize_input(src: str) -> str:
     return re.sub(r'[^A-Za-z0-9 _]', "", src.lower().strip())
 
 
+def unescape_quotes(src: str) -> str:
+    if "\\" not in src:
+        return src
+    return src.replace("\\\"", "\"").replace("\\'", "'")
+
+
+class Arguments(Sequence):
+    # space separated tokens, read one at a time when first accessed
+    __slots__ = ("src", "__tokens", "__pos", "__unclosed")
+
+    def __init__(self, src: str):
+        self.src = src
+        self.__tokens = []
+        self.__pos = 0
+        self.__unclosed = {}  # quote -> position after which it is never closed
+
+    def __closing(self, quote: str, start: int) -> int:
+        i = start
+        while True:
+            i = self.src.find(quote, i)
+            if i < 0 or self.src[i - 1] != "\\":
+                return i
+            i += 1
+
+    def __next(self) -> bool:
+        src = self.src
+        pos = self.__pos
+        while pos < len(src) and src[pos] == " ":
+            pos += 1
+        if pos >= len(src):
+            self.__pos = pos
+            return False
+        quote = src[pos]
+        if quote in QUOTES and pos < self.__unclosed.get(quote, len(src)):
+            end = self.__closing(quote, pos + 1)
+            if end >= 0:
+                self.__tokens += [src[pos + 1:end].replace("\\" + quote, quote)]
+                self.__pos = end + 1
+                return True
+            # never closed, no need to look for it again
+            self.__unclosed[quote] = pos
+        end = src.find(" ", pos)
+        if end < 0:
+            end = len(src)
+        self.__tokens += [unescape_quotes(src[pos:end])]
+        self.__pos = end
+        return True
+
+    def __parse(self, index: Optional[int] = None) -> bool:
+        # parse until the token at index is known (all tokens if None)
+        while index is None or len(self.__tokens) <= index:
+            if not self.__next():
+                return False
+        return True
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice) or index < 0:
+            self.__parse()
+        elif not self.__parse(index):
+            raise IndexError("argument index out of range")
+        return self.__tokens[index]
+
+    def __setitem__(self, index: int, value: str):
+        self[index]  # make sure it was parsed
+        self.__tokens[index] = value
+
+    def __len__(self) -> int:
+        self.__parse()
+        return len(self.__tokens)
+
+    def __bool__(self) -> bool:
+        return self.__parse(0)
+
+    def __iter__(self) -> Iterator[str]:
+        i = 0
+        while self.__parse(i):
+            yield self.__tokens[i]
+            i += 1
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, Arguments)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
 def parse_arguments(src: str) -> List[str]:
-    def get_found_match(m: list) -> str:
-        f = [g for g in m if len(g) > 0]
-        if len(f) > 0:
-            return f[0]
-        return ""
+    return list(Arguments(src))
+
+
+def paginate(lines: List[str], limit: int) -> List[str]:
+    pages = [""]
+    for line in lines:
+        while len(line) > limit:  # line alone does not fit, cut it
+            if len(pages[-1]) > 0:
+                pages += [""]
+            pages[-1] = line[:limit]
+            pages += [""]
+            line = line[limit:]
+        if len(pages[-1]) + len(line) > limit:
+            pages += [""]
+        pages[-1] += line
+    if len(pages) > 1 and len(pages[-1]) == 0:
+        pages.pop()
+    return pages
+
 
-    return [get_found_match(m) for m in args_regex.findall(src)]
+def split_message(content: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    # split at line boundaries, closing and reopening code blocks across chunks
+    chunks = []
+    current = ""
+    fence = None  # marker and language reopening the current code block
+    for line in content.splitlines(keepends=True):
+        next_fence = fence
+        if line.lstrip().startswith("```"):
+            # the rest of the opening line stays in the body
+            if fence is None:
+                next_fence = fence_regex.match(line).group(1) + "\n"
+            else:
+                next_fence = None
+        reopen = fence or next_fence
+        width = limit if reopen is None else max(1, limit - len(reopen) - 4)
+        pieces = [line[i : i + width] for i in range(0, len(line), width)]
+        for piece in pieces:
+            reserved = 0 if next_fence is None else 4
+            if len(current) + len(piece) + reserved > limit and len(current) > 0:
+                if fence is not None:
+                    current = current.rstrip("\n") + "\n```"
+                chunks += [current]
+                current = "" if fence is None else fence
+            current += piece
+            fence = next_fence
+    if len(current) > 0 or len(chunks) == 0:
+        chunks += [current]
+    return chunks
@@ -0,0 +1,265 @@
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional
+import asyncio
+import re
+import logging
+import time
+
+import discord
+
+from ._dispatch import standalone_regex
+
+WatcherFunction = Callable[[discord.Client, discord.Message], Coroutine[Any, Any, None]]
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+
+
+class Watcher(object):
+    def __init__(
+        self,
+        compute: WatcherFunction,
+        background: bool = False,
+        backpressure: str = DROP_OLDEST,
+        max_queue: int = 1000,
+        workers: int = 1,
+        guilds: Optional[Iterable[int]] = None,
+        channels: Optional[Iterable[int]] = None,
+        authors: Optional[Iterable[int]] = None,
+        content: Optional[str] = None,
+        has_attachment: Optional[bool] = None,
+        with_context: bool = False,
+    ):
+        if backpressure not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Unknown backpressure policy '{backpressure}'")
+        self.compute = compute
+        self.background = background
+        self.backpressure = backpressure
+        self.max_queue = max_queue
+        self.workers = workers
+        # filters
+        self.guilds = None if guilds is None else set(guilds)
+        self.channels = None if channels is None else set(channels)
+        self.authors = None if authors is None else set(authors)
+        self.content = content
+        self.content_pattern = None if content is None else re.compile(content)
+        self.has_attachment = has_attachment
+        self.with_context = with_context  # compute(context) instead of message
+        # stats
+        self.processed = 0
+        self.dropped = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.__queue = None
+        self.__tasks = []
+
+    @property
+    def queued(self) -> int:
+        return 0 if self.__queue is None else self.__queue.qsize()
+
+    def __start(self):
+        self.__queue = asyncio.Queue(self.max_queue)
+        self.__tasks = [
+            asyncio.ensure_future(self.__work()) for _ in range(self.workers)
+        ]
+
+    async def __work(self):
+        while True:
+            t, client, message, context = await self.__queue.get()
+            self.lag = time.monotonic() - t
+            self.max_lag = max(self.max_lag, self.lag)
+            try:
+                await self.__compute(client, message, context)
+            except Exception:
+                logging.exception(f"Exception raised in watcher {self.compute}")
+            finally:
+                self.processed += 1
+                self.__queue.task_done()
+
+    def __compute(
+        self,
+        client: discord.Client,
+        message: discord.Message,
+        context: Optional[Any],
+    ) -> Coroutine:
+        if self.with_context:
+            return self.compute(context)
+        return self.compute(client, message)
+
+    async def __call__(
+        self,
+        client: discord.Client,
+        message: discord.Message,
+        context: Optional[Any] = None,
+    ):
+        if not self.background:
+            await self.__compute(client, message, context)
+            self.processed += 1
+            return
+        if self.__queue is None:
+            self.__start()
+        item = (time.monotonic(), client, message, context)
+        if self.backpressure == BLOCK:
+            await self.__queue.put(item)
+            return
+        try:
+            self.__queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.backpressure == DROP_OLDEST:
+                self.__queue.get_nowait()
+                self.__queue.task_done()
+                self.__queue.put_nowait(item)
+
+    async def join(self):
+        if self.__queue is not None:
+            await self.__queue.join()
+
+    def stop(self):
+        for task in self.__tasks:
+            task.cancel()
+        self.__tasks = []
+        self.__queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+        }
+
+
+class _IdFilter(object):
+    # watchers are bits: "any" holds the ones without this filter
+    def __init__(self):
+        self.any = 0
+        self.ids = {}
+
+    def add(self, bit: int, ids: Optional[set]):
+        if ids is None:
+            self.any |= bit
+        else:
+            for id_ in ids:
+                self.ids[id_] = self.ids.get(id_, 0) | bit
+
+    def match(self, id_: Optional[int]) -> int:
+        return self.any | self.ids.get(id_, 0)
+
+
+class WatcherPipeline(object):
+    def __init__(self):
+        self.watchers = []
+        self.__all = 0
+        self.__guilds = _IdFilter()
+        self.__channels = _IdFilter()
+        self.__authors = _IdFilter()
+        self.__filtered = False
+        self.__attachment = 0  # watchers requiring an attachment
+        self.__no_attachment = 0  # watchers requiring no attachment
+        self.__content = 0
+        self.__content_regex = None
+        self.__content_groups = {}
+        self.__content_standalone = []
+        self.__dirty = False
+
+    def __len__(self) -> int:
+        return len(self.watchers)
+
+    def add(self, watcher: Watcher):
+        bit = 1 << len(self.watchers)
+        self.watchers += [watcher]
+        self.__all |= bit
+        self.__guilds.add(bit, watcher.guilds)
+        self.__channels.add(bit, watcher.channels)
+        self.__authors.add(bit, watcher.authors)
+        if watcher.has_attachment is True:
+            self.__attachment |= bit
+        elif watcher.has_attachment is False:
+            self.__no_attachment |= bit
+        if watcher.content is not None:
+            self.__content |= bit
+            self.__dirty = True
+        self.__filtered = self.__all != (
+            self.__guilds.any & self.__channels.any & self.__authors.any
+        ) or bool(self.__attachment | self.__no_attachment | self.__content)
+
+    def __compile(self):
+        self.__content_groups = {}
+        self.__content_standalone = []
+        parts = []
+        for i, watcher in enumerate(self.watchers):
+            if watcher.content is None:
+                continue
+            if standalone_regex.search(watcher.content):
+                self.__content_standalone += [(1 << i, watcher.content_pattern)]
+                continue
+            self.__content_groups[f"_w{i}"] = 1 << i
+            # each optional lookahead searches the whole content
+            parts += [f"(?:(?=[\\s\\S]*?(?P<_w{i}>{watcher.content})))?"]
+        try:
+            self.__content_regex = re.compile("".join(parts)) if parts else None
+        except re.error:
+            self.__content_regex = None
+            self.__content_groups = {}
+            self.__content_standalone = [
+                (1 << i, watcher.content_pattern)
+                for i, watcher in enumerate(self.watchers)
+                if watcher.content is not None
+            ]
+        self.__dirty = False
+
+    def __match_content(self, content: str) -> int:
+        if self.__dirty:
+            self.__compile()
+        mask = 0
+        if self.__content_regex is not None:
+            m = self.__content_regex.match(content)
+            for group, value in m.groupdict().items():
+                if value is not None:
+                    mask |= self.__content_groups[group]
+        for bit, pattern in self.__content_standalone:
+            if pattern.search(content):
+                mask |= bit
+        return mask
+
+    def match(self, message: discord.Message) -> int:
+        mask = self.__all
+        if not self.__filtered:
+            return mask
+        guild = message.guild
+        mask &= self.__guilds.match(None if guild is None else guild.id)
+        mask &= self.__channels.match(message.channel.id)
+        mask &= self.__authors.match(message.author.id)
+        if mask & (self.__attachment | self.__no_attachment):
+            if len(message.attachments) > 0:
+                mask &= ~self.__no_attachment
+            else:
+                mask &= ~self.__attachment
+        if mask & self.__content:
+            mask &= ~self.__content | self.__match_content(message.content)
+        return mask
+
+    async def dispatch(
+        self,
+        client: discord.Client,
+        message: discord.Message,
+        context: Optional[Any] = None,
+    ):
+        mask = self.match(message)
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            await self.watchers[bit.bit_length() - 1](client, message, context)
+
+    async def join(self):
+        for watcher in self.watchers:
+            await watcher.join()
+
+    def stop(self):
+        for watcher in self.watchers:
+            watcher.stop()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [watcher.stats() for watcher in self.watchers]
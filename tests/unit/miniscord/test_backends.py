@@ -0,0 +1,272 @@
+import asyncio
+import os
+import sqlite3
+import time
+from tests.utils import AsyncTestCase
+
+from miniscord._backends import (
+    BackendError,
+    StateBackend,
+    MemoryBackend,
+    SQLiteBackend,
+    RedisBackend,
+    storage_key,
+)
+
+
+class RedisStandIn(object):
+    # just enough of a Redis server to test the protocol
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                command = await RedisBackend.read_reply(reader)
+                self.commands += [command]
+                writer.write(self.run(*command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+
+    @staticmethod
+    def bulk(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def value(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            return None
+        return value
+
+    def run(self, name, *args) -> bytes:
+        name = name.upper()
+        if name in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            return self.bulk(self.value(args[0]))
+        if name == b"MGET":
+            return b"*%d\r\n" % len(args) + b"".join(
+                self.bulk(self.value(key)) for key in args
+            )
+        if name == b"SET":
+            expires = None
+            if len(args) == 4 and args[2].upper() == b"PX":
+                expires = time.monotonic() + int(args[3]) / 1000
+            self.data[args[0]] = (args[1], expires)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            count = sum(self.data.pop(key, None) is not None for key in args)
+            return b":%d\r\n" % count
+        return b"-ERR unknown command\r\n"
+
+
+class BackendTests(object):
+    def backend(self):
+        raise NotImplementedError()
+
+    def run_backend(self, test):
+        async def run():
+            backend = self.backend()
+            try:
+                await test(backend)
+            finally:
+                await backend.close()
+
+        self._await(run())
+
+    def test_get_set(self):
+        async def test(backend):
+            self.assertIsNone(await backend.get("a"))
+            await backend.set("a", {"count": 1})
+            await backend.set(1 << 64 | 2, [1, 2])
+            self.assertEqual({"count": 1}, await backend.get("a"))
+            self.assertEqual([1, 2], await backend.get("1/2"))
+
+        self.run_backend(test)
+
+    def test_many(self):
+        async def test(backend):
+            await backend.set_many({"a": 1, "b": 2})
+            self.assertEqual([1, None, 2], await backend.get_many(["a", "c", "b"]))
+
+        self.run_backend(test)
+
+    def test_delete(self):
+        async def test(backend):
+            await backend.set("a", 1)
+            self.assertTrue(await backend.delete("a"))
+            self.assertFalse(await backend.delete("a"))
+            self.assertIsNone(await backend.get("a"))
+
+        self.run_backend(test)
+
+    def test_ttl(self):
+        async def test(backend):
+            await backend.set("a", 1, ttl=0.01)
+            await backend.set("b", 2)
+            await asyncio.sleep(0.02)
+            self.assertEqual([None, 2], await backend.get_many(["a", "b"]))
+
+        self.run_backend(test)
+
+
+class TestStorageKey(AsyncTestCase):
+    def test(self):
+        self.assertEqual("1/2/3", storage_key(1 << 128 | 2 << 64 | 3))
+        self.assertEqual("1/2", storage_key("1/2"))
+
+
+class TestStateBackend(AsyncTestCase):
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            StateBackend()
+
+        class Partial(StateBackend):
+            async def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class TestMemoryBackend(BackendTests, AsyncTestCase):
+    def backend(self):
+        return MemoryBackend()
+
+
+class TestSQLiteBackend(BackendTests, AsyncTestCase):
+    PATH = "test_state.db"
+
+    def tearDown(self):
+        super().tearDown()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.PATH + suffix):
+                os.remove(self.PATH + suffix)
+
+    def backend(self):
+        return SQLiteBackend(self.PATH)
+
+    def test_persisted(self):
+        async def run():
+            backend = SQLiteBackend(self.PATH)
+            await backend.set("a", 1)
+            await backend.set("b", 2)
+            await backend.delete("b")
+            await backend.close()
+            self.assertEqual(1, backend.batches)
+            backend = SQLiteBackend(self.PATH)
+            values = await backend.get_many(["a", "b"])
+            await backend.close()
+            return values
+
+        self.assertEqual([1, None], self._await(run()))
+
+    def test_batched(self):
+        async def run():
+            backend = SQLiteBackend(self.PATH, flush_delay=0.01, max_batch=10)
+            for i in range(25):
+                await backend.set(f"k{i}", i)
+            await asyncio.sleep(0.05)
+            self.assertEqual(25, backend.writes)
+            self.assertEqual(3, backend.batches)
+            await backend.close()
+
+        self._await(run())
+
+    def test_purge_expired(self):
+        async def run():
+            backend = SQLiteBackend(self.PATH)
+            await backend.set("a", 1, ttl=0.01)
+            await backend.set("b", 2)
+            await backend.flush()
+            await asyncio.sleep(0.02)
+            await backend.set("c", 3)
+            await backend.close()
+            return backend.purged
+
+        self.assertEqual(1, self._await(run()))
+        connection = sqlite3.connect(self.PATH)
+        keys = [row[0] for row in connection.execute("SELECT key FROM state")]
+        indexes = [row[1] for row in connection.execute("PRAGMA index_list(state)")]
+        connection.close()
+        self.assertEqual(["b", "c"], sorted(keys))
+        self.assertIn("state_expires", indexes)
+
+    def test_wal(self):
+        async def run():
+            backend = SQLiteBackend(self.PATH)
+            await backend.set("a", 1)
+            await backend.close()
+
+        self._await(run())
+        self.assertTrue(os.path.exists(self.PATH))
+        connection = sqlite3.connect(self.PATH)
+        mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        connection.close()
+        self.assertEqual("wal", mode)
+
+
+class TestRedisBackend(BackendTests, AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = RedisStandIn()
+
+    def run_backend(self, test):
+        async def run():
+            port = await self.server.start()
+            backend = RedisBackend("127.0.0.1", port, password="pass", db=1)
+            try:
+                await test(backend)
+            finally:
+                await backend.close()
+                await self.server.stop()
+
+        self._await(run())
+
+    def test_connect(self):
+        async def test(backend):
+            await backend.get("a")
+            self.assertEqual(
+                [[b"AUTH", b"pass"], [b"SELECT", b"1"], [b"GET", b"miniscord:a"]],
+                self.server.commands,
+            )
+
+        self.run_backend(test)
+
+    def test_pipelined(self):
+        async def test(backend):
+            await backend.set_many({f"k{i}": i for i in range(100)}, ttl=10)
+            values = await asyncio.gather(*(backend.get(f"k{i}") for i in range(100)))
+            self.assertEqual(list(range(100)), values)
+            self.assertEqual(
+                [b"SET", b"miniscord:k0", b"0", b"PX", b"10000"],
+                self.server.commands[2],
+            )
+
+        self.run_backend(test)
+
+    def test_error(self):
+        async def test(backend):
+            with self.assertRaises(BackendError):
+                await backend.execute(("UNKNOWN",))
+            self.assertIsNone(await backend.get("a"))
+
+        self.run_backend(test)
+
+    def test_encode(self):
+        self.assertEqual(
+            b"*2\r\n$3\r\nGET\r\n$1\r\na\r\n", RedisBackend.encode("GET", "a")
+        )
@@ -2,11 +2,19 @@ from unittest import TestCase, skip
 from unittest.mock import AsyncMock, patch, MagicMock
 from os import path
 import os
+import re
+import asyncio
+import tempfile
 from tests.utils import AsyncTestCase, patch_discord, patch_discord_arg
 
 import discord
 from datetime import datetime
 from miniscord._bot import Bot
+from miniscord._ratelimit import RateLimit, SCOPE_CHANNEL
+from miniscord._outbound import PRIORITY_REPLY, PRIORITY_NOTICE, PRIORITY_PRESENCE
+from miniscord._middleware import Middleware
+from miniscord._context import MessageContext
+from miniscord._backends import MemoryBackend
 
 
 class TestInit(TestCase):
@@ -30,6 +38,26 @@ class TestInit(TestCase):
         self.assertEqual(2, len(bot._Bot__commands))
         self.assertEqual(3, len(bot.games))
 
+    @patch_discord
+    def test_sharded(self):
+        with patch("discord.AutoShardedClient") as sharded_client:
+            bot = Bot("app_name", "version", shard_count=4, shard_ids=[2, 3])
+        self.assertIs(sharded_client.return_value, bot.client)
+        discord.Client.assert_not_called()
+        sharded_client.assert_called_once()
+        self.assertEqual(4, sharded_client.call_args.kwargs["shard_count"])
+        self.assertEqual([2, 3], sharded_client.call_args.kwargs["shard_ids"])
+
+    @patch_discord
+    def test_state(self):
+        bot = Bot("app_name", "version")
+        bot.state_max_entries = 1
+        bot.state.set("a", 1)
+        bot.state.set("b", 2)
+        self.assertIs(bot.state, bot.state)
+        self.assertEqual(1, len(bot.state))
+        self.assertEqual(2, bot.state.get("b"))
+
 
 class TestInfo(AsyncTestCase):
     @patch_discord
@@ -38,7 +66,7 @@ class TestInfo(AsyncTestCase):
         message = AsyncMock()
         t0 = datetime.now()
         bot._Bot__t0 = t0
-        bot.client.guilds = [None, None, None]
+        bot.client.guilds = [MagicMock(), MagicMock(), MagicMock()]
         self._await(bot.info(None, message, "info"))
         message.channel.send.assert_awaited_once_with(
             f"```\n"
@@ -50,6 +78,78 @@ class TestInfo(AsyncTestCase):
             mention_author=False,
         )
 
+    @patch_discord
+    def test_cached(self):
+        bot = Bot("app_name", "version")
+        message = AsyncMock()
+        bot._Bot__t0 = datetime.now()
+        bot.guilds = [MagicMock()]
+        self._await(bot.info(None, message, "info"))
+        self.assertIn(
+            "* Connected to 1 guilds\n", message.channel.send.await_args.args[0]
+        )
+        bot.guilds = [MagicMock(), MagicMock()]
+        self._await(bot.info(None, message, "info"))
+        self.assertIn(
+            "* Connected to 2 guilds\n", message.channel.send.await_args.args[0]
+        )
+        self.assertEqual(2, bot.outbound.sent[PRIORITY_REPLY])
+
+
+class TestGuilds(AsyncTestCase):
+    def guild(self, guild_id: int) -> MagicMock:
+        guild = MagicMock()
+        guild.id = guild_id
+        return guild
+
+    @patch_discord
+    def test_seeded_from_client(self):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = None
+        bot.client.guilds = [self.guild(1), self.guild(2)]
+        self.assertEqual(2, len(bot.guilds))
+        self.assertIn(1, bot.guilds)
+        bot.client.fetch_guilds.assert_not_called()
+
+    @patch_discord
+    def test_join_remove(self):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = None
+        bot.client.guilds = [self.guild(1)]
+        self._await(bot.on_guild_join(self.guild(2)))
+        self._await(bot.on_guild_join(self.guild(2)))
+        self.assertEqual(2, len(bot.guilds))
+        self._await(bot.on_guild_remove(self.guild(1)))
+        self.assertEqual([2], [guild.id for guild in bot.guilds])
+
+    @patch_discord
+    def test_cluster_count(self):
+        bot = Bot("app_name", "version")
+        bot.client.guilds = [self.guild(1)]
+        bot.cluster = MagicMock()
+        bot.cluster.total_guilds = None
+        self.assertEqual(1, bot.guild_count)
+        bot.cluster.total_guilds = 42
+        self.assertEqual(42, bot.guild_count)
+        self.assertEqual("42 guilds", bot.games[1]())
+
+    @patch_discord
+    def test_reseeded_on_ready(self):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = None
+        bot.client.guilds = [self.guild(1)]
+        self.assertEqual(1, len(bot.guilds))
+        bot.client.guilds = [self.guild(1), self.guild(2), self.guild(3)]
+
+        async def run():
+            await bot.on_ready()
+            bot.stop_presence()
+            await asyncio.sleep(0.01)
+
+        self._await(run())
+        self.assertEqual(3, len(bot.guilds))
+        bot.client.fetch_guilds.assert_not_called()
+
 
 class TestHelp(AsyncTestCase):
     @patch_discord
@@ -133,6 +233,74 @@ class TestHelp(AsyncTestCase):
             mention_author=False,
         )
 
+    @patch_discord
+    def test_cache_invalidated(self):
+        bot = Bot("app_name", "version")
+        message = AsyncMock()
+        self._await(bot.help(None, message, "help"))
+        bot.register_command("", None, "test1: desc1", None)
+        self._await(bot.help(None, message, "help"))
+        self.assertIn("* test1: desc1\n", message.channel.send.await_args.args[0])
+
+    @patch_discord
+    def test_pages(self):
+        bot = Bot("app_name", "version", alias="!")
+        for i in range(100):
+            bot.register_command(f"test{i}", None, f"test{i}: " + "x" * 40, None)
+        message = AsyncMock()
+        self._await(bot.help(None, message, "help"))
+        page1 = message.channel.send.await_args.args[0]
+        self.assertLessEqual(len(page1), 2000)
+        self.assertTrue(page1.startswith("```\nList of available commands:\n"))
+        self.assertTrue(page1.endswith("Page 1/3, use !help <page>\n```"))
+        self.assertIn("* !test99: ", page1)
+        self._await(bot.help(None, message, "help", "3"))
+        page3 = message.channel.send.await_args.args[0]
+        self.assertTrue(
+            page3.endswith("* !help: show this help\nPage 3/3, use !help <page>\n```")
+        )
+        self._await(bot.help(None, message, "help", "4"))
+        message.channel.send.assert_awaited_with(
+            "Command `4` not found", reference=message, mention_author=False
+        )
+
+
+class TestReply(AsyncTestCase):
+    @patch_discord
+    def test_reply(self):
+        bot = Bot("app_name", "version")
+        bot.reply_delay = 0.01
+        message = AsyncMock()
+        message.channel.send.return_value = "sent"
+
+        async def run():
+            bot.reply(message, "line1")
+            return await bot.reply(message, "line2")
+
+        self.assertEqual(["sent"], self._await(run()))
+        message.channel.send.assert_awaited_once_with(
+            "line1\nline2", reference=message, mention_author=False
+        )
+
+    @patch_discord
+    def test_reply_split(self):
+        bot = Bot("app_name", "version")
+        bot.reply_delay = 0
+        bot.answer_mention = True
+        message = AsyncMock()
+
+        async def run():
+            await bot.reply(message, "a" * 1500 + "\n" + "b" * 1500)
+
+        self._await(run())
+        self.assertEqual(2, message.channel.send.await_count)
+        message.channel.send.assert_any_await(
+            "a" * 1500 + "\n", reference=message, mention_author=True
+        )
+        message.channel.send.assert_awaited_with(
+            "b" * 1500, reference=None, mention_author=True
+        )
+
 
 class TestRegisterEvent(TestCase):
     @patch_discord
@@ -330,15 +498,22 @@ class TestOnMessage(AsyncTestCase):
         permissions = AsyncMock()
         permissions.send_messages = False
         message.channel.permissions_for = lambda u: permissions
-        self._await(bot.on_message(message))
+
+        async def run():
+            await bot.on_message(message)
+            await bot.notifier.join()
+            bot.notifier.stop()
+
+        self._await(run())
         simple_callback.assert_not_awaited()
         watcher_callback.assert_awaited_once_with(bot.client, message)
         fallback_callback.assert_not_awaited()
         message.author.create_dm.assert_awaited_once()
-        message.author.dm_channel.send.assert_awaited_once_with(
+        message.author.create_dm.return_value.send.assert_awaited_once_with(
             f"Hi, this bot doesn't have the permission to send a message to"
             f" #test_channel in server 'test_guild'"
         )
+        self.assertEqual(1, bot.outbound.sent[PRIORITY_NOTICE])
 
     @patch_discord
     def test_mention_self(self):
@@ -506,6 +681,258 @@ class TestOnMessage(AsyncTestCase):
             bot.client, message, "Test", "arg0", "arg1"
         )
 
+    @patch_discord
+    def test_early_reject(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.client.user.id = "12345"
+        fallback_callback = AsyncMock()
+        bot.register_fallback(fallback_callback)
+        message = AsyncMock()
+        message.content = "hello <@12345> there |test"
+        with patch("miniscord._bot.Arguments") as parse_mock:
+            self._await(bot.on_message(message))
+            parse_mock.assert_not_called()
+        fallback_callback.assert_not_awaited()
+        self.assertEqual("hello <@12345> there |test", message.content)
+
+    @patch_discord
+    def test_alias_quoted(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        simple_callback = AsyncMock()
+        bot.register_command("test", simple_callback, "short", "long")
+        message = AsyncMock()
+        message.content = '  "|test" hey'
+        self._await(bot.on_message(message))
+        simple_callback.assert_awaited_once_with(bot.client, message, "test", "hey")
+
+    @patch_discord
+    def test_alias_remove_mentions(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        bot.remove_mentions = True
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command("test", simple_callback, "short", "long")
+        message = AsyncMock()
+        message.content = "<@999>|test hey"
+        self._await(bot.on_message(message))
+        simple_callback.assert_awaited_once_with(bot.client, message, "test", "hey")
+
+    @patch_discord
+    def test_mention_compiled_once(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command("test", simple_callback, "short", "long")
+        with patch("re.compile", wraps=re.compile) as compile_mock:
+            for _ in range(3):
+                message = AsyncMock()
+                message.content = "<@12345> test"
+                self._await(bot.on_message(message))
+            compile_mock.assert_called_once_with("<@!?12345>")
+        self.assertEqual(3, simple_callback.await_count)
+
+    @patch_discord
+    def test_scheduled(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.max_concurrent_commands = 2
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command("test", simple_callback, "short", "long")
+        fallback_callback = AsyncMock()
+        bot.register_fallback(fallback_callback)
+        message1 = AsyncMock()
+        message1.content = "<@12345> test arg0"
+        message2 = AsyncMock()
+        message2.content = "<@12345> other"
+
+        async def run():
+            await bot.on_message(message1)
+            await bot.on_message(message2)
+            self.assertEqual(2, bot.scheduler.queued)
+            await bot.scheduler.join()
+
+        self._await(run())
+        simple_callback.assert_awaited_once_with(bot.client, message1, "test", "arg0")
+        fallback_callback.assert_awaited_once_with(bot.client, message2, "other")
+
+    @patch_discord
+    def test_timeout(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+
+        async def slow_callback(*args):
+            await asyncio.sleep(1)
+
+        bot.register_command("test", slow_callback, "short", "long", timeout=0.01)
+        overload_callback = AsyncMock()
+        bot.register_overload(overload_callback)
+        message = AsyncMock()
+        message.content = "<@12345> test arg0"
+        self._await(bot.on_message(message))
+        overload_callback.assert_awaited_once_with(
+            bot.client, message, "timeout", "test", "arg0"
+        )
+
+    @patch_discord
+    def test_own_timeout_error(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.error_files_dir = None
+        bot.client.user.id = "12345"
+
+        async def failing_callback(*args):
+            raise TimeoutError("socket")
+
+        bot.register_command("test", failing_callback, "short", "long", timeout=1)
+        overload_callback = AsyncMock()
+        bot.register_overload(overload_callback)
+        message = AsyncMock()
+        message.content = "<@12345> test arg0"
+        with self.assertRaises(TimeoutError):
+            self._await(bot.on_message(message))
+        overload_callback.assert_not_awaited()
+        self.assertEqual(1, bot.metrics.errors.get("test"))
+        self.assertEqual(1, len(bot.errors))
+
+    @patch_discord
+    def test_overload(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.overload_threshold = 1
+        bot.overload_max_deferred = 0
+        bot.max_concurrent_commands = 1
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command("test", simple_callback, "short", "long")
+        overload_callback = AsyncMock()
+        bot.register_overload(overload_callback)
+        message1 = AsyncMock()
+        message1.content = "<@12345> test 1"
+        message2 = AsyncMock()
+        message2.content = "<@12345> test 2"
+        message3 = AsyncMock()
+        message3.content = "<@12345> help"
+
+        async def run():
+            await bot.on_message(message1)
+            await bot.on_message(message2)
+            await bot.on_message(message3)
+            await bot.scheduler.join()
+
+        self._await(run())
+        simple_callback.assert_awaited_once_with(bot.client, message1, "test", "1")
+        overload_callback.assert_awaited_once_with(
+            bot.client, message2, "rejected", "test", "2"
+        )
+        message3.channel.send.assert_awaited_once()
+        self.assertEqual(0, bot.admission.in_flight)
+
+    @patch_discord
+    def test_multiple_watchers(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command("test", simple_callback, "short", "long")
+        watcher_callback1 = AsyncMock()
+        bot.register_watcher(watcher_callback1)
+        watcher_callback2 = AsyncMock()
+        bot.register_watcher(watcher_callback2, background=True)
+        message = AsyncMock()
+        message.content = "<@12345> test"
+
+        async def run():
+            await bot.on_message(message)
+            watcher_callback2.assert_not_awaited()
+            await bot.watchers.join()
+            bot.watchers.stop()
+
+        self._await(run())
+        simple_callback.assert_awaited_once_with(bot.client, message, "test")
+        watcher_callback1.assert_awaited_once_with(bot.client, message)
+        watcher_callback2.assert_awaited_once_with(bot.client, message)
+
+    @patch_discord
+    def test_rate_limit(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command(
+            "test",
+            simple_callback,
+            "short",
+            "long",
+            rate_limits=[RateLimit.cooldown(60)],
+        )
+        message1 = AsyncMock()
+        message1.content = "<@12345> test"
+        message2 = AsyncMock()
+        message2.content = "<@12345> test"
+        message2.channel = message1.channel
+        message2.guild = message1.guild
+        message2.author = message1.author
+        self._await(bot.on_message(message1))
+        self._await(bot.on_message(message2))
+        simple_callback.assert_awaited_once_with(bot.client, message1, "test")
+        message2.channel.send.assert_awaited_once_with(
+            "Please wait 60s before using this command again",
+            reference=message2,
+            mention_author=False,
+        )
+
+    @patch_discord
+    def test_rate_limit_single_notice(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command(
+            "test",
+            simple_callback,
+            "short",
+            "long",
+            rate_limits=[RateLimit.cooldown(60, SCOPE_CHANNEL)],
+        )
+        message = AsyncMock()
+        for _ in range(3):
+            message.content = "<@12345> test"
+            self._await(bot.on_message(message))
+        simple_callback.assert_awaited_once()
+        # two throttled calls, one notice
+        message.channel.send.assert_awaited_once()
+        self.assertEqual(2, bot.metrics.rejected.get("throttled"))
+
+    @patch_discord
+    def test_rate_limit_hook(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command(
+            "test",
+            simple_callback,
+            "short",
+            "long",
+            rate_limits=[RateLimit(1, 1, SCOPE_CHANNEL)],
+        )
+        throttle_callback = AsyncMock()
+        bot.register_throttle(throttle_callback)
+        message = AsyncMock()
+        message.content = "<@12345> test"
+        self._await(bot.on_message(message))
+        message.content = "<@12345> test arg"
+        self._await(bot.on_message(message))
+        simple_callback.assert_awaited_once()
+        throttle_callback.assert_awaited_once()
+        self.assertEqual(("test", "arg"), throttle_callback.await_args.args[3:])
+        message.channel.send.assert_not_awaited()
+
     @patch_discord
     def test_fire_registered_event(self):
         bot = Bot("app_name", "version")
@@ -537,6 +964,177 @@ class TestOnMessage(AsyncTestCase):
         watcher_callback.assert_not_awaited()
 
 
+class TestMessageContext(AsyncTestCase):
+    @patch_discord
+    def test_command(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+        contexts = []
+
+        async def callback(context):
+            contexts.append(context)
+
+        bot.register_command("test", callback, "short", "long", with_context=True)
+        message = AsyncMock()
+        message.content = "<@12345> |TEST 'a b' c"
+        self._await(bot.on_message(message))
+        self.assertEqual(1, len(contexts))
+        context = contexts[0]
+        self.assertIs(bot.client, context.client)
+        self.assertIs(message, context.message)
+        self.assertEqual("<@12345> |TEST 'a b' c", context.content)
+        self.assertEqual(["test", "a b", "c"], context.args)
+        self.assertFalse(context.is_direct)
+        self.assertTrue(context.is_mention)
+        self.assertTrue(context.is_alias)
+        self.assertEqual("^test$", context.command.regex)
+
+    @patch_discord
+    def test_fallback(self):
+        bot = Bot("app_name", "version")
+        bot.client.user.id = "12345"
+        fallback_callback = AsyncMock()
+        bot.register_fallback(fallback_callback, with_context=True)
+        message = AsyncMock()
+        message.content = "<@12345> unknown"
+        self._await(bot.on_message(message))
+        context = fallback_callback.await_args.args[0]
+        self.assertEqual(["unknown"], context.args)
+        self.assertIsNone(context.command)
+
+    @patch_discord
+    def test_watcher(self):
+        bot = Bot("app_name", "version")
+        bot.client.user.id = "12345"
+        contexts = []
+
+        async def watcher(context):
+            contexts.append((context.message.content, context.args))
+
+        bot.register_watcher(watcher, with_context=True)
+        message = AsyncMock()
+        message.content = "hello"
+        self._await(bot.on_message(message))
+        message.content = "<@12345> hello"
+        self._await(bot.on_message(message))
+        self.assertEqual([("hello", None), ("<@12345> hello", ["hello"])], contexts)
+
+    @patch_discord
+    def test_not_for_bot_without_context(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.client.user.id = "12345"
+        message = AsyncMock()
+        message.content = "hello"
+        with patch(
+            "miniscord._bot.MessageContext", side_effect=MessageContext
+        ) as context_class:
+            self._await(bot.on_message(message))
+            context_class.assert_not_called()
+            message.content = "|hello"
+            self._await(bot.on_message(message))
+            context_class.assert_called_once()
+
+    @patch_discord
+    def test_background_watcher(self):
+        bot = Bot("app_name", "version")
+        bot.enforce_write_permission = False
+        bot.client.user.id = "12345"
+        contents = []
+
+        async def watcher(context):
+            contents.append(context.content)
+
+        bot.register_watcher(watcher, background=True, with_context=True)
+        message = AsyncMock()
+        message.content = "<@12345> hello"
+
+        async def run():
+            await bot.on_message(message)
+            await bot.watchers.join()
+            bot.watchers.stop()
+
+        self._await(run())
+        # message.content was changed after dispatch, the context was not
+        self.assertEqual(" hello", message.content)
+        self.assertEqual(["<@12345> hello"], contents)
+
+
+class TestPermissionEvents(AsyncTestCase):
+    @patch_discord
+    def test_cached_permissions(self):
+        bot = Bot("app_name", "version")
+        bot.client.user.id = "12345"
+        simple_callback = AsyncMock()
+        bot.register_command("test", simple_callback, "short", "long")
+        message = AsyncMock()
+        message.content = "<@12345> test"
+        permissions = MagicMock()
+        permissions.send_messages = True
+        message.channel.permissions_for = MagicMock(return_value=permissions)
+        self._await(bot.on_message(message))
+        message.content = "<@12345> test"
+        self._await(bot.on_message(message))
+        self.assertEqual(2, simple_callback.await_count)
+        message.channel.permissions_for.assert_called_once()
+        self.assertEqual(1, bot.permission_cache.hits)
+
+    def __cached(self, bot: Bot) -> MagicMock:
+        message = MagicMock()
+        message.guild.id = "g"
+        message.channel.id = "c"
+        message.channel.guild.id = "g"
+        bot.permission_cache.get(message)
+        return message
+
+    @patch_discord
+    def test_role_update(self):
+        bot = Bot("app_name", "version")
+        role = MagicMock()
+        role.guild.id = "g"
+        for event in ["on_guild_role_create", "on_guild_role_delete"]:
+            self.__cached(bot)
+            self._await(getattr(bot, event)(role))
+            self.assertEqual(0, len(bot.permission_cache))
+        self.__cached(bot)
+        self._await(bot.on_guild_role_update(role, role))
+        self.assertEqual(0, len(bot.permission_cache))
+
+    @patch_discord
+    def test_channel_update(self):
+        bot = Bot("app_name", "version")
+        message = self.__cached(bot)
+        self._await(bot.on_guild_channel_update(message.channel, message.channel))
+        self.assertEqual(0, len(bot.permission_cache))
+        message = self.__cached(bot)
+        self._await(bot.on_guild_channel_delete(message.channel))
+        self.assertEqual(0, len(bot.permission_cache))
+
+    @patch_discord
+    def test_member_update(self):
+        bot = Bot("app_name", "version")
+        bot.client.user.id = "12345"
+        self.__cached(bot)
+        member = MagicMock()
+        member.id = "other"
+        member.guild.id = "g"
+        self._await(bot.on_member_update(member, member))
+        self.assertEqual(1, len(bot.permission_cache))
+        member.id = "12345"
+        self._await(bot.on_member_update(member, member))
+        self.assertEqual(0, len(bot.permission_cache))
+
+    @patch_discord
+    def test_fire_registered_event(self):
+        bot = Bot("app_name", "version")
+        on_member_update = AsyncMock()
+        on_member_update.__name__ = "on_member_update"
+        bot.register_event(on_member_update)
+        member = MagicMock()
+        self._await(bot.on_member_update(member, member))
+        on_member_update.assert_awaited_once_with(member, member)
+
+
 class TestOnReady(AsyncTestCase):
     LOG_PATH = "guilds.log"
 
@@ -550,64 +1148,154 @@ class TestOnReady(AsyncTestCase):
         if path.exists(self.LOG_PATH):
             os.remove(self.LOG_PATH)
 
+    def ready(self, bot: Bot, times: int = 1):
+        side_effect = bot.client.change_presence.side_effect
+        bot.client.change_presence = AsyncMock(side_effect=side_effect)
+
+        async def run():
+            for _ in range(times):
+                await bot.on_ready()
+                await asyncio.sleep(0.01)  # presence is changed by a task
+            bot.stop_presence()
+            await asyncio.sleep(0.01)  # let the task finish cancelling
+
+        with patch("discord.Game") as game_mock:
+            game_mock.return_value = "activity"
+            self._await(run())
+
     @patch_discord_arg
     def test_no_log(self, client_mock):
         bot = Bot("app_name", "version")
         bot.guild_logs_file = None
-        ex = Exception("test")
-        client_mock.change_presence.side_effect = ex
-        try:
-            with patch("discord.Game") as game_mock:
-                game_mock.return_value = "activity"
-                self._await(bot.on_ready())
-        except Exception as error:
-            self.assertEqual(ex, error)
+        self.ready(bot)
         client_mock.change_presence.assert_called_with(
             activity="activity", status=discord.Status.online
         )
+        self.assertEqual(1, bot.outbound.sent[PRIORITY_PRESENCE])
 
     @patch_discord_arg
     def test_log_create(self, client_mock):
         bot = Bot("app_name", "version")
         bot.guild_logs_file = self.LOG_PATH
-        client_mock.change_presence.side_effect = Exception("test")
         client_mock.guilds = [MagicMock(), MagicMock()]
         client_mock.guilds[0].id = "id1"
         client_mock.guilds[0].name = "name1"
         client_mock.guilds[1].id = "id2"
         client_mock.guilds[1].name = "name2"
         d = datetime.now()
-        try:
-            with patch("discord.Game") as game_mock:
-                game_mock.return_value = "activity"
-                self._await(bot.on_ready())
-        except:
-            pass
+        self.ready(bot)
+        bot.guild_log.close()
         with open(self.LOG_PATH, encoding="utf-8", mode="r") as f:
             self.assertEqual(
                 f"{d:%Y-%m-%d %H:%M} +id1: name1\n" f"{d:%Y-%m-%d %H:%M} +id2: name2\n",
                 f.read(),
             )
 
+    @patch_discord_arg
+    def test_log_reconnect_before_flush(self, client_mock):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = self.LOG_PATH
+        bot.guild_logs_flush_delay = 10
+        client_mock.guilds = [MagicMock()]
+        client_mock.guilds[0].id = "id1"
+        client_mock.guilds[0].name = "name1"
+        d = datetime.now()
+        self.ready(bot, 2)
+        bot.guild_log.close()
+        with open(self.LOG_PATH, encoding="utf-8", mode="r") as f:
+            self.assertEqual(f"{d:%Y-%m-%d %H:%M} +id1: name1\n", f.read())
+
     @patch_discord_arg
     def test_log_exists(self, client_mock):
         bot = Bot("app_name", "version")
         bot.guild_logs_file = self.LOG_PATH
-        client_mock.change_presence.side_effect = Exception("test")
         client_mock.guilds = [MagicMock()]
         client_mock.guilds[0].id = "id1"
         client_mock.guilds[0].name = "name1"
         with open(self.LOG_PATH, encoding="utf-8", mode="w") as f:
             f.write("test")
-        try:
-            with patch("discord.Game") as game_mock:
-                game_mock.return_value = "activity"
-                self._await(bot.on_ready())
-        except:
-            pass
+        self.ready(bot)
+        bot.guild_log.close()
         with open(self.LOG_PATH, encoding="utf-8", mode="r") as f:
             self.assertEqual(f"test", f.read())
 
+    @patch_discord
+    def test_handled_resets_supervisor(self):
+        bot = Bot("app_name", "version")
+        bot.supervisor.failure()
+        bot.supervisor.failure()
+
+        async def on_ready():
+            return False  # handled, the default on_ready is skipped
+
+        bot.register_event(on_ready)
+        self._await(bot.on_ready())
+        self.assertEqual(0, bot.supervisor.attempts)
+
+    @patch_discord_arg
+    def test_presence_error(self, client_mock):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = None
+        client_mock.change_presence.side_effect = Exception("test")
+        with self.assertLogs(level="ERROR"):
+            self.ready(bot)
+        client_mock.change_presence.assert_called_once()
+
+    @patch_discord_arg
+    def test_reconnect(self, client_mock):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = None
+        bot.games = ["game"]
+        self.ready(bot, 3)
+        # one task, status sent again on each new session only
+        self.assertEqual(3, client_mock.change_presence.call_count)
+        self.assertFalse(bot.presence.running)
+
+    @patch_discord_arg
+    def test_presence_unchanged(self, client_mock):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = None
+        bot.game_change_delay = 0.001
+        bot.games = ["game"]
+        self.ready(bot)
+        client_mock.change_presence.assert_called_once()
+        self.assertGreater(bot.presence.skipped, 0)
+
+    @patch_discord_arg
+    def test_start_stop(self, client_mock):
+        bot = Bot("app_name", "version")
+
+        async def run():
+            self.assertTrue(bot.start_presence())
+            self.assertFalse(bot.start_presence())
+            self.assertTrue(bot.presence.running)
+            bot.stop_presence()
+            await asyncio.sleep(0.01)
+            self.assertFalse(bot.presence.running)
+
+        self._await(run())
+
+    @patch_discord_arg
+    def test_guild_join_keeps_rotator(self, client_mock):
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = self.LOG_PATH
+        bot.client.change_presence = AsyncMock()
+
+        async def run():
+            await bot.on_ready()
+            rotator = bot.presence
+            guild = MagicMock()
+            guild.id = 1
+            await bot.on_guild_join(guild)
+            await bot.on_ready()
+            self.assertIs(rotator, bot.presence)
+            bot.stop_presence()
+            await asyncio.sleep(0.01)
+            self.assertFalse(rotator.running)
+
+        self._await(run())
+        bot.guild_log.close()
+
     @patch_discord_arg
     def test_fire_registered_event(self, client_mock):
         bot = Bot("app_name", "version")
@@ -616,14 +1304,7 @@ class TestOnReady(AsyncTestCase):
         on_ready.__name__ = "on_ready"
         on_ready.return_value = True
         bot.register_event(on_ready)
-        ex = Exception("test")
-        client_mock.change_presence.side_effect = ex
-        try:
-            with patch("discord.Game") as game_mock:
-                game_mock.return_value = "activity"
-                self._await(bot.on_ready())
-        except Exception as error:
-            self.assertEqual(ex, error)
+        self.ready(bot)
         on_ready.assert_awaited_once()
         client_mock.change_presence.assert_called_with(
             activity="activity", status=discord.Status.online
@@ -637,14 +1318,7 @@ class TestOnReady(AsyncTestCase):
         on_ready.__name__ = "on_ready"
         on_ready.return_value = False
         bot.register_event(on_ready)
-        ex = Exception("test")
-        client_mock.change_presence.side_effect = ex
-        try:
-            with patch("discord.Game") as game_mock:
-                game_mock.return_value = "activity"
-                self._await(bot.on_ready())
-        except Exception as error:
-            self.assertEqual(ex, error)
+        self.ready(bot)
         on_ready.assert_awaited_once()
         client_mock.change_presence.assert_not_called()
 
@@ -683,6 +1357,7 @@ class TestOnGuildJoin(AsyncTestCase):
         d = datetime.now()
         self._await(bot.on_guild_join(guild1))
         self._await(bot.on_guild_join(guild2))
+        bot.guild_log.close()
         self.assertTrue(path.exists(self.LOG_PATH))
         with open(self.LOG_PATH, encoding="utf-8", mode="r") as f:
             self.assertEqual(
@@ -701,6 +1376,7 @@ class TestOnGuildJoin(AsyncTestCase):
         guild = AsyncMock()
         self._await(bot.on_guild_join(guild))
         on_guild_join.assert_awaited_once_with(guild)
+        bot.guild_log.close()
         self.assertTrue(path.exists(self.LOG_PATH))
 
     @patch_discord
@@ -751,6 +1427,7 @@ class TestOnGuildRemove(AsyncTestCase):
         d = datetime.now()
         self._await(bot.on_guild_remove(guild1))
         self._await(bot.on_guild_remove(guild2))
+        bot.guild_log.close()
         self.assertTrue(path.exists(self.LOG_PATH))
         with open(self.LOG_PATH, encoding="utf-8", mode="r") as f:
             self.assertEqual(
@@ -769,6 +1446,7 @@ class TestOnGuildRemove(AsyncTestCase):
         guild = AsyncMock()
         self._await(bot.on_guild_remove(guild))
         on_guild_remove.assert_awaited_once_with(guild)
+        bot.guild_log.close()
         self.assertTrue(path.exists(self.LOG_PATH))
 
     @patch_discord
@@ -783,3 +1461,310 @@ class TestOnGuildRemove(AsyncTestCase):
         self._await(bot.on_guild_remove(guild))
         on_guild_remove.assert_awaited_once_with(guild)
         self.assertFalse(path.exists(self.LOG_PATH))
+
+
+class TestRunAsync(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def bot(self, connect_effects) -> Bot:
+        bot = Bot("app_name", "version")
+        bot.guild_logs_file = None
+        bot.client.login = AsyncMock()
+        bot.client.connect = AsyncMock(side_effect=connect_effects)
+        bot.client.is_closed.return_value = False
+        bot.error_restart_delay = 0.001
+        return bot
+
+    @patch_discord
+    def test_no_token(self):
+        bot = self.bot([None])
+        with patch.dict(os.environ, {}, clear=True):
+            with self.assertRaises(EnvironmentError):
+                self._await(bot.run_async())
+        bot.client.login.assert_not_awaited()
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_clean(self):
+        bot = self.bot([None])
+        self._await(bot.run_async())
+        bot.client.login.assert_awaited_once_with("token")
+        bot.client.connect.assert_awaited_once_with(reconnect=True)
+        self.assertEqual([], os.listdir("."))
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_state_backend(self):
+        bot = self.bot([None])
+        bot.state_backend = MemoryBackend()
+        bot.state_flush_delay = 10
+        bot.state.set("a", 1)
+        self.assertIs(bot.state_backend, bot.state.backend)
+        self._await(bot.run_async())
+        self.assertEqual(1, bot.state_backend.store.get("a"))
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_restart(self):
+        bot = self.bot([OSError("a"), OSError("a"), None])
+        self._await(bot.run_async())
+        # still logged in, only the connection is retried
+        bot.client.login.assert_awaited_once()
+        self.assertEqual(3, bot.client.connect.await_count)
+        self.assertEqual(2, bot.supervisor.attempts)
+        self.assertEqual(1, len(os.listdir(".")))  # same error saved once
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_closed(self):
+        bot = self.bot([OSError(), None])
+        bot.client.is_closed.side_effect = [True, False]
+        self._await(bot.run_async())
+        bot.client.clear.assert_called_once()
+        self.assertEqual(2, bot.client.login.await_count)
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_login_failure(self):
+        bot = self.bot([None])
+        bot.client.login.side_effect = discord.LoginFailure()
+        bot.state_backend = MemoryBackend()
+        bot.state.set("a", 1)
+        with self.assertRaises(discord.LoginFailure):
+            self._await(bot.run_async())
+        bot.client.connect.assert_not_awaited()
+        # still cleaned up
+        self.assertEqual(1, bot.state_backend.store.get("a"))
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_cancelled(self):
+        bot = self.bot([None])
+        errors = [ValueError, KeyError, TypeError, OSError, RuntimeError, IndexError]
+
+        async def connect(reconnect):
+            for error in errors:  # more than the write burst, some are pending
+                try:
+                    raise error()
+                except Exception as e:
+                    bot.errors.capture(e)
+            await asyncio.sleep(10)
+
+        bot.client.connect.side_effect = connect
+
+        async def run():
+            task = asyncio.ensure_future(bot.run_async())
+            await asyncio.sleep(0.01)
+            self.assertGreater(bot.errors.stats()["pending"], 0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self._await(run())
+        self.assertEqual(0, bot.errors.stats()["pending"])
+        self.assertEqual(len(errors), len(os.listdir(".")))
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_pending_sent_on_stop(self):
+        bot = self.bot([None])
+        message = AsyncMock()
+        channel = AsyncMock()
+
+        async def connect(reconnect):
+            bot.reply(message, "bye")  # still buffered when the client stops
+            bot.outbound.submit(PRIORITY_NOTICE, 1, channel.send, "notice")
+
+        bot.client.connect.side_effect = connect
+        self._await(bot.run_async())
+        message.channel.send.assert_awaited_once()
+        channel.send.assert_awaited_once_with("notice")
+        self.assertEqual(0, bot.outbound.queued)
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_pending_dropped_after_timeout(self):
+        bot = self.bot([None])
+        bot.shutdown_timeout = 0.01
+
+        async def hang(*args):
+            await asyncio.sleep(10)
+
+        async def connect(reconnect):
+            bot.outbound.submit(PRIORITY_NOTICE, 1, hang)
+
+        bot.client.connect.side_effect = connect
+        with self.assertLogs(level="WARNING"):
+            self._await(bot.run_async())
+
+    @patch_discord
+    @patch.dict(os.environ, {"DISCORD_TOKEN": "token"})
+    def test_start(self):
+        bot = self.bot([None])
+        bot.start()
+        bot.client.connect.assert_awaited_once()
+
+
+class TestErrors(AsyncTestCase):
+    @patch_discord
+    def test_handler_exception(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        bot.error_files_dir = None
+        callback = AsyncMock(side_effect=ValueError("bad"))
+        bot.register_command("test", callback, "short", "long")
+        message = AsyncMock()
+        message.content = "|TEST a"
+        message.guild.id = 1
+        message.channel.id = 2
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self._await(bot.on_message(message))
+        self.assertEqual(1, len(bot.errors))
+        record = next(iter(bot.errors))
+        self.assertEqual(2, record.count)
+        self.assertEqual("ValueError", record.type)
+        self.assertEqual({"command": "test", "channel_id": "1/2"}, record.context)
+
+
+class TestMetrics(AsyncTestCase):
+    @patch_discord
+    def test_on_message(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        bot.register_command("test", AsyncMock(), "short", "long")
+        for content in ["hello", "|test a", "|test b", "|unknown"]:
+            message = AsyncMock()
+            message.content = content
+            self._await(bot.on_message(message))
+        self.assertEqual(4, bot.metrics.messages.get())
+        self.assertEqual(1, bot.metrics.rejected.get("not_for_bot"))
+        self.assertEqual(1, bot.metrics.rejected.get("unknown_command"))
+        self.assertEqual(2, bot.metrics.dispatch.count())
+        self.assertEqual(2, bot.metrics.commands.get("test"))
+        self.assertEqual(2, bot.metrics.latency.count("test"))
+        self.assertEqual(0, bot.metrics.errors.get("test"))
+
+    @patch_discord
+    def test_disabled(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enable_metrics = False
+        bot.enforce_write_permission = False
+        bot.register_command("test", AsyncMock(), "short", "long")
+        message = AsyncMock()
+        message.content = "|test"
+        self._await(bot.on_message(message))
+        self.assertEqual(0, bot.metrics.messages.get())
+        self.assertEqual(0, bot.metrics.commands.total())
+
+    @patch_discord
+    def test_stats(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        bot.register_stats_command(owners=[1])
+        message = AsyncMock()
+        message.content = "|stats"
+        message.author.id = 2
+        self._await(bot.on_message(message))
+        message.channel.send.assert_not_awaited()
+        message.author.id = 1
+        self._await(bot.on_message(message))
+        message.channel.send.assert_awaited_once()
+        text = message.channel.send.await_args.args[0]
+        self.assertIn("* Messages: 2 (0 not commands)", text)
+        self.assertIn("* stats: 2 calls, 0 errors", text)
+
+    @patch_discord
+    def test_stats_application_owner(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        bot.register_stats_command()
+        bot.client.application_info = AsyncMock()
+        bot.client.application_info.return_value.owner.id = 1
+        message = AsyncMock()
+        message.content = "|stats"
+        message.author.id = 1
+        self._await(bot.on_message(message))
+        self._await(bot.on_message(message))
+        bot.client.application_info.assert_awaited_once()
+        self.assertEqual(2, message.channel.send.await_count)
+
+
+class TestMiddlewares(AsyncTestCase):
+    @patch_discord
+    def test_wraps_command(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        calls = []
+
+        async def callback(client, message, *args):
+            calls.append(("call", args))
+
+        class Recorder(Middleware):
+            async def before(self, context):
+                calls.append(("before", context.command.name))
+
+            async def after(self, context, elapsed):
+                calls.append(("after", elapsed >= 0))
+
+        bot.register_command("test", callback, "short", "long")
+        bot.register_middleware(Recorder())
+        message = AsyncMock()
+        message.content = "|test a"
+        self._await(bot.on_message(message))
+        self.assertEqual(
+            [("before", "test"), ("call", ("test", "a")), ("after", True)], calls
+        )
+
+    @patch_discord
+    def test_skip(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        callback = AsyncMock()
+
+        class Skip(Middleware):
+            async def before(self, context):
+                return False
+
+        bot.register_command("test", callback, "short", "long")
+        bot.register_middleware(Skip())
+        message = AsyncMock()
+        message.content = "|test"
+        self._await(bot.on_message(message))
+        callback.assert_not_called()
+
+    @patch_discord
+    def test_profile_command(self):
+        bot = Bot("app_name", "version", alias="|")
+        bot.enforce_write_permission = False
+        bot.register_profile_command(owners=[1])
+        message = AsyncMock()
+        message.author.id = 1
+        message.content = "|profile help 3 tracemalloc"
+        self._await(bot.on_message(message))
+        self.assertTrue(bot.profiler.running)
+        self.assertEqual(
+            ("help", 3, "tracemalloc"),
+            (bot.profiler.command, bot.profiler.invocations, bot.profiler.mode),
+        )
+        self.assertIn(bot.profiler, list(bot.middlewares))
+        message.content = "|profile help x"
+        self._await(bot.on_message(message))
+        self.assertIn("Usage:", message.channel.send.await_args.args[0])
+        message.content = "|profile stop"
+        self._await(bot.on_message(message))
+        self.assertFalse(bot.profiler.running)
+        message.author.id = 2
+        message.content = "|profile help"
+        self._await(bot.on_message(message))
+        self.assertFalse(bot.profiler.running)
+        self.assertEqual(3, message.channel.send.await_count)
@@ -0,0 +1,43 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import discord
+from miniscord._context import MessageContext
+
+
+class TestMessageContext(TestCase):
+    def message(self):
+        message = MagicMock()
+        message.content = "content"
+        message.guild.id = 1
+        message.channel.id = 2
+        message.author.id = 3
+        return message
+
+    def test_init(self):
+        message = self.message()
+        context = MessageContext("client", message, False, True)
+        self.assertEqual("content", context.content)
+        self.assertIsNone(context.args)
+        self.assertFalse(context.is_alias)
+        self.assertIsNone(context.command)
+        with self.assertRaises(AttributeError):
+            context.other = 1
+
+    def test_keys(self):
+        message = self.message()
+        context = MessageContext("client", message, False, False)
+        self.assertEqual(1 << 64 | 2, context.channel_key)
+        self.assertEqual(1 << 128 | 2 << 64 | 3, context.sender_key)
+        self.assertEqual(1, context.guild_key)
+        message.guild.id = 4
+        self.assertEqual(1 << 64 | 2, context.channel_key)  # cached
+
+    def test_direct_keys(self):
+        message = self.message()
+        message.channel.type = discord.ChannelType.private
+        message.guild = None
+        context = MessageContext("client", message, True, False)
+        self.assertEqual(3, context.channel_key)
+        self.assertEqual(3, context.sender_key)
+        self.assertIsNone(context.guild_key)
@@ -3,7 +3,7 @@ from unittest.mock import Mock, AsyncMock
 from tests.utils import AsyncTestCase
 
 import discord
-from miniscord._discord_utils import delete_message, channel_id, sender_id
+from miniscord._discord_utils import delete_message, channel_id, sender_id, channel_key, sender_key, key_to_id, id_to_key
 
 
 class TestDeleteMessage(AsyncTestCase):
@@ -55,3 +55,66 @@ class TestSenderId(TestCase):
         message.channel.id = "TEST2"
         message.author.id = "TEST3"
         self.assertEqual("TEST1/TEST2/TEST3", sender_id(message))
+
+
+class TestChannelKey(TestCase):
+    def test_direct(self):
+        message = Mock()
+        message.guild = None
+        message.author.id = 3
+        self.assertEqual(3, channel_key(message))
+
+    def test_not_direct(self):
+        message = Mock()
+        message.guild.id = 1
+        message.channel.id = 2
+        message.author.id = 3
+        self.assertEqual(1 << 64 | 2, channel_key(message))
+
+
+class TestSenderKey(TestCase):
+    def test_direct(self):
+        message = Mock()
+        message.guild = None
+        message.author.id = 3
+        self.assertEqual(3, sender_key(message))
+
+    def test_not_direct(self):
+        message = Mock()
+        message.guild.id = 1
+        message.channel.id = 2
+        message.author.id = 3
+        self.assertEqual(1 << 128 | 2 << 64 | 3, sender_key(message))
+
+    def test_unique(self):
+        message1 = Mock()
+        message1.guild.id = 1
+        message1.channel.id = 2
+        message1.author.id = 3
+        message2 = Mock()
+        message2.guild.id = 1
+        message2.channel.id = 3
+        message2.author.id = 2
+        self.assertNotEqual(sender_key(message1), sender_key(message2))
+        self.assertNotEqual(channel_key(message1), sender_key(message1))
+
+
+class TestKeyConversion(TestCase):
+    def test_to_id(self):
+        self.assertEqual("3", key_to_id(3))
+        self.assertEqual("1/2", key_to_id(1 << 64 | 2))
+        self.assertEqual("1/2/3", key_to_id(1 << 128 | 2 << 64 | 3))
+
+    def test_to_key(self):
+        self.assertEqual(3, id_to_key(3))
+        self.assertEqual(1 << 64 | 2, id_to_key("1/2"))
+        self.assertEqual(1 << 128 | 2 << 64 | 3, id_to_key("1/2/3"))
+
+    def test_snowflakes(self):
+        message = Mock()
+        message.channel.type = discord.ChannelType.text
+        message.guild.id = 2**63 + 5
+        message.channel.id = 2**64 - 1
+        message.author.id = 1234567890123456789
+        self.assertEqual(sender_id(message), key_to_id(sender_key(message)))
+        self.assertEqual(channel_key(message), id_to_key(channel_id(message)))
@@ -0,0 +1,106 @@
+from unittest import TestCase
+
+from miniscord._bot import Command
+from miniscord._dispatch import CommandIndex, literal_names
+
+
+def command(regex: str) -> Command:
+    return Command(regex, None, None, None)
+
+
+class TestLiteralNames(TestCase):
+    def test_simple(self):
+        self.assertEqual(["test"], literal_names("^test$"))
+
+    def test_alternation(self):
+        self.assertEqual(["help", "h"], literal_names("^(help|h)$"))
+
+    def test_non_capturing(self):
+        self.assertEqual(["help", "h"], literal_names("^(?:help|h)$"))
+
+    def test_regex(self):
+        self.assertIsNone(literal_names("^t[eo]a?st$"))
+
+    def test_split_groups(self):
+        self.assertIsNone(literal_names("^(a)|(b)$"))
+
+    def test_top_level_alternation(self):
+        self.assertIsNone(literal_names("^ping|p$"))
+
+
+class TestCommandIndex(TestCase):
+    def test_literal(self):
+        index = CommandIndex()
+        cmd = command("^(help|h)$")
+        index.add(cmd)
+        self.assertEqual(cmd, index.match("help"))
+        self.assertEqual(cmd, index.match("h"))
+        self.assertIsNone(index.match("hel"))
+
+    def test_top_level_alternation(self):
+        index = CommandIndex()
+        cmd = command("^ping|p$")
+        index.add(cmd)
+        self.assertEqual(cmd, index.match("ping"))
+        self.assertEqual(cmd, index.match("pingpong"))
+        self.assertEqual(cmd, index.match("p"))
+        self.assertIsNone(index.match("pong"))
+
+    def test_regex(self):
+        index = CommandIndex()
+        cmd = command("^t[eo]a?st$")
+        index.add(cmd)
+        self.assertEqual(cmd, index.match("toast"))
+        self.assertIsNone(index.match("tast"))
+
+    def test_last_registered_wins(self):
+        index = CommandIndex()
+        cmd1 = command("^test$")
+        cmd2 = command("^t.*$")
+        cmd3 = command("^toast$")
+        index.add(cmd1)
+        index.add(cmd2)
+        index.add(cmd3)
+        self.assertEqual(cmd2, index.match("test"))
+        self.assertEqual(cmd3, index.match("toast"))
+        self.assertEqual(cmd2, index.match("tx"))
+
+    def test_regex_order(self):
+        index = CommandIndex()
+        cmd1 = command("^t.*$")
+        cmd2 = command("^te.*$")
+        index.add(cmd1)
+        index.add(cmd2)
+        self.assertEqual(cmd2, index.match("test"))
+        self.assertEqual(cmd1, index.match("toast"))
+
+    def test_inner_groups(self):
+        index = CommandIndex()
+        cmd1 = command("^(?P<name>a+)$")
+        cmd2 = command("^(b+)(c+)$")
+        index.add(cmd1)
+        index.add(cmd2)
+        self.assertEqual(cmd1, index.match("aaa"))
+        self.assertEqual(cmd2, index.match("bbc"))
+
+    def test_standalone(self):
+        index = CommandIndex()
+        cmd1 = command("^t.*$")
+        cmd2 = command("^(a)\\1$")
+        cmd3 = command("^(?P<x>b)(?P=x)$")
+        index.add(cmd1)
+        index.add(cmd2)
+        index.add(cmd3)
+        self.assertEqual(cmd2, index.match("aa"))
+        self.assertEqual(cmd3, index.match("bb"))
+        self.assertEqual(cmd1, index.match("test"))
+        self.assertIsNone(index.match("ab"))
+
+    def test_recompile(self):
+        index = CommandIndex()
+        index.add(command("^a.*$"))
+        self.assertIsNone(index.match("bc"))
+        cmd = command("^b.*$")
+        index.add(cmd)
+        self.assertEqual(cmd, index.match("bc"))
+        self.assertEqual(2, len(index))
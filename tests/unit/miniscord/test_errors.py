@@ -0,0 +1,123 @@
+import asyncio
+import os
+import tempfile
+from tests.utils import AsyncTestCase
+
+from miniscord._errors import ErrorStore, fingerprint
+
+
+def fail(value: str):
+    raise ValueError(value)
+
+
+def fail_other(value: str):
+    raise ValueError(value)
+
+
+def capture(function, *args) -> BaseException:
+    try:
+        function(*args)
+    except Exception as e:
+        return e
+
+
+class TestFingerprint(AsyncTestCase):
+    def test_same_place(self):
+        self.assertEqual(
+            fingerprint(capture(fail, "a")), fingerprint(capture(fail, "b"))
+        )
+
+    def test_other_place(self):
+        self.assertNotEqual(
+            fingerprint(capture(fail, "a")), fingerprint(capture(fail_other, "a"))
+        )
+
+    def test_other_type(self):
+        self.assertNotEqual(
+            fingerprint(capture(fail, "a")), fingerprint(capture(int, "a", "b"))
+        )
+
+
+class TestErrorStore(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_counts(self):
+        store = ErrorStore(None)
+        first = store.capture(capture(fail, "a"), command="test")
+        second = store.capture(capture(fail, "b"), command="other")
+        self.assertIs(first, second)
+        self.assertEqual(1, len(store))
+        self.assertEqual(2, first.count)
+        self.assertEqual("b", first.message)
+        self.assertEqual({"command": "other"}, first.context)
+        self.assertLessEqual(first.first_seen, first.last_seen)
+
+    def test_bounded(self):
+        store = ErrorStore(None, max_entries=2)
+        a = store.capture(capture(fail, "a"))
+        b = store.capture(capture(fail_other, "a"))
+        store.capture(capture(fail, "a"))  # a is now the most recent
+        c = store.capture(capture(int, "a", "b"))
+        self.assertEqual([a, c], list(store))
+        self.assertIsNone(store.get(b.fingerprint))
+
+    def test_alternating(self):
+        store = ErrorStore(self.tmp.name)
+        for _ in range(10):
+            store.capture(capture(fail, "a"))
+            store.capture(capture(fail_other, "a"))
+        store.flush()
+        self.assertEqual(2, len(os.listdir(self.tmp.name)))
+        record = next(iter(store))
+        with open(store.path(record.fingerprint)) as f:
+            content = f.read()
+        self.assertIn("ValueError: a", content)
+        self.assertIn("Seen 10 times", content)
+
+    def test_rate_limit(self):
+        store = ErrorStore(
+            self.tmp.name, write_rate=20, write_burst=1, header=lambda: "header\n"
+        )
+
+        async def run():
+            store.capture(capture(fail, "a"), channel_id="1/2")
+            store.capture(capture(fail_other, "a"))
+            await asyncio.sleep(0.01)
+            writes = store.writes
+            await asyncio.sleep(0.1)
+            return writes
+
+        self.assertEqual(1, self._await(run()))
+        self.assertEqual(2, store.writes)
+        self.assertEqual(0, store.stats()["pending"])
+        with open(store.path(next(iter(store)).fingerprint)) as f:
+            content = f.read()
+        self.assertTrue(content.startswith("header\n"))
+        self.assertIn("Context: channel_id=1/2", content)
+
+    def test_close(self):
+        store = ErrorStore(self.tmp.name, write_rate=1, write_burst=1)
+
+        async def run():
+            store.capture(capture(fail, "a"))
+            store.capture(capture(fail_other, "a"))
+            await asyncio.sleep(0)  # first write started, second one waits
+            await store.close()
+
+        self._await(run())
+        self.assertEqual(2, len(os.listdir(self.tmp.name)))
+        self.assertEqual(0, store.stats()["pending"])
+
+    def test_no_loop(self):
+        store = ErrorStore(self.tmp.name)
+        store.capture(capture(fail, "a"))
+        self.assertEqual(0, len(os.listdir(self.tmp.name)))
+        self.assertEqual(1, store.stats()["pending"])
+        store.flush()
+        self.assertEqual(1, len(os.listdir(self.tmp.name)))
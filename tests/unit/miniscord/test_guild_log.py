@@ -0,0 +1,73 @@
+from unittest import TestCase
+from os import path
+import os
+import time
+
+from miniscord._guild_log import GuildLogWriter
+
+
+class TestGuildLogWriter(TestCase):
+    LOG_PATH = "test_guilds.log"
+
+    def clean(self):
+        for suffix in ("", ".1", ".2", ".3"):
+            if path.exists(self.LOG_PATH + suffix):
+                os.remove(self.LOG_PATH + suffix)
+
+    def setUp(self):
+        self.clean()
+
+    def tearDown(self):
+        self.clean()
+
+    def read(self, suffix: str = "") -> str:
+        with open(self.LOG_PATH + suffix, encoding="utf-8", mode="r") as f:
+            return f.read()
+
+    def test_buffered(self):
+        writer = GuildLogWriter(self.LOG_PATH, flush_delay=10)
+        writer.write("line1\n")
+        writer.write("line2\n")
+        self.assertFalse(path.exists(self.LOG_PATH))
+        writer.flush()
+        self.assertEqual("line1\nline2\n", self.read())
+        writer.close()
+
+    def test_flush_size(self):
+        writer = GuildLogWriter(self.LOG_PATH, flush_size=2, flush_delay=10)
+        writer.write("line1\n")
+        writer.write("line2\n")
+        for _ in range(100):
+            if path.exists(self.LOG_PATH):
+                break
+            time.sleep(0.01)
+        self.assertEqual("line1\nline2\n", self.read())
+        writer.close()
+
+    def test_flush_delay(self):
+        writer = GuildLogWriter(self.LOG_PATH, flush_delay=0.01)
+        writer.write("line1\n")
+        time.sleep(0.1)
+        self.assertEqual("line1\n", self.read())
+        writer.close()
+
+    def test_close(self):
+        writer = GuildLogWriter(self.LOG_PATH, flush_delay=10)
+        writer.write("line1\n")
+        writer.close()
+        self.assertEqual("line1\n", self.read())
+        with self.assertRaises(ValueError):
+            writer.write("line2\n")
+        writer.close()
+
+    def test_rotate(self):
+        writer = GuildLogWriter(self.LOG_PATH, max_bytes=10, backups=2)
+        for i in range(4):
+            writer.write(f"line{i}\n")
+            writer.flush()
+        writer.close()
+        self.assertEqual("line3\n", self.read())
+        self.assertEqual("line2\n", self.read(".1"))
+        self.assertEqual("line1\n", self.read(".2"))
+        self.assertFalse(path.exists(self.LOG_PATH + ".3"))
+        self.assertEqual(3, writer.rotations)
@@ -0,0 +1,51 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from miniscord._guilds import GuildRegistry
+
+
+def guild(guild_id: int) -> MagicMock:
+    guild = MagicMock()
+    guild.id = guild_id
+    return guild
+
+
+class TestGuildRegistry(TestCase):
+    def test_lazy_seed(self):
+        source = MagicMock(return_value=[guild(1), guild(2)])
+        registry = GuildRegistry(source)
+        source.assert_not_called()
+        self.assertEqual(2, len(registry))
+        self.assertEqual(2, len(registry))
+        source.assert_called_once()
+
+    def test_contains(self):
+        registry = GuildRegistry(lambda: [guild(1)])
+        self.assertIn(1, registry)
+        self.assertIn(guild(1), registry)
+        self.assertNotIn(2, registry)
+        self.assertEqual(1, registry.get(1).id)
+        self.assertIsNone(registry.get(2))
+
+    def test_add_remove(self):
+        registry = GuildRegistry(lambda: [guild(1)])
+        self.assertTrue(registry.add(guild(2)))
+        self.assertFalse(registry.add(guild(2)))
+        self.assertTrue(registry.remove(1))
+        self.assertFalse(registry.remove(guild(1)))
+        self.assertEqual([2], [g.id for g in registry])
+
+    def test_invalidate(self):
+        guilds = [guild(1)]
+        registry = GuildRegistry(lambda: guilds)
+        self.assertEqual(1, len(registry))
+        guilds.append(guild(2))
+        self.assertEqual(1, len(registry))
+        registry.invalidate()
+        self.assertEqual(2, len(registry))
+
+    def test_seed(self):
+        registry = GuildRegistry(lambda: [guild(1)])
+        registry.seed([guild(2), guild(3)])
+        self.assertEqual(2, len(registry))
+        self.assertNotIn(1, registry)
@@ -0,0 +1,89 @@
+import asyncio
+from unittest import TestCase
+from tests.utils import AsyncTestCase
+
+from miniscord._metrics import Counter, Histogram, Metrics, BotMetrics
+
+
+class TestCounter(TestCase):
+    def test_labels(self):
+        counter = Counter("calls", "Calls", ["command"])
+        counter.inc("a")
+        counter.inc("a")
+        counter.inc("b", amount=3)
+        self.assertEqual(2, counter.get("a"))
+        self.assertEqual(0, counter.get("c"))
+        self.assertEqual(5, counter.total())
+
+    def test_render(self):
+        counter = Counter("calls", "Calls", ["command"])
+        counter.inc('a"b')
+        self.assertEqual(
+            ["# HELP calls Calls", "# TYPE calls counter", 'calls{command="a\\"b"} 1'],
+            counter.render(),
+        )
+
+
+class TestHistogram(TestCase):
+    def test_observe(self):
+        histogram = Histogram("time", "Time", [1, 2, 5])
+        for value in [0.5, 1, 1.5, 3, 10]:
+            histogram.observe(value)
+        self.assertEqual(5, histogram.count())
+        self.assertEqual(16, histogram.sum())
+        self.assertEqual(1, histogram.quantile(0.4))
+        self.assertEqual(5, histogram.quantile(0.8))
+        self.assertEqual(float("inf"), histogram.quantile(1))
+        self.assertIsNone(histogram.quantile(0.5, "other"))
+
+    def test_render(self):
+        histogram = Histogram("time", "Time", [1, 2], ["command"])
+        histogram.observe(0.5, "a")
+        histogram.observe(3, "a")
+        self.assertEqual(
+            [
+                "# HELP time Time",
+                "# TYPE time histogram",
+                'time_bucket{command="a",le="1"} 1',
+                'time_bucket{command="a",le="2"} 1',
+                'time_bucket{command="a",le="+Inf"} 2',
+                'time_sum{command="a"} 3.5',
+                'time_count{command="a"} 2',
+            ],
+            histogram.render(),
+        )
+
+
+class TestMetrics(AsyncTestCase):
+    def test_registry(self):
+        metrics = Metrics("bot")
+        counter = metrics.counter("calls_total", "Calls")
+        self.assertIs(counter, metrics.counter("calls_total", "Calls"))
+        counter.inc()
+        self.assertEqual(
+            "# HELP bot_calls_total Calls\n# TYPE bot_calls_total counter\nbot_calls_total 1\n",
+            metrics.render(),
+        )
+
+    def test_serve(self):
+        metrics = BotMetrics()
+        metrics.messages.inc()
+
+        async def get(port: int, target: str) -> bytes:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response
+
+        async def run():
+            port = await metrics.serve("127.0.0.1", 0)
+            self.assertEqual(port, await metrics.serve("127.0.0.1", 0))
+            responses = [await get(port, "/metrics"), await get(port, "/")]
+            await metrics.close()
+            return responses
+
+        found, not_found = self._await(run())
+        self.assertTrue(found.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertIn(b"\nminiscord_messages_total 1\n", found)
+        self.assertTrue(not_found.startswith(b"HTTP/1.1 404"))
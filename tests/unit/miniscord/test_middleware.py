@@ -0,0 +1,148 @@
+import asyncio
+from unittest.mock import MagicMock
+from tests.utils import AsyncTestCase
+
+from miniscord._middleware import Middleware, MiddlewareChain
+
+
+class Recorder(Middleware):
+    def __init__(self, name, calls, skip=False, handle=False):
+        self.name = name
+        self.calls = calls
+        self.skip = skip
+        self.handle = handle
+
+    async def before(self, context):
+        self.calls += [f"{self.name}.before"]
+        return not self.skip
+
+    async def after(self, context, elapsed):
+        self.calls += [f"{self.name}.after"]
+
+    async def on_error(self, context, error, elapsed):
+        self.calls += [f"{self.name}.on_error:{error}"]
+        return self.handle
+
+
+class TestMiddlewareChain(AsyncTestCase):
+    def chain(self, *middlewares) -> MiddlewareChain:
+        chain = MiddlewareChain()
+        for middleware in middlewares:
+            chain.add(middleware)
+        return chain
+
+    def test_order(self):
+        calls = []
+
+        async def call():
+            calls.append("call")
+
+        chain = self.chain(Recorder("a", calls), Recorder("b", calls))
+        self.assertTrue(self._await(chain.run(MagicMock(), call)))
+        self.assertEqual(["a.before", "b.before", "call", "b.after", "a.after"], calls)
+
+    def test_default_hooks(self):
+        calls = []
+
+        async def call():
+            calls.append("call")
+
+        self.assertTrue(self._await(self.chain(Middleware()).run(MagicMock(), call)))
+        self.assertEqual(["call"], calls)
+
+    def test_skip(self):
+        calls = []
+
+        async def call():
+            calls.append("call")
+
+        chain = self.chain(
+            Recorder("a", calls), Recorder("b", calls, skip=True), Recorder("c", calls)
+        )
+        self.assertFalse(self._await(chain.run(MagicMock(), call)))
+        self.assertEqual(["a.before", "b.before", "a.after"], calls)
+
+    def test_error(self):
+        calls = []
+
+        async def call():
+            raise ValueError("x")
+
+        chain = self.chain(Recorder("a", calls), Recorder("b", calls))
+        with self.assertRaises(ValueError):
+            self._await(chain.run(MagicMock(), call))
+        self.assertEqual(
+            ["a.before", "b.before", "b.on_error:x", "a.on_error:x"], calls
+        )
+
+    def test_error_handled(self):
+        calls = []
+
+        async def call():
+            raise ValueError("x")
+
+        chain = self.chain(Recorder("a", calls), Recorder("b", calls, handle=True))
+        self.assertTrue(self._await(chain.run(MagicMock(), call)))
+        self.assertEqual(
+            ["a.before", "b.before", "b.on_error:x", "a.on_error:x"], calls
+        )
+
+    def test_cancelled(self):
+        calls = []
+
+        async def call():
+            calls.append("call")
+            await asyncio.sleep(10)
+
+        chain = self.chain(Recorder("a", calls), Recorder("b", calls, handle=True))
+
+        async def run():
+            task = asyncio.ensure_future(chain.run(MagicMock(), call))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            self._await(run())
+        self.assertEqual(
+            ["a.before", "b.before", "call", "b.on_error:", "a.on_error:"], calls
+        )
+
+    def test_cancelled_before(self):
+        calls = []
+
+        class Slow(Middleware):
+            async def before(self, context):
+                await asyncio.sleep(10)
+
+        chain = self.chain(Recorder("a", calls), Slow())
+
+        async def run():
+            task = asyncio.ensure_future(chain.run(MagicMock(), MagicMock()))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            self._await(run())
+        self.assertEqual(["a.before", "a.on_error:"], calls)
+
+    def test_timing(self):
+        elapsed = []
+
+        class Timer(Middleware):
+            async def after(self, context, value):
+                elapsed.append(value)
+
+        async def call():
+            await asyncio.sleep(0.02)
+
+        self._await(self.chain(Timer()).run(MagicMock(), call))
+        self.assertGreaterEqual(elapsed[0], 0.015)
+
+    def test_remove(self):
+        middleware = Middleware()
+        chain = self.chain(middleware)
+        self.assertTrue(chain.remove(middleware))
+        self.assertFalse(chain.remove(middleware))
+        self.assertEqual(0, len(chain))
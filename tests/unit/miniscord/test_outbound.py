@@ -0,0 +1,145 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from tests.utils import AsyncTestCase
+
+from miniscord._outbound import (
+    OutboundScheduler,
+    PRIORITY_REPLY,
+    PRIORITY_NOTICE,
+    PRIORITY_PRESENCE,
+    PRIORITIES,
+)
+from miniscord._ratelimit import TokenBuckets
+
+
+class TestOutboundScheduler(AsyncTestCase):
+    def test_send(self):
+        send = AsyncMock(return_value="sent")
+        outbound = OutboundScheduler()
+
+        async def run():
+            return await outbound.submit(PRIORITY_REPLY, 1, send, "a", reference="b")
+
+        self.assertEqual("sent", self._await(run()))
+        send.assert_awaited_once_with("a", reference="b")
+        self.assertEqual(1, outbound.sent[PRIORITY_REPLY])
+
+    def test_exception(self):
+        send = AsyncMock(side_effect=Exception("test"))
+        outbound = OutboundScheduler()
+
+        async def run():
+            await outbound.submit(PRIORITY_REPLY, 1, send)
+
+        with self.assertRaises(Exception):
+            self._await(run())
+
+    def test_priority(self):
+        sent = []
+
+        async def send(name):
+            sent.append(name)
+
+        outbound = OutboundScheduler()
+
+        async def run():
+            await asyncio.gather(
+                outbound.submit(PRIORITY_PRESENCE, 1, send, "presence"),
+                outbound.submit(PRIORITY_NOTICE, 2, send, "notice"),
+                outbound.submit(PRIORITY_REPLY, 3, send, "reply"),
+            )
+
+        self._await(run())
+        self.assertEqual(["reply", "notice", "presence"], sent)
+        self.assertEqual(sorted(PRIORITIES, reverse=True), list(PRIORITIES))
+
+    def test_stop(self):
+        send = AsyncMock()
+        outbound = OutboundScheduler(rate=1)
+
+        async def run():
+            # the first one takes the only global token
+            outbound.submit(PRIORITY_REPLY, 1, send)
+            await asyncio.sleep(0)
+            future = outbound.submit(PRIORITY_REPLY, 2, send)
+            self.assertEqual(1, outbound.queued)
+            outbound.stop()
+            await asyncio.sleep(0.01)
+            return future
+
+        self.assertTrue(self._await(run()).cancelled())
+        self.assertEqual(0, outbound.queued)
+        send.assert_awaited_once()
+
+    def test_route(self):
+        sent = []
+
+        async def send(name):
+            sent.append(name)
+
+        outbound = OutboundScheduler(route_rate=0.01, route_burst=1)
+
+        async def run():
+            # channel 1 is exhausted, channel 2 is not held back by it
+            outbound.submit(PRIORITY_REPLY, 1, send, "a")
+            outbound.submit(PRIORITY_REPLY, 1, send, "b")
+            await outbound.submit(PRIORITY_NOTICE, 2, send, "c")
+            self.assertEqual(1, outbound.queued)
+            outbound.stop()
+            await asyncio.sleep(0.01)
+
+        self._await(run())
+        self.assertEqual(["a", "c"], sent)
+
+    def test_exhausted_route_backlog(self):
+        send = AsyncMock()
+        outbound = OutboundScheduler(rate=1000, route_rate=0.01, route_burst=1)
+        retry_after = TokenBuckets.retry_after
+
+        async def run():
+            # requests behind an exhausted route are not looked at for each send
+            for _ in range(1000):
+                outbound.submit(PRIORITY_REPLY, 1, send)
+            others = [outbound.submit(PRIORITY_REPLY, i, send) for i in range(2, 52)]
+            await asyncio.gather(*others)
+            self.assertEqual(999, outbound.queued)
+            outbound.stop()
+            await asyncio.sleep(0.01)
+
+        with patch.object(
+            TokenBuckets, "retry_after", autospec=True, side_effect=retry_after
+        ) as checks:
+            self._await(run())
+        self.assertLess(checks.call_count, 200)
+        self.assertEqual(51, send.await_count)
+
+    def test_routes_take_turns(self):
+        sent = []
+
+        async def send(name):
+            sent.append(name)
+
+        outbound = OutboundScheduler()
+
+        async def run():
+            await asyncio.gather(
+                outbound.submit(PRIORITY_REPLY, 1, send, "a1"),
+                outbound.submit(PRIORITY_REPLY, 1, send, "a2"),
+                outbound.submit(PRIORITY_REPLY, 2, send, "b1"),
+            )
+
+        self._await(run())
+        self.assertEqual(["a1", "b1", "a2"], sent)
+
+    def test_global_rate(self):
+        send = AsyncMock()
+        outbound = OutboundScheduler(rate=100)
+
+        async def run():
+            futures = [outbound.submit(PRIORITY_REPLY, i, send) for i in range(105)]
+            await asyncio.gather(*futures)
+            await outbound.join()
+
+        self._await(run())
+        self.assertEqual(105, send.await_count)
+        self.assertEqual(0, outbound.queued)
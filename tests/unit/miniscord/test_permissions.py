@@ -0,0 +1,137 @@
+from unittest import TestCase
+from unittest.mock import AsyncMock, MagicMock
+import asyncio
+from tests.utils import AsyncTestCase
+
+import discord
+from miniscord._permissions import PermissionCache, PermissionNotifier
+
+
+def message(guild_id: int, channel_id: int) -> MagicMock:
+    message = MagicMock()
+    message.guild.id = guild_id
+    message.channel.id = channel_id
+    message.channel.permissions_for.return_value = f"{guild_id}/{channel_id}"
+    return message
+
+
+class TestPermissionCache(TestCase):
+    def test_hit_miss(self):
+        cache = PermissionCache()
+        message1 = message(1, 2)
+        self.assertEqual("1/2", cache.get(message1))
+        self.assertEqual("1/2", cache.get(message1))
+        message1.channel.permissions_for.assert_called_once_with(message1.guild.me)
+        self.assertEqual({"hits": 1, "misses": 1, "size": 1}, cache.stats())
+
+    def test_invalidate_channel(self):
+        cache = PermissionCache()
+        message1 = message(1, 2)
+        message2 = message(1, 3)
+        cache.get(message1)
+        cache.get(message2)
+        cache.invalidate_channel(1, 2)
+        cache.invalidate_channel(4, 2)
+        self.assertEqual(1, len(cache))
+        cache.get(message1)
+        cache.get(message2)
+        self.assertEqual(2, message1.channel.permissions_for.call_count)
+        self.assertEqual(1, message2.channel.permissions_for.call_count)
+
+    def test_invalidate_guild(self):
+        cache = PermissionCache()
+        cache.get(message(1, 2))
+        cache.get(message(1, 3))
+        cache.get(message(4, 5))
+        cache.invalidate_guild(1)
+        cache.invalidate_guild(6)
+        self.assertEqual(1, len(cache))
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+
+class TestPermissionNotifier(AsyncTestCase):
+    def user(self, user_id: int) -> MagicMock:
+        user = MagicMock()
+        user.id = user_id
+        user.create_dm = AsyncMock()
+        return user
+
+    def test_deduplicate(self):
+        notifier = PermissionNotifier()
+        user = self.user(1)
+
+        async def run():
+            self.assertTrue(notifier.notify(user, "c1", "text"))
+            self.assertFalse(notifier.notify(user, "c1", "text"))
+            self.assertTrue(notifier.notify(user, "c2", "text"))
+            await notifier.join()
+            notifier.stop()
+
+        self._await(run())
+        user.create_dm.assert_awaited_once()
+        self.assertEqual(2, user.create_dm.return_value.send.await_count)
+        self.assertEqual(2, notifier.sent)
+        self.assertEqual(1, notifier.deduplicated)
+
+    def test_window(self):
+        notifier = PermissionNotifier(window=0.01)
+        user = self.user(1)
+
+        async def run():
+            notifier.notify(user, "c1", "text")
+            await asyncio.sleep(0.02)
+            self.assertTrue(notifier.notify(user, "c1", "text"))
+            await notifier.join()
+            notifier.stop()
+
+        self._await(run())
+        self.assertEqual(2, notifier.sent)
+
+    def test_dm_channel_cache(self):
+        notifier = PermissionNotifier(max_dm_channels=1)
+        user1 = self.user(1)
+        user2 = self.user(2)
+
+        async def run():
+            notifier.notify(user1, "c1", "text")
+            notifier.notify(user2, "c1", "text")
+            notifier.notify(user1, "c2", "text")
+            await notifier.join()
+            notifier.stop()
+
+        self._await(run())
+        self.assertEqual(2, user1.create_dm.await_count)
+        self.assertEqual(1, user2.create_dm.await_count)
+
+    def test_forbidden(self):
+        notifier = PermissionNotifier()
+        user = self.user(1)
+        user.create_dm.return_value.send.side_effect = discord.Forbidden(
+            MagicMock(), ""
+        )
+
+        async def run():
+            notifier.notify(user, "c1", "text")
+            await notifier.join()
+            notifier.stop()
+
+        with self.assertLogs(level="WARNING"):
+            self._await(run())
+        self.assertEqual(0, notifier.sent)
+
+    def test_unexpected_error(self):
+        notifier = PermissionNotifier()
+        user = self.user(1)
+        user.create_dm.return_value.send.side_effect = [RuntimeError(), None]
+
+        async def run():
+            notifier.notify(user, "c1", "text")
+            notifier.notify(user, "c2", "text")
+            await notifier.join()
+            notifier.stop()
+
+        with self.assertLogs(level="ERROR"):
+            self._await(run())
+        self.assertEqual(2, user.create_dm.return_value.send.await_count)
+        self.assertEqual(1, notifier.sent)
@@ -0,0 +1,51 @@
+import asyncio
+from unittest.mock import AsyncMock
+from tests.utils import AsyncTestCase
+
+from miniscord._presence import PresenceRotator
+
+
+class TestPresenceRotator(AsyncTestCase):
+    def test_unchanged(self):
+        update = AsyncMock()
+        texts = iter(["a", "a", "b"])
+        rotator = PresenceRotator(lambda: next(texts), update)
+
+        async def run():
+            return [await rotator.tick() for _ in range(3)]
+
+        self.assertEqual([True, False, True], self._await(run()))
+        self.assertEqual(["a", "b"], [c.args[0] for c in update.await_args_list])
+        self.assertEqual(2, rotator.updates)
+        self.assertEqual(1, rotator.skipped)
+
+    def test_rate_limit(self):
+        update = AsyncMock()
+        texts = iter(["a", "b"])
+        rotator = PresenceRotator(lambda: next(texts), update, rate=20, burst=1)
+
+        async def run():
+            await rotator.tick()
+            loop = asyncio.get_event_loop()
+            t0 = loop.time()
+            await rotator.tick()
+            return loop.time() - t0
+
+        self.assertGreater(self._await(run()), 0.03)
+        self.assertEqual(2, update.await_count)
+
+    def test_single_task(self):
+        update = AsyncMock()
+        rotator = PresenceRotator(lambda: "a", update, delay=10)
+
+        async def run():
+            self.assertTrue(rotator.start())
+            await asyncio.sleep(0.01)
+            self.assertFalse(rotator.start())  # new session, sent again
+            await asyncio.sleep(0.01)
+            rotator.stop()
+            await asyncio.sleep(0.01)
+
+        self._await(run())
+        self.assertEqual(2, update.await_count)
+        self.assertFalse(rotator.running)
@@ -0,0 +1,108 @@
+from unittest.mock import MagicMock
+import asyncio
+import os
+import tempfile
+import tracemalloc
+from tests.utils import AsyncTestCase
+
+from miniscord._middleware import MiddlewareChain
+from miniscord._profiling import ProfilingMiddleware, MODE_CPU, MODE_MEMORY
+
+
+def context(name: str) -> MagicMock:
+    context = MagicMock()
+    context.command.name = name
+    context.args = [name]
+    return context
+
+
+def busy():
+    return sum(i * i for i in range(1000))
+
+
+class TestProfilingMiddleware(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.profiler = ProfilingMiddleware(self.tmp.name)
+        self.chain = MiddlewareChain()
+        self.chain.add(self.profiler)
+
+    def tearDown(self):
+        self.profiler.stop()
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def run_command(self, name: str, function=busy):
+        async def call():
+            function()
+
+        self._await(self.chain.run(context(name), call))
+
+    def test_cpu(self):
+        self.profiler.start("test", 2, MODE_CPU)
+        self.run_command("other")
+        self.run_command("test")
+        self.assertEqual(1, self.profiler.sampled)
+        self.assertTrue(self.profiler.running)
+        self.run_command("test")
+        self.assertFalse(self.profiler.running)
+        self.assertEqual(1, len(self.profiler.reports))
+        with open(self.profiler.reports[0]) as f:
+            content = f.read()
+        self.assertIn("cprofile of 'test' over 2 invocations", content)
+        self.assertIn("busy", content)
+
+    def test_memory(self):
+        tracing = tracemalloc.is_tracing()
+        self.profiler.start("test", 1, MODE_MEMORY)
+        kept = []
+        self.run_command("test", lambda: kept.append([0] * 100000))
+        self.assertFalse(self.profiler.running)
+        self.assertEqual(tracing, tracemalloc.is_tracing())
+        with open(self.profiler.reports[0]) as f:
+            content = f.read()
+        self.assertIn("tracemalloc of 'test' over 1 invocations", content)
+        self.assertIn("test_profiling.py", content)
+
+    def test_error(self):
+        self.profiler.start("test", 1)
+
+        def fail():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            self.run_command("test", fail)
+        self.assertEqual(1, len(os.listdir(self.tmp.name)))
+
+    def test_cancelled(self):
+        self.profiler.start("test", 5)
+
+        async def call():
+            await asyncio.sleep(10)
+
+        async def run():
+            task = asyncio.ensure_future(self.chain.run(context("test"), call))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            self._await(run())
+        self.assertEqual(1, self.profiler.sampled)
+        self.assertIsNone(self.profiler._ProfilingMiddleware__current)
+        # the next invocation is sampled again
+        self.run_command("test")
+        self.assertEqual(2, self.profiler.sampled)
+
+    def test_stop(self):
+        self.profiler.start("test", 5)
+        self.run_command("test")
+        self.profiler.stop()
+        self.run_command("test")
+        self.assertFalse(self.profiler.running)
+        self.assertEqual([], os.listdir(self.tmp.name))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.profiler.start("test", 1, "other")
@@ -0,0 +1,152 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import asyncio
+from tests.utils import AsyncTestCase
+
+import discord
+from miniscord._ratelimit import (
+    TokenBuckets,
+    RateLimit,
+    consume_all,
+    scope_key,
+    SCOPE_SENDER,
+    SCOPE_CHANNEL,
+    SCOPE_GUILD,
+)
+from miniscord._backends import MemoryBackend
+
+
+class TestTokenBuckets(TestCase):
+    def test_burst(self):
+        buckets = TokenBuckets(1, 2)
+        self.assertEqual(0, buckets.consume("a", 0))
+        self.assertEqual(0, buckets.consume("a", 0))
+        self.assertAlmostEqual(1, buckets.consume("a", 0))
+        self.assertEqual(0, buckets.consume("b", 0))
+
+    def test_refill(self):
+        buckets = TokenBuckets(0.5)
+        self.assertEqual(0, buckets.consume("a", 0))
+        self.assertAlmostEqual(1, buckets.retry_after("a", 1))
+        self.assertAlmostEqual(1, buckets.consume("a", 1))
+        self.assertEqual(0, buckets.consume("a", 2))
+
+    def test_retry_after_does_not_consume(self):
+        buckets = TokenBuckets(1)
+        self.assertEqual(0, buckets.retry_after("a", 0))
+        self.assertEqual(0, buckets.retry_after("a", 0))
+        self.assertEqual(0, len(buckets))
+
+    def test_evict_idle(self):
+        buckets = TokenBuckets(1, 1)
+        buckets.consume("a", 0)
+        buckets.consume("b", 0.5)
+        self.assertEqual(2, len(buckets))
+        buckets.consume("c", 1.2)
+        self.assertEqual(2, len(buckets))
+        buckets.consume("d", 10)
+        self.assertEqual(1, len(buckets))
+
+
+class TestSyncedTokenBuckets(AsyncTestCase):
+    def test_shared(self):
+        backend = MemoryBackend()
+        # two processes sharing the same buckets
+        buckets1 = TokenBuckets(0.01, 2, backend=backend, prefix="p:")
+        buckets2 = TokenBuckets(0.01, 2, backend=backend, prefix="p:")
+
+        async def run():
+            self.assertEqual(0, buckets1.consume(1 << 64 | 2))
+            await buckets1.sync()
+            tokens, _ = await backend.get("p:1/2")
+            self.assertAlmostEqual(1, tokens, places=2)
+            self.assertEqual(0, buckets2.consume(1 << 64 | 2))
+            await buckets2.sync()
+            self.assertGreater(buckets2.retry_after(1 << 64 | 2), 90)
+
+        self._await(run())
+        self.assertEqual(1, buckets1.syncs)
+
+    def test_background_sync(self):
+        backend = MemoryBackend()
+        buckets = TokenBuckets(0.01, 1, backend=backend, sync_delay=0.01)
+
+        async def run():
+            buckets.consume("a")
+            self.assertIsNone(await backend.get("a"))
+            await asyncio.sleep(0.03)
+            tokens, _ = await backend.get("a")
+            self.assertAlmostEqual(0, tokens, places=2)
+
+        self._await(run())
+        self.assertEqual(1, buckets.syncs)
+
+    def test_sync_error(self):
+        backend = MemoryBackend()
+        buckets = TokenBuckets(0.01, 2, backend=backend)
+
+        async def failing(keys):
+            raise ConnectionError()
+
+        async def run():
+            get_many = backend.get_many
+            backend.get_many = failing
+            buckets.consume("a")
+            with self.assertRaises(ConnectionError):
+                await buckets.sync()
+            backend.get_many = get_many
+            await buckets.sync()  # taken tokens are kept for the next sync
+            tokens, _ = await backend.get("a")
+            self.assertAlmostEqual(1, tokens, places=2)
+
+        self._await(run())
+
+
+class TestRateLimit(TestCase):
+    def test_cooldown(self):
+        rate_limit = RateLimit.cooldown(10, SCOPE_CHANNEL)
+        self.assertAlmostEqual(0.1, rate_limit.rate)
+        self.assertEqual(1, rate_limit.burst)
+        self.assertEqual(SCOPE_CHANNEL, rate_limit.scope)
+
+    def test_unknown_scope(self):
+        with self.assertRaises(ValueError):
+            RateLimit(1, scope="unknown")
+
+    def test_synced_needs_name(self):
+        with self.assertRaises(ValueError):
+            RateLimit(1, backend=MemoryBackend())
+        rate_limit = RateLimit.cooldown(10, backend=MemoryBackend(), name="hello")
+        self.assertEqual("ratelimit:hello:sender:", rate_limit.buckets.prefix)
+
+    def test_consume_all(self):
+        message = Mock()
+        message.channel.type = discord.ChannelType.text
+        message.guild.id = 1
+        message.channel.id = 2
+        message.author.id = 3
+        rate_limit1 = RateLimit(1, 2)
+        rate_limit2 = RateLimit.cooldown(60, SCOPE_GUILD)
+        self.assertEqual(0, consume_all([rate_limit1, rate_limit2], message))
+        self.assertGreater(consume_all([rate_limit1, rate_limit2], message), 50)
+        # second bucket refused, first one kept its token
+        self.assertEqual(0, consume_all([rate_limit1], message))
+
+
+class TestScopeKey(TestCase):
+    def test_scopes(self):
+        message = Mock()
+        message.channel.type = discord.ChannelType.text
+        message.guild.id = 1
+        message.channel.id = 2
+        message.author.id = 3
+        self.assertEqual(1 << 128 | 2 << 64 | 3, scope_key(message, SCOPE_SENDER))
+        self.assertEqual(1 << 64 | 2, scope_key(message, SCOPE_CHANNEL))
+        self.assertEqual(1, scope_key(message, SCOPE_GUILD))
+
+    def test_direct_guild(self):
+        message = Mock()
+        message.channel.type = discord.ChannelType.private
+        message.guild = None
+        message.author.id = "a"
+        self.assertEqual("a", scope_key(message, SCOPE_GUILD))
@@ -0,0 +1,77 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from tests.utils import AsyncTestCase
+
+from miniscord._replies import ReplyBuffer
+
+
+class TestReplyBuffer(AsyncTestCase):
+    def test_merge(self):
+        send = AsyncMock(return_value=["sent"])
+        buffer = ReplyBuffer(send, 0.01)
+        message = MagicMock()
+
+        async def run():
+            future1 = buffer.reply(message, "line1")
+            future2 = buffer.reply(message, "line2")
+            self.assertIsNot(future1, future2)
+            send.assert_not_awaited()
+            return await asyncio.gather(future1, future2)
+
+        self.assertEqual([["sent"], ["sent"]], self._await(run()))
+        send.assert_awaited_once_with(message, ["line1\nline2"])
+
+    def test_cancel_one_caller(self):
+        send = AsyncMock(return_value=["sent"])
+        buffer = ReplyBuffer(send, 0.01)
+        message = MagicMock()
+
+        async def run():
+            future1 = buffer.reply(message, "line1")
+            future2 = buffer.reply(message, "line2")
+            future1.cancel()
+            return await future2
+
+        self.assertEqual(["sent"], self._await(run()))
+        send.assert_awaited_once_with(message, ["line1\nline2"])
+
+    def test_split(self):
+        send = AsyncMock()
+        buffer = ReplyBuffer(send, 0.01, 10)
+        message = MagicMock()
+
+        async def run():
+            buffer.reply(message, "aaaaa")
+            buffer.reply(message, "bbbbb")
+            await buffer.join()
+
+        self._await(run())
+        send.assert_awaited_once_with(message, ["aaaaa\n", "bbbbb"])
+
+    def test_other_message(self):
+        send = AsyncMock()
+        buffer = ReplyBuffer(send, 10)
+        message1 = MagicMock()
+        message2 = MagicMock()
+        message2.channel = message1.channel
+
+        async def run():
+            buffer.reply(message1, "a")
+            buffer.reply(message2, "b")
+            await asyncio.sleep(0)
+            send.assert_awaited_once_with(message1, ["a"])
+            await buffer.join()
+
+        self._await(run())
+        send.assert_awaited_with(message2, ["b"])
+
+    def test_exception(self):
+        send = AsyncMock(side_effect=Exception("test"))
+        buffer = ReplyBuffer(send, 0)
+        message = MagicMock()
+
+        async def run():
+            await buffer.reply(message, "a")
+
+        with self.assertRaises(Exception):
+            self._await(run())
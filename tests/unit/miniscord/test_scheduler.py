@@ -0,0 +1,146 @@
+import asyncio
+from tests.utils import AsyncTestCase
+
+from miniscord._scheduler import (
+    CommandScheduler,
+    AdmissionController,
+    LOW_PRIORITY,
+    DEFAULT_PRIORITY,
+    HIGH_PRIORITY,
+)
+
+
+class TestCommandScheduler(AsyncTestCase):
+    def test_channel_order(self):
+        scheduler = CommandScheduler(10)
+        done = []
+
+        async def job(name: str, delay: float):
+            await asyncio.sleep(delay)
+            done.append(name)
+
+        async def run():
+            scheduler.submit("c1", None, job, "a", 0.02)
+            scheduler.submit("c1", None, job, "b", 0)
+            scheduler.submit("c2", None, job, "c", 0.01)
+            self.assertEqual(2, scheduler.queue_depth("c1"))
+            self.assertEqual(3, scheduler.queued)
+            await scheduler.join()
+
+        self._await(run())
+        self.assertEqual(["c", "a", "b"], done)
+        self.assertEqual(0, scheduler.queued)
+        self.assertEqual(0, scheduler.in_flight)
+        self.assertEqual({}, scheduler.stats()["channels"])
+
+    def test_global_limit(self):
+        scheduler = CommandScheduler(2)
+        running = []
+        peak = []
+
+        async def job():
+            running.append(None)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        async def run():
+            for i in range(6):
+                scheduler.submit(f"c{i}", None, job)
+            await asyncio.sleep(0.005)
+            self.assertEqual(2, scheduler.in_flight)
+            self.assertEqual(4, scheduler.queued)
+            await scheduler.join()
+
+        self._await(run())
+        self.assertEqual(2, max(peak))
+
+    def test_guild_limit(self):
+        scheduler = CommandScheduler(10, 1)
+        done = []
+
+        async def job(name: str):
+            await asyncio.sleep(0.01)
+            done.append(name)
+
+        async def run():
+            scheduler.submit("g1/c1", "g1", job, "a")
+            scheduler.submit("g1/c2", "g1", job, "b")
+            scheduler.submit("g2/c1", "g2", job, "c")
+            await asyncio.sleep(0.005)
+            self.assertEqual(1, scheduler.guild_in_flight("g1"))
+            self.assertEqual(1, scheduler.guild_in_flight("g2"))
+            self.assertEqual(1, scheduler.channel_in_flight("g1/c1"))
+            self.assertEqual(0, scheduler.channel_in_flight("g1/c2"))
+            self.assertEqual({"g1": 1, "g2": 1}, scheduler.stats()["guilds"])
+            await scheduler.join()
+
+        self._await(run())
+        self.assertEqual(["a", "c", "b"], done)
+
+    def test_exception(self):
+        scheduler = CommandScheduler(1)
+        done = []
+
+        async def fail():
+            raise Exception("test")
+
+        async def job():
+            done.append(None)
+
+        async def run():
+            scheduler.submit("c1", None, fail)
+            scheduler.submit("c1", None, job)
+            await scheduler.join()
+
+        with self.assertLogs(level="ERROR"):
+            self._await(run())
+        self.assertEqual(1, len(done))
+
+
+class TestAdmissionController(AsyncTestCase):
+    def test_under_threshold(self):
+        admission = AdmissionController(2)
+        self.assertTrue(self._await(admission.acquire()))
+        self.assertTrue(self._await(admission.acquire(LOW_PRIORITY)))
+        self.assertEqual(2, admission.in_flight)
+        admission.release()
+        self.assertEqual(1, admission.in_flight)
+
+    def test_reject(self):
+        admission = AdmissionController(1)
+        self.assertTrue(self._await(admission.acquire()))
+        self.assertFalse(self._await(admission.acquire()))
+        self.assertFalse(self._await(admission.acquire(LOW_PRIORITY)))
+        self.assertEqual(2, admission.rejected)
+
+    def test_high_priority(self):
+        admission = AdmissionController(1)
+        self.assertTrue(self._await(admission.acquire()))
+        self.assertTrue(self._await(admission.acquire(HIGH_PRIORITY)))
+        self.assertEqual(2, admission.in_flight)
+
+    def test_defer(self):
+        admission = AdmissionController(1, max_deferred=1)
+        order = []
+
+        async def job(name: str, priority: int):
+            if await admission.acquire(priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+                admission.release()
+            else:
+                order.append(f"rejected {name}")
+
+        async def run():
+            await asyncio.gather(
+                job("a", DEFAULT_PRIORITY),
+                job("b", DEFAULT_PRIORITY),
+                job("c", DEFAULT_PRIORITY),
+                job("d", LOW_PRIORITY),
+            )
+
+        self._await(run())
+        self.assertEqual(["a", "rejected c", "rejected d", "b"], order)
+        self.assertEqual(0, admission.in_flight)
+        self.assertEqual(0, admission.deferred)
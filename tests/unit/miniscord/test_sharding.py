@@ -0,0 +1,163 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from tests.utils import AsyncTestCase
+
+from miniscord._sharding import ShardLauncher, ClusterClient, shard_ranges
+
+
+class FakeBot(object):
+    # reports a fixed guild count then exits once the totals came back
+    def __init__(self, shard_ids, shard_count):
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.cluster = None
+
+    def start(self):
+        self.cluster.report(len(self.shard_ids), 0.1, True)
+        while self.cluster.total_guilds != self.shard_count:
+            if not self.cluster.receive(5):
+                raise SystemExit(2)
+
+
+class CrashOnceBot(FakeBot):
+    markers = None  # directory remembering the first runs
+
+    def start(self):
+        marker = os.path.join(self.markers, str(self.shard_ids[0]))
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            raise SystemExit(3)
+        super().start()
+
+
+class TestShardRanges(TestCase):
+    def test_even(self):
+        self.assertEqual([[0, 1], [2, 3]], shard_ranges(4, 2))
+
+    def test_uneven(self):
+        self.assertEqual([[0, 1, 2], [3, 4], [5, 6]], shard_ranges(7, 3))
+
+    def test_more_processes(self):
+        self.assertEqual([[0], [1]], shard_ranges(2, 8))
+
+
+class TestClusterClient(AsyncTestCase):
+    def test_report_receive(self):
+        parent, child = multiprocessing.Pipe()
+        cluster = ClusterClient(child, [0, 1])
+        cluster.report(3, 0.2, True)
+        report = parent.recv()
+        self.assertEqual([0, 1], report["shard_ids"])
+        self.assertEqual(3, report["guilds"])
+        self.assertTrue(report["ready"])
+        self.assertFalse(cluster.receive())
+        parent.send({"guilds": 5, "workers": 2})
+        parent.send({"guilds": 7, "workers": 2})
+        self.assertTrue(cluster.receive(1))
+        self.assertEqual(7, cluster.total_guilds)
+        self.assertEqual(2, cluster.workers)
+
+    def test_task(self):
+        parent, child = multiprocessing.Pipe()
+        cluster = ClusterClient(child, [0], report_delay=10)
+        bot = MagicMock()
+        bot.guilds = [1, 2]
+        bot.client.latency = 0.1
+        bot.client.is_ready.return_value = True
+
+        async def run():
+            cluster.start(bot)
+            cluster.start(bot)
+            await asyncio.sleep(0.01)
+            cluster.stop()
+            await asyncio.sleep(0.01)
+
+        self._await(run())
+        self.assertEqual(2, parent.recv()["guilds"])
+        self.assertFalse(parent.poll())
+
+
+class TestShardLauncher(TestCase):
+    def test_handle_report(self):
+        launcher = ShardLauncher(FakeBot, 4, 2)
+        for worker in launcher.workers:
+            worker.connection = MagicMock()
+        launcher.handle_report(
+            launcher.workers[0], {"guilds": 3, "ready": True, "latency": 0.1}
+        )
+        launcher.handle_report(
+            launcher.workers[1], {"guilds": 4, "ready": False, "latency": 0.1}
+        )
+        self.assertEqual(7, launcher.total_guilds)
+        launcher.workers[0].connection.send.assert_called_with(
+            {"guilds": 7, "workers": 2}
+        )
+        health = launcher.health()
+        self.assertEqual([True, False], [h["healthy"] for h in health])
+        self.assertEqual([[0, 1], [2, 3]], [h["shard_ids"] for h in health])
+
+    def test_run(self):
+        launcher = ShardLauncher(FakeBot, 5, 2, start_method="fork")
+        launcher.run()
+        self.assertEqual(5, launcher.total_guilds)
+        self.assertEqual([0, 0], [w.process.exitcode for w in launcher.workers])
+        self.assertEqual(0, launcher.restarts)
+
+    def worker_process(self, alive: bool, exitcode=None) -> MagicMock:
+        process = MagicMock()
+        process.is_alive.return_value = alive
+        process.exitcode = exitcode
+        return process
+
+    def test_restart_scheduled(self):
+        launcher = ShardLauncher(FakeBot, 4, 2, restart_delay=10)
+        crashed, running = launcher.workers
+        crashed.process = self.worker_process(False, 1)
+        running.process = self.worker_process(True)
+        running.last_report = time.monotonic()
+        with patch.object(launcher, "_ShardLauncher__start") as start:
+            with self.assertLogs(level="ERROR"):
+                t0 = time.monotonic()
+                self.assertTrue(launcher._ShardLauncher__supervise())
+                self.assertLess(time.monotonic() - t0, 1)
+            start.assert_not_called()
+            self.assertIsNotNone(crashed.restart_at)
+            launcher._ShardLauncher__supervise()
+            start.assert_not_called()
+            crashed.restart_at = time.monotonic()
+            launcher._ShardLauncher__supervise()
+            start.assert_called_once_with(crashed)
+        self.assertIsNone(crashed.restart_at)
+        self.assertEqual(1, launcher.restarts)
+
+    def test_health_timeout(self):
+        launcher = ShardLauncher(FakeBot, 2, 1, health_timeout=60, restart_delay=0)
+        (worker,) = launcher.workers
+        worker.process = self.worker_process(True)
+        worker.last_report = time.monotonic() - 61
+        with patch.object(launcher, "_ShardLauncher__start") as start:
+            with self.assertLogs(level="ERROR"):
+                launcher._ShardLauncher__supervise()
+            worker.process.terminate.assert_called_once()
+            worker.process.is_alive.return_value = False
+            launcher._ShardLauncher__supervise()
+            start.assert_called_once_with(worker)
+        worker.process.kill.assert_not_called()
+        self.assertEqual(1, launcher.restarts)
+
+    def test_run_restart(self):
+        with tempfile.TemporaryDirectory() as markers:
+            CrashOnceBot.markers = markers
+            launcher = ShardLauncher(
+                CrashOnceBot, 4, 2, restart_delay=0.05, start_method="fork"
+            )
+            with self.assertLogs(level="ERROR"):
+                launcher.run()
+        self.assertEqual(4, launcher.total_guilds)
+        self.assertEqual([0, 0], [w.process.exitcode for w in launcher.workers])
+        self.assertEqual(2, launcher.restarts)
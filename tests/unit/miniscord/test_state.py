@@ -0,0 +1,195 @@
+from unittest import TestCase
+from unittest.mock import patch
+import asyncio
+from tests.utils import AsyncTestCase
+
+from miniscord._state import StateStore
+from miniscord._backends import MemoryBackend
+
+
+class TestStateStore(TestCase):
+    def test_get_set(self):
+        store = StateStore()
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(0, store.get("a", 0))
+        store.set("a", 1)
+        store["b"] = 2
+        self.assertEqual(1, store.get("a"))
+        self.assertEqual(2, store["b"])
+        self.assertIn("a", store)
+        self.assertEqual(2, len(store))
+        self.assertEqual(2, store.hits)
+        self.assertEqual(2, store.misses)
+        with self.assertRaises(KeyError):
+            _ = store["c"]
+
+    def test_delete(self):
+        store = StateStore()
+        store.set("a", 1)
+        self.assertTrue(store.delete("a"))
+        self.assertFalse(store.delete("a"))
+        with self.assertRaises(KeyError):
+            del store["a"]
+        self.assertEqual(0, len(store))
+        self.assertEqual(0, store.bytes)
+
+    def test_lru(self):
+        store = StateStore(max_entries=2)
+        store.set("a", 1)
+        store.set("b", 2)
+        store.get("a")
+        store.set("c", 3)
+        self.assertNotIn("b", store)
+        self.assertIn("a", store)
+        self.assertIn("c", store)
+        self.assertEqual(1, store.evictions)
+
+    def test_max_bytes(self):
+        store = StateStore(max_entries=None, max_bytes=25, sizeof=len)
+        store.set("a", "x" * 10)
+        store.set("b", "x" * 10)
+        self.assertEqual(22, store.bytes)
+        store.set("c", "x" * 10)
+        self.assertEqual(["b", "c"], [k for k in "abc" if k in store])
+        self.assertEqual(22, store.bytes)
+        store.set("c", "x")
+        self.assertEqual(13, store.bytes)
+
+    @patch("time.monotonic")
+    def test_ttl(self, monotonic):
+        monotonic.return_value = 0
+        store = StateStore(ttl=10)
+        store.set("a", 1)
+        store.set("b", 2, ttl=100)
+        monotonic.return_value = 20
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(2, store.get("b"))
+        self.assertEqual(1, store.expirations)
+        self.assertEqual(1, len(store))
+
+    @patch("time.monotonic")
+    def test_expire_on_set(self, monotonic):
+        monotonic.return_value = 0
+        store = StateStore(ttl=10)
+        store.set("a", 1)
+        store.set("b", 2)
+        monotonic.return_value = 20
+        store.set("c", 3)
+        self.assertEqual(1, len(store))
+        self.assertEqual(2, store.expirations)
+        self.assertEqual(0, store.evictions)
+
+    def test_stats(self):
+        store = StateStore(sizeof=lambda _: 1)
+        store.set("a", 1)
+        store.get("a")
+        store.get("b")
+        self.assertEqual(
+            {
+                "size": 1,
+                "bytes": 2,
+                "hits": 1,
+                "misses": 1,
+                "evictions": 0,
+                "expirations": 0,
+                "loads": 0,
+                "pending": 0,
+            },
+            store.stats(),
+        )
+
+
+class TestStateStoreBackend(AsyncTestCase):
+    def test_write_behind(self):
+        backend = MemoryBackend()
+        store = StateStore(backend=backend, flush_delay=0.01)
+
+        async def run():
+            store.set("a", 1)
+            store.set(1 << 64 | 2, 2)
+            self.assertEqual(2, store.stats()["pending"])
+            self.assertIsNone(await backend.get("a"))
+            await asyncio.sleep(0.03)
+            self.assertEqual(1, await backend.get("a"))
+            self.assertEqual(2, await backend.get("1/2"))
+            store.delete("a")
+            await asyncio.sleep(0.03)
+            self.assertIsNone(await backend.get("a"))
+            self.assertEqual(0, store.stats()["pending"])
+
+        self._await(run())
+
+    def test_ttl(self):
+        backend = MemoryBackend()
+        store = StateStore(backend=backend, flush_delay=0.01)
+
+        async def run():
+            store.set("a", 1, ttl=0.1)
+            await asyncio.sleep(0.03)
+            self.assertEqual(1, await backend.get("a"))
+            await asyncio.sleep(0.1)
+            self.assertIsNone(await backend.get("a"))
+
+        self._await(run())
+
+    def test_load(self):
+        backend = MemoryBackend()
+        store = StateStore(backend=backend)
+
+        async def run():
+            await backend.set("a", 1)
+            self.assertEqual(1, await store.load("a"))
+            self.assertEqual(1, store.get("a"))
+            self.assertEqual(0, await store.load("b", 0))
+
+        self._await(run())
+        self.assertEqual(1, store.loads)
+
+    def test_load_evicted(self):
+        store = StateStore(max_entries=1, backend=MemoryBackend(), flush_delay=10)
+
+        async def run():
+            store.set("a", 1)
+            store.set("b", 2)
+            self.assertNotIn("a", store)
+            self.assertEqual(1, await store.load("a"))
+            store.delete("b")
+            self.assertIsNone(await store.load("b"))
+            await store.close()
+
+        self._await(run())
+
+    def test_close(self):
+        backend = MemoryBackend()
+        store = StateStore(backend=backend, flush_delay=10)
+
+        async def run():
+            store.set("a", 1)
+            await store.close()
+
+        self._await(run())
+        self.assertEqual(1, backend.store.get("a"))
+
+    def test_error(self):
+        backend = MemoryBackend()
+        store = StateStore(backend=backend, flush_delay=0.01)
+        set_many = backend.set_many
+        calls = []
+
+        async def failing(items, ttl=None):
+            calls.append(items)
+            if len(calls) == 1:
+                raise ConnectionError()
+            await set_many(items, ttl)
+
+        backend.set_many = failing
+
+        async def run():
+            store.set("a", 1)
+            await asyncio.sleep(0.015)
+            store.set("a", 2)
+            await asyncio.sleep(0.03)
+
+        with self.assertLogs(level="ERROR"):
+            self._await(run())
+        self.assertEqual(2, backend.store.get("a"))
@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from miniscord._supervisor import Supervisor
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSupervisor(TestCase):
+    def test_backoff(self):
+        supervisor = Supervisor(
+            base_delay=1, max_delay=5, jitter=0, crash_threshold=100
+        )
+        self.assertEqual([1, 2, 4, 5, 5], [supervisor.failure() for _ in range(5)])
+        supervisor.success()
+        self.assertEqual(0, supervisor.attempts)
+        self.assertEqual(1, supervisor.failure())
+
+    def test_jitter(self):
+        supervisor = Supervisor(base_delay=4, jitter=0.5, rand=lambda: 1)
+        self.assertEqual(2, supervisor.failure())
+        supervisor = Supervisor(base_delay=4, jitter=0.5, rand=lambda: 0)
+        self.assertEqual(4, supervisor.failure())
+
+    def test_circuit(self):
+        clock = Clock()
+        supervisor = Supervisor(
+            base_delay=1,
+            jitter=0,
+            crash_threshold=3,
+            crash_window=10,
+            cooldown=100,
+            clock=clock,
+        )
+        self.assertEqual([1, 2], [supervisor.failure() for _ in range(2)])
+        self.assertFalse(supervisor.circuit_open)
+        self.assertEqual(100, supervisor.failure())
+        self.assertTrue(supervisor.circuit_open)
+        self.assertEqual(1, supervisor.trips)
+        # the trial attempt failed
+        self.assertEqual(100, supervisor.failure())
+        self.assertEqual(2, supervisor.trips)
+        supervisor.success()
+        self.assertFalse(supervisor.circuit_open)
+        self.assertEqual(1, supervisor.failure())
+
+    def test_window(self):
+        clock = Clock()
+        supervisor = Supervisor(
+            base_delay=1, jitter=0, crash_threshold=3, crash_window=10, clock=clock
+        )
+        for _ in range(5):
+            supervisor.failure()
+            supervisor.success()
+            clock.now += 6
+        self.assertEqual(0, supervisor.trips)
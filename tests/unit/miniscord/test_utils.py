@@ -1,6 +1,7 @@
 from unittest import TestCase
 
-from miniscord._utils import sanitize_input, parse_arguments
+import time
+from miniscord._utils import sanitize_input, parse_arguments, Arguments, paginate, split_message
 
 
 class TestSanitizeInput(TestCase):
@@ -38,3 +39,96 @@ class TestParseArguments(TestCase):
 
     def test_complex(self):
         self.assertEqual(["abc 'def'", "ghi", "jkl mno"], parse_arguments("\"abc 'def'\" ghi 'jkl mno'"))
+
+    def test_escaped_quotes(self):
+        self.assertEqual(["abc \"def\"", "it's"], parse_arguments("\"abc \\\"def\\\"\" it\\'s"))
+
+    def test_unclosed_quotes(self):
+        self.assertEqual(["\"abc", "def"], parse_arguments("\"abc def"))
+
+    def test_large_unclosed_quotes(self):
+        t0 = time.monotonic()
+        self.assertEqual(100000, len(parse_arguments("\"a " * 100000)))
+        self.assertLess(time.monotonic() - t0, 2)
+
+
+class TestArguments(TestCase):
+    def test_lazy(self):
+        args = Arguments("abc 'def' ghi")
+        self.assertEqual("abc", args[0])
+        self.assertEqual(["abc"], args._Arguments__tokens)
+        self.assertEqual(["abc", "def", "ghi"], list(args))
+        self.assertEqual(3, len(args))
+
+    def test_empty(self):
+        self.assertFalse(Arguments("   "))
+        self.assertTrue(Arguments(" abc"))
+
+    def test_index(self):
+        args = Arguments("abc def")
+        with self.assertRaises(IndexError):
+            _ = args[2]
+        self.assertEqual("def", args[-1])
+        self.assertEqual(["def"], args[1:])
+
+    def test_set_first(self):
+        args = Arguments("ABC def")
+        args[0] = args[0].lower()
+        self.assertEqual(["abc", "def"], args)
+
+
+class TestPaginate(TestCase):
+    def test_empty(self):
+        self.assertEqual([""], paginate([], 10))
+
+    def test_single_page(self):
+        self.assertEqual(["a\nb\n"], paginate(["a\n", "b\n"], 10))
+
+    def test_multi_pages(self):
+        self.assertEqual(["aaa\nbbb\n", "ccc\n"], paginate(["aaa\n", "bbb\n", "ccc\n"], 9))
+
+    def test_long_line(self):
+        self.assertEqual(["a\n", "bbbb", "bb\n"], paginate(["a\n", "bbbbbb\n"], 4))
+
+
+class TestSplitMessage(TestCase):
+    def test_short(self):
+        self.assertEqual(["abc\ndef"], split_message("abc\ndef"))
+
+    def test_empty(self):
+        self.assertEqual([""], split_message(""))
+
+    def test_lines(self):
+        self.assertEqual(["aaa\nbbb\n", "ccc"], split_message("aaa\nbbb\nccc", 8))
+
+    def test_long_line(self):
+        self.assertEqual(["x" * 10, "x" * 10, "x" * 5], split_message("x" * 25, 10))
+
+    def test_code_block(self):
+        self.assertEqual(
+            ["```py\nline1\n```", "```py\nline2\n```", "```py\nline3\n```\nend"],
+            split_message("```py\nline1\nline2\nline3\n```\nend", 20),
+        )
+
+    def test_code_block_limit(self):
+        content = "text\n```\n" + "".join(f"line {i}\n" for i in range(1000)) + "```\nend"
+        chunks = split_message(content)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 2000)
+            self.assertEqual(0, chunk.count("```") % 2)
+
+    def test_code_block_opening_near_limit(self):
+        chunks = split_message("```" + "z" * 1996 + "\nabc\ndef\n```", 2000)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 2000)
+        self.assertEqual(1996, "".join(chunks).count("z") - 32)  # marker repeated once
+        self.assertTrue(chunks[-1].endswith("abc\ndef\n```"))
+
+    def test_code_block_long_opening_line(self):
+        chunks = split_message("```" + "y" * 2500 + "\nend\n```", 2000)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 2000)
+            self.assertEqual(0, chunk.count("```") % 2)
+        self.assertTrue(chunks[-1].endswith("end\n```"))
@@ -0,0 +1,194 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from tests.utils import AsyncTestCase
+
+from miniscord._watchers import (
+    Watcher,
+    WatcherPipeline,
+    DROP_OLDEST,
+    DROP_NEWEST,
+    BLOCK,
+)
+
+
+class TestWatcher(AsyncTestCase):
+    def test_inline(self):
+        callback = AsyncMock()
+        watcher = Watcher(callback)
+        self._await(watcher("client", "message"))
+        callback.assert_awaited_once_with("client", "message")
+        self.assertEqual(1, watcher.processed)
+
+    def test_background(self):
+        received = []
+
+        async def callback(client, message):
+            await asyncio.sleep(0.01)
+            received.append(message)
+
+        watcher = Watcher(callback, background=True)
+
+        async def run():
+            await watcher("client", "m1")
+            await watcher("client", "m2")
+            self.assertEqual([], received)
+            await watcher.join()
+            watcher.stop()
+
+        self._await(run())
+        self.assertEqual(["m1", "m2"], received)
+        self.assertEqual(2, watcher.processed)
+        self.assertGreater(watcher.max_lag, 0)
+
+    def __fill(self, backpressure: str):
+        received = []
+
+        async def callback(client, message):
+            received.append(message)
+
+        watcher = Watcher(
+            callback, background=True, backpressure=backpressure, max_queue=2
+        )
+
+        async def run():
+            for i in range(4):
+                await watcher("client", f"m{i}")
+            await watcher.join()
+            watcher.stop()
+
+        self._await(run())
+        return watcher, received
+
+    def test_drop_oldest(self):
+        watcher, received = self.__fill(DROP_OLDEST)
+        self.assertEqual(["m2", "m3"], received)
+        self.assertEqual(2, watcher.dropped)
+
+    def test_drop_newest(self):
+        watcher, received = self.__fill(DROP_NEWEST)
+        self.assertEqual(["m0", "m1"], received)
+        self.assertEqual(2, watcher.dropped)
+
+    def test_block(self):
+        watcher, received = self.__fill(BLOCK)
+        self.assertEqual(["m0", "m1", "m2", "m3"], received)
+        self.assertEqual(0, watcher.dropped)
+
+    def test_exception(self):
+        callback = AsyncMock()
+        callback.side_effect = Exception("test")
+        watcher = Watcher(callback, background=True)
+
+        async def run():
+            await watcher("client", "message")
+            await watcher.join()
+            watcher.stop()
+
+        with self.assertLogs(level="ERROR"):
+            self._await(run())
+        self.assertEqual(1, watcher.processed)
+
+    def test_unknown_backpressure(self):
+        with self.assertRaises(ValueError):
+            Watcher(AsyncMock(), backpressure="unknown")
+
+
+class TestWatcherPipeline(AsyncTestCase):
+    def test_dispatch(self):
+        pipeline = WatcherPipeline()
+        callback1 = AsyncMock()
+        callback2 = AsyncMock()
+        pipeline.add(Watcher(callback1))
+        pipeline.add(Watcher(callback2, background=True))
+
+        async def run():
+            await pipeline.dispatch("client", "message")
+            await pipeline.join()
+            pipeline.stop()
+
+        self._await(run())
+        self.assertEqual(2, len(pipeline))
+        callback1.assert_awaited_once_with("client", "message")
+        callback2.assert_awaited_once_with("client", "message")
+        self.assertEqual([1, 1], [stats["processed"] for stats in pipeline.stats()])
+
+
+class TestWatcherFilters(AsyncTestCase):
+    def message(
+        self, guild_id=1, channel_id=2, author_id=3, content="", attachments=()
+    ):
+        message = MagicMock()
+        message.guild.id = guild_id
+        message.channel.id = channel_id
+        message.author.id = author_id
+        message.content = content
+        message.attachments = list(attachments)
+        return message
+
+    def matched(self, pipeline: WatcherPipeline, message) -> list:
+        mask = pipeline.match(message)
+        return [i for i in range(len(pipeline)) if mask >> i & 1]
+
+    def test_no_filter(self):
+        pipeline = WatcherPipeline()
+        pipeline.add(Watcher(AsyncMock()))
+        pipeline.add(Watcher(AsyncMock()))
+        self.assertEqual([0, 1], self.matched(pipeline, self.message()))
+
+    def test_ids(self):
+        pipeline = WatcherPipeline()
+        pipeline.add(Watcher(AsyncMock(), guilds=[1]))
+        pipeline.add(Watcher(AsyncMock(), channels=[2, 5]))
+        pipeline.add(Watcher(AsyncMock(), authors=[4]))
+        pipeline.add(Watcher(AsyncMock(), guilds=[1], authors=[3]))
+        self.assertEqual([0, 1, 3], self.matched(pipeline, self.message()))
+        self.assertEqual(
+            [1, 2], self.matched(pipeline, self.message(guild_id=9, author_id=4))
+        )
+
+    def test_direct(self):
+        pipeline = WatcherPipeline()
+        pipeline.add(Watcher(AsyncMock(), guilds=[1]))
+        pipeline.add(Watcher(AsyncMock()))
+        message = self.message()
+        message.guild = None
+        self.assertEqual([1], self.matched(pipeline, message))
+
+    def test_attachment(self):
+        pipeline = WatcherPipeline()
+        pipeline.add(Watcher(AsyncMock(), has_attachment=True))
+        pipeline.add(Watcher(AsyncMock(), has_attachment=False))
+        pipeline.add(Watcher(AsyncMock()))
+        self.assertEqual([1, 2], self.matched(pipeline, self.message()))
+        self.assertEqual(
+            [0, 2], self.matched(pipeline, self.message(attachments=["file"]))
+        )
+
+    def test_content(self):
+        pipeline = WatcherPipeline()
+        pipeline.add(Watcher(AsyncMock(), content="hello"))
+        pipeline.add(Watcher(AsyncMock(), content="^wor[a-z]+$"))
+        pipeline.add(Watcher(AsyncMock(), content="(o)\\1"))
+        pipeline.add(Watcher(AsyncMock(), content="o w"))
+        self.assertEqual(
+            [0, 3], self.matched(pipeline, self.message(content="hello world"))
+        )
+        self.assertEqual([1], self.matched(pipeline, self.message(content="world")))
+        self.assertEqual([2], self.matched(pipeline, self.message(content="foo")))
+
+    def test_content_and_ids(self):
+        pipeline = WatcherPipeline()
+        pipeline.add(Watcher(AsyncMock(), content="hello", channels=[8]))
+        pipeline.add(Watcher(AsyncMock(), content="hello"))
+        self.assertEqual([1], self.matched(pipeline, self.message(content="hello")))
+
+    def test_dispatch(self):
+        pipeline = WatcherPipeline()
+        callback1 = AsyncMock()
+        callback2 = AsyncMock()
+        pipeline.add(Watcher(callback1, authors=[4]))
+        pipeline.add(Watcher(callback2, content="test"))
+        message = self.message(content="a test")
+        self._await(pipeline.dispatch("client", message))
+        callback1.assert_not_awaited()
+        callback2.assert_awaited_once_with("client", message)